@@ -0,0 +1,195 @@
+"""Journal of a batch run, so an interrupted run can be resumed, and register of what earlier runs made for each room,
+so a rerun can update it. Rooms are recorded by UniqueId with the ids of the views, sheets and viewports made for them.
+Both are JSON files next to the model"""
+from pyrevit import revit, DB, script, forms
+import json
+import os
+
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+CHUNK_SIZE = 50
+
+
+def journal_path(doc, name):
+    # next to the model, or in the pyRevit data folder for unsaved and cloud models
+    model_path = doc.PathName
+    file_name = name.replace(" ", "_").lower()
+    if model_path and os.path.isfile(model_path):
+        return "{}_{}.json".format(os.path.splitext(model_path)[0], file_name)
+    return script.get_document_data_file(file_name, "json")
+
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def read_json(path):
+    if os.path.isfile(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            # a file that was cut off while written, nothing in it can be trusted
+            pass
+    return {}
+
+
+def write_json(path, data):
+    # write a copy and swap it in, so a crash while writing keeps the previous file
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    if os.path.isfile(path):
+        os.remove(path)
+    os.rename(temp_path, path)
+
+
+class BatchJournal(object):
+    """{room UniqueId : {"status", "ids"}} of one generator, saved after every change of status.
+    Failed rooms also keep a "name" and an "error", and stay in the journal after the run to be reported"""
+
+    def __init__(self, doc, name):
+        self.doc = doc
+        self.name = name
+        self.path = journal_path(doc, name)
+        self.rooms = {}
+        self.load()
+
+    def load(self):
+        self.rooms = read_json(self.path).get("rooms", {})
+        return self.rooms
+
+    def save(self):
+        write_json(self.path, {"name": self.name, "rooms": self.rooms})
+
+    def clear(self):
+        self.rooms = {}
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def _exists(self, element_id):
+        return self.doc.GetElement(DB.ElementId(element_id)) is not None
+
+    def is_done(self, room):
+        # done, and the output is still in the model (not undone or deleted since)
+        entry = self.rooms.get(room.UniqueId)
+        if not entry or entry["status"] != DONE:
+            return False
+        return all(self._exists(element_id) for element_id in entry["ids"])
+
+    def half_finished(self):
+        return [key for key, entry in self.rooms.items() if entry["status"] != DONE]
+
+    def start(self, rooms):
+        for room in rooms:
+            self.rooms[room.UniqueId] = {"status": STARTED, "ids": []}
+        self.save()
+
+    def record(self, room, element_ids):
+        # the ids made for the room, recorded before they are committed. Saved with the next save()
+        self.rooms[room.UniqueId]["ids"] = [element_id.IntegerValue for element_id in element_ids if element_id]
+
+    def fail(self, room, name, error):
+        # the room's output was rolled back, nothing of it is in the model. Saved with the next save()
+        self.rooms[room.UniqueId] = {"status": FAILED, "ids": [], "name": name, "error": str(error)}
+
+    def failed(self):
+        # [(name, error)] of the rooms that failed
+        return sorted((entry["name"], entry["error"]) for entry in self.rooms.values() if entry["status"] == FAILED)
+
+    def finish(self, rooms):
+        for room in rooms:
+            if self.rooms[room.UniqueId]["status"] != FAILED:
+                self.rooms[room.UniqueId]["status"] = DONE
+        self.save()
+
+    def close(self):
+        # end of a run: kept for the rooms that failed only, so the next run can report them
+        failed = dict((key, entry) for key, entry in self.rooms.items() if entry["status"] == FAILED)
+        if not failed:
+            self.clear()
+            return
+        self.rooms = failed
+        self.save()
+
+    def clean_up(self, keys=None):
+        # delete what half-finished rooms left in the model, returns the number of elements deleted
+        keys = self.half_finished() if keys is None else keys
+        if not keys:
+            return 0
+        deleted = 0
+        with revit.Transaction("Clean up unfinished rooms", self.doc):
+            for key in keys:
+                for element_id in self.rooms[key]["ids"]:
+                    # deleting a sheet or a marker takes its viewports and elevations with it
+                    if self._exists(element_id):
+                        self.doc.Delete(DB.ElementId(element_id))
+                        deleted += 1
+                del self.rooms[key]
+        self.save()
+        return deleted
+
+    def resume(self, rooms):
+        # the rooms still to do. Offers to resume a previous run, cleaning up its unfinished rooms
+        rooms = list(rooms)
+        if not self.rooms:
+            return rooms
+        for name, error in self.failed():
+            print("Failed in the previous run, trying again: {} ({})".format(name, error))
+        done = set(room.UniqueId for room in rooms if self.is_done(room))
+        # whatever the choice, the output of unfinished rooms is incomplete
+        self.clean_up()
+        if done and forms.alert(
+                "A previous {} run was interrupted with {} of the selected rooms done. "
+                "Resume it and skip those rooms?".format(self.name, len(done)), yes=True, no=True):
+            return [room for room in rooms if room.UniqueId not in done]
+        self.clear()
+        return rooms
+
+
+class OutputRegister(object):
+    """{room UniqueId : entry} of what a generator made for each room, kept between runs.
+    An entry holds the room's fingerprint when it was made, the settings it was made with, and the element ids by role"""
+
+    def __init__(self, doc, name):
+        self.doc = doc
+        self.name = name
+        self.path = journal_path(doc, name + " register")
+        self.rooms = read_json(self.path).get("rooms", {})
+
+    def save(self):
+        write_json(self.path, {"name": self.name, "rooms": self.rooms})
+
+    def entry(self, room, settings=None):
+        # the room's entry, if it was made with the same settings
+        entry = self.rooms.get(room.UniqueId)
+        if entry and (settings is None or entry.get("settings") == settings):
+            return entry
+        return None
+
+    def element(self, element_id):
+        return self.doc.GetElement(DB.ElementId(element_id)) if element_id is not None else None
+
+    def elements(self, entry, key):
+        # {role : element} of the entry's ids under key, None for deleted elements
+        return dict((role, self.element(element_id)) for role, element_id in entry[key].items())
+
+    def is_intact(self, entry):
+        # none of the registered output was deleted since
+        return all(self.element(element_id) is not None for key in ("views", "viewports")
+                   for element_id in entry[key].values()) and self.element(entry["sheet"]) is not None
+
+    def put(self, room, fingerprint, settings, sheet, views, viewports, **extra):
+        # views and viewports are {role : element}, extra values are stored as they are
+        entry = {
+            "fingerprint": fingerprint,
+            "settings": settings,
+            "sheet": sheet.Id.IntegerValue,
+            "views": dict((role, view.Id.IntegerValue) for role, view in views.items() if view),
+            "viewports": dict((role, viewport.Id.IntegerValue) for role, viewport in viewports.items() if viewport),
+        }
+        entry.update(extra)
+        self.rooms[room.UniqueId] = entry
@@ -3,8 +3,8 @@ from pyrevit import HOST_APP
 from pyrevit import forms
 from pyrevit import revit, DB
 from pyrevit import script
-import random
-from pychilizer import database
+from pychilizer import database, batchjournal, palettes
+from pychilizer.palettes import hex_to_rgb, rgb_to_hex
 import colorsys
 
 
@@ -17,7 +17,7 @@ def basic_colours():
         "#40DFFF",
         "#803ABA",
         "#E6B637",
-        "#A8DA84"
+        "#A8DA84",
         "#8337E6",
         "#EBE70E",
         "#D037E6",
@@ -47,15 +47,6 @@ def rainbow():
     return rainbow_colours
 
 
-def hex_to_rgb(hex):
-    return [int(hex[i:i + 2], 16) for i in range(1, 6, 2)]
-
-
-def rgb_to_hex(rgb):
-    rgb = [int(x) for x in rgb]
-    return "#" + "".join(["0{0:x}".format(v) if v < 16 else "{0:x}".format(v) for v in rgb])
-
-
 def color_dict(gradient):
     """Takes in a list of RGB sub-lists and returns dictionary of
         colors in RGB and hex form for use in a graphing function
@@ -88,21 +79,17 @@ def linear_gradient(start_hex, finish_hex, n=10):
 
 
 def polylinear_gradient(colors, n):
-    ''' returns a list of colors forming linear gradients between
-          all sequential pairs of colors. "n" specifies the total
-          number of desired output colors '''
-    # The number of colors per individual linear gradient
-    n_out = int(float(n) / (len(colors) - 1)) + 2
-    # returns dictionary defined by color_dict()
-    gradient_dict = linear_gradient(colors[0], colors[1], n_out)
-
-    if len(colors) > 1:
-        for col in range(1, len(colors) - 1):
-            next = linear_gradient(colors[col], colors[col + 1], n_out)
-            for k in ("hex", "r", "g", "b"):
-                # Exclude first point to avoid duplicates
-                gradient_dict[k] += next[k][1:]
-    return gradient_dict
+    ''' returns a list of n colors evenly spaced along the linear
+          gradients between all sequential pairs of colors '''
+    rgbs = [hex_to_rgb(c) for c in colors]
+    segments = len(colors) - 1
+    rgb_list = []
+    for i in range(n):
+        # position along the whole gradient, in segments
+        t = float(i) * segments / (n - 1) if n > 1 else 0.0
+        k = min(int(t), segments - 1)
+        rgb_list.append([int(rgbs[k][j] + (t - k) * (rgbs[k + 1][j] - rgbs[k][j])) for j in range(3)])
+    return color_dict(rgb_list)
 
 
 def revit_colour(hex):
@@ -123,27 +110,90 @@ def random_colour_hsv(n):
     return rgb_out
 
 
+def candidate_colours(n=0):
+    # the colours a palette picks from, perceptually distinct and at least PALETTE_SIZE of them
+    size = PALETTE_SIZE
+    while size < n:
+        size *= 2
+    return palettes.perceptual_colours(size, get_colour_blind_safe())
+
+
 def get_colours(n):
-    if n < 14:
-        colours = basic_colours()
-    else:
-        colours = rainbow()
-    col_dict = polylinear_gradient(colours, n)
-    chop_col_list = col_dict["hex"][0:n]
-    # gradient method
-    revit_colours = [revit_colour(h) for h in chop_col_list]
-    # random method
-    # revit_colours = colorize.random_colour_hsv(len(types_dict))
-
-    for x in range(10):
-        random.shuffle(revit_colours)
-    return revit_colours
+    # n perceptually distinct colours, the same for the same n on every run
+    return [revit_colour(h) for h in palettes.perceptual_colours(n, get_colour_blind_safe())]
+
+
+def get_ramp_colours(n):
+    # n ordered colours, for ranges of values from low to high
+    return [revit_colour(h) for h in palettes.ramp_colours(n)]
+
+
+def value_key(value):
+    # the key of a parameter value or a type id in a palette
+    if isinstance(value, DB.ElementId):
+        return str(value.IntegerValue)
+    if isinstance(value, tuple):
+        # (display string, value) of Double parameters
+        return str(value[0])
+    return str(value)
+
+
+class PaletteStore(object):
+    """The palettes of a document by name, kept in a JSON file next to the model, so values keep their colour
+    from one run to the next"""
+
+    def __init__(self, doc):
+        self.path = batchjournal.journal_path(doc, PALETTES_NAME)
+        self._colours = batchjournal.read_json(self.path).get("palettes", {})
+        self._palettes = {}
+
+    def palette(self, name, size=0):
+        # size: the number of values the palette will be asked for, so there are enough candidates
+        if name not in self._palettes:
+            colours = self._colours.get(name) or {}
+            self._palettes[name] = palettes.Palette(colours, candidate_colours(len(colours) + size),
+                                                    get_colour_blind_safe())
+        return self._palettes[name]
+
+    def save(self):
+        # only when a palette has new values
+        if any(palette.added for palette in self._palettes.values()):
+            for name, palette in self._palettes.items():
+                self._colours[name] = palette.colours
+                palette.added = []
+            batchjournal.write_json(self.path, {"palettes": self._colours})
+
+
+def palette_name(*parts):
+    # e.g. palette_name("Type", category label), palette_name("Value", category label, parameter)
+    return " | ".join(str(part) for part in parts)
+
+
+def palette_colours(name, values, doc=revit.doc):
+    # Revit colours of the values in the document's palette of that name, new values are added and saved
+    store = PaletteStore(doc)
+    values = list(values)
+    hexes = store.palette(name, len(values)).assign([value_key(value) for value in values])
+    store.save()
+    return [revit_colour(h) for h in hexes]
 
 
 override_options = ["Projection Line Colour", "Projection Surface Colour", "Cut Line Colour", "Cut Pattern Colour"]
 default_override_options = ["Projection Surface Colour", "Cut Pattern Colour"]
 OVERRIDES_CONFIG_OPTION_NAME = "overrides"
 CATEGORIES_CONFIG_OPTION_NAME = "colorize_categories"
+PALETTES_NAME = "colour palettes"
+# candidates of a palette, doubled for palettes of more values
+PALETTE_SIZE = 256
+PALETTE_CONFIG_SECTION = "colorize_palette"
+COLOUR_BLIND_CONFIG_OPTION_NAME = "colour_blind_safe"
+OVERRIDES_RECORD_NAME = "colour overrides"
+FULL_REPAINT_CONFIG_OPTION_NAME = "full_repaint"
+LIVE_CONFIG_OPTION_NAME = "live_colorize"
+# recorded elements checked for their override before a run relies on the record: the elements that keep their colour
+# catch overrides reset by hand, the elements of the last recorded diff catch an undone run
+SAMPLE_SIZE = 10
+LAST_DIFF_SAMPLE_SIZE = 200
 
 class ChosenItem(forms.TemplateListItem):
     """Wrapper class for chosen item"""
@@ -200,6 +250,41 @@ def config_overrides(config, option_name):
         save_config([x for x in overrides if x], option_name,config)
 
 
+def config_full_repaint(config):
+    """Ask whether to override every element on each run"""
+    full_repaint = forms.alert("Override the colour of every element on each run?\n"
+                               "Choose No to only override the elements whose colour changed since the last run "
+                               "in the view.", yes=True, no=True)
+    save_config(bool(full_repaint), FULL_REPAINT_CONFIG_OPTION_NAME, config)
+
+
+def get_full_repaint_config(config):
+    return bool(config.get_option(FULL_REPAINT_CONFIG_OPTION_NAME, False))
+
+
+def config_colour_blind_safe():
+    """Ask whether new colours should stay distinct with red-green colour blindness, for all colorizers"""
+    config = script.get_config(PALETTE_CONFIG_SECTION)
+    safe = forms.alert("Pick new colours that stay distinct for red-green colour blind people?\n"
+                       "Values that already have a colour keep it.", yes=True, no=True)
+    save_config(bool(safe), COLOUR_BLIND_CONFIG_OPTION_NAME, config)
+
+
+def get_colour_blind_safe():
+    return bool(script.get_config(PALETTE_CONFIG_SECTION).get_option(COLOUR_BLIND_CONFIG_OPTION_NAME, False))
+
+
+def config_live(config):
+    """Ask whether to keep recolouring the view as elements change"""
+    live = forms.alert("Keep the view coloured as elements are added or their values change?\n"
+                       "Stays on until the view is closed or the tool is run again.", yes=True, no=True)
+    save_config(bool(live), LIVE_CONFIG_OPTION_NAME, config)
+
+
+def get_live_config(config):
+    return bool(config.get_option(LIVE_CONFIG_OPTION_NAME, False))
+
+
 def config_category_overrides(doc):
     """Ask for favourite categories"""
     # categories_config = get_categories_config(doc)
@@ -216,18 +301,194 @@ def config_category_overrides(doc):
         save_config([x for x in category_selection if x],CATEGORIES_CONFIG_OPTION_NAME, categories_config)
 
 
-def set_colour_overrides_by_option(overrides_option, colour, doc):
+class OverrideFactory(object):
+    """Colour overrides of a document. The solid fill pattern is resolved once
+    and each (colour, override options) pair is built once"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._solid_fill_pat_id = None
+        self._overrides = {}  # {((r, g, b), override options) : OverrideGraphicSettings}
+
+    def is_for(self, doc):
+        return self.doc.IsValidObject and self.doc.Equals(doc)
+
+    @property
+    def solid_fill_pat_id(self):
+        if self._solid_fill_pat_id is None:
+            self._solid_fill_pat_id = database.get_solid_fill_pat(self.doc).Id
+        return self._solid_fill_pat_id
+
+    def override(self, overrides_option, colour):
+        key = ((colour.Red, colour.Green, colour.Blue), tuple(sorted(overrides_option)))
+        if key not in self._overrides:
+            self._overrides[key] = self._create(overrides_option, colour)
+        return self._overrides[key]
+
+    def _create(self, overrides_option, colour):
+        override = DB.OverrideGraphicSettings()
+        if "Projection Line Colour" in overrides_option:
+            override.SetProjectionLineColor(colour)
+        if "Cut Line Colour" in overrides_option:
+            override.SetCutLineColor(colour)
+        if "Projection Surface Colour" in overrides_option:
+            override.SetSurfaceForegroundPatternColor(colour)
+            override.SetSurfaceForegroundPatternId(self.solid_fill_pat_id)
+        if "Cut Pattern Colour" in overrides_option:
+            override.SetCutForegroundPatternColor(colour)
+            override.SetCutForegroundPatternId(self.solid_fill_pat_id)
+        return override
+
+
+_override_factory = None
+
 
-    override = DB.OverrideGraphicSettings()
-    solid_fill_pat_id = database.get_solid_fill_pat(doc).Id
-    if "Projection Line Colour" in overrides_option:
-        override.SetProjectionLineColor(colour)
-    if "Cut Line Colour" in overrides_option:
-        override.SetCutLineColor(colour)
-    if "Projection Surface Colour" in overrides_option:
-        override.SetSurfaceForegroundPatternColor(colour)
-        override.SetSurfaceForegroundPatternId(solid_fill_pat_id)
-    if "Cut Pattern Colour" in overrides_option:
-        override.SetCutForegroundPatternColor(colour)
-        override.SetCutForegroundPatternId(solid_fill_pat_id)
-    return override
+def get_override_factory(doc=revit.doc):
+    # return the override factory of the document, a new one when the document changes
+    global _override_factory
+    if _override_factory is None or not _override_factory.is_for(doc):
+        _override_factory = OverrideFactory(doc)
+    return _override_factory
+
+
+def drop_override_factory():
+    global _override_factory
+    _override_factory = None
+
+
+def set_colour_overrides_by_option(overrides_option, colour, doc):
+    return get_override_factory(doc).override(overrides_option, colour)
+
+
+def apply_element_overrides(view, element_ids, override):
+    # override all elements with the same settings, return the number of elements
+    count = 0
+    for el_id in element_ids:
+        view.SetElementOverrides(el_id, override)
+        count += 1
+    return count
+
+
+def apply_filter_overrides(view, filter_ids, override):
+    count = 0
+    for filter_id in filter_ids:
+        view.SetFilterOverrides(filter_id, override)
+        count += 1
+    return count
+
+
+def apply_colour_groups(view, groups, colours, overrides_option, doc):
+    # colour each group of elements {key : element ids} with the matching colour
+    factory = get_override_factory(doc)
+    count = 0
+    for key, colour in zip(groups.keys(), colours):
+        count += apply_element_overrides(view, groups[key], factory.override(overrides_option, colour))
+    return count
+
+
+class OverrideRecord(object):
+    """{view UniqueId | palette : the override options, {element id : hex colour} and the last diff} of what the
+    colorizers applied to each view, kept in a JSON file next to the model. The file is not part of the model,
+    so it is saved only once the transaction that applied the overrides has committed"""
+
+    def __init__(self, doc):
+        self.path = batchjournal.journal_path(doc, OVERRIDES_RECORD_NAME)
+        self.views = batchjournal.read_json(self.path).get("views", {})
+
+    def _entry(self, view, palette, overrides_option):
+        entry = self.views.get(palette_name(view.UniqueId, palette))
+        if entry and entry["options"] == sorted(overrides_option):
+            return entry
+        return None
+
+    def previous(self, view, palette, overrides_option):
+        # {element id : hex colour} applied to the view from the palette with the same options, or None
+        entry = self._entry(view, palette, overrides_option)
+        return entry["elements"] if entry else None
+
+    def last_diff(self, view, palette, overrides_option):
+        # {element id : hex colour, None where reset} of the last run that changed the view
+        entry = self._entry(view, palette, overrides_option)
+        return entry.get("last_diff", {}) if entry else {}
+
+    def put(self, view, palette, overrides_option, elements, diff):
+        # diff: {element id : hex colour, None where reset} overridden by this run. A run that changed nothing
+        # keeps the diff of the run before it, undoing that one still shows
+        last_diff = diff or self.last_diff(view, palette, overrides_option)
+        self.views[palette_name(view.UniqueId, palette)] = {"options": sorted(overrides_option),
+                                                            "elements": elements, "last_diff": last_diff}
+
+    def save(self):
+        batchjournal.write_json(self.path, {"views": self.views})
+
+
+def override_colour(override, overrides_option):
+    # hex colour of the first of the options set in the override, None if not set
+    readers = {
+        "Projection Line Colour": lambda o: o.ProjectionLineColor,
+        "Projection Surface Colour": lambda o: o.SurfaceForegroundPatternColor,
+        "Cut Line Colour": lambda o: o.CutLineColor,
+        "Cut Pattern Colour": lambda o: o.CutForegroundPatternColor,
+    }
+    for option in override_options:
+        if option in overrides_option:
+            colour = readers[option](override)
+            return rgb_to_hex([colour.Red, colour.Green, colour.Blue]) if colour.IsValid else None
+    return None
+
+
+def _spread_sample(keys, size):
+    # up to size of the keys, evenly spaced
+    keys = sorted(keys)
+    if len(keys) <= size:
+        return keys
+    step = len(keys) / float(size)
+    return [keys[int(i * step)] for i in range(size)]
+
+
+def overrides_in_place(view, previous, current, last_diff, overrides_option, doc):
+    # the recorded colours are still applied in the view: the elements of the last recorded diff, which an undo or a
+    # rolled back transaction puts back, and a few elements that keep their colour, which catch overrides reset by hand
+    expected = dict((key, last_diff[key]) for key in _spread_sample(last_diff, LAST_DIFF_SAMPLE_SIZE))
+    for key in [key for key in current if previous.get(key) == current[key]][:SAMPLE_SIZE]:
+        expected[key] = current[key]
+    for key, colour_hex in expected.items():
+        element_id = DB.ElementId(int(key))
+        if doc.GetElement(element_id) and \
+                override_colour(view.GetElementOverrides(element_id), overrides_option) != colour_hex:
+            return False
+    return True
+
+
+def apply_colour_diff(view, groups, colours, overrides_option, palette, doc=revit.doc, full_repaint=False):
+    # apply_colour_groups, overriding only the elements whose colour changed since the last run in the view,
+    # and resetting the elements no longer coloured. Returns a palettes.RepaintReport and the OverrideRecord,
+    # to save once the transaction has committed
+    current = {}  # {element id : hex colour}
+    by_hex = {}
+    for key, colour in zip(groups.keys(), colours):
+        colour_hex = rgb_to_hex([colour.Red, colour.Green, colour.Blue])
+        by_hex[colour_hex] = colour
+        for element_id in groups[key]:
+            current[str(element_id.IntegerValue)] = colour_hex
+    record = OverrideRecord(doc)
+    previous = None if full_repaint else record.previous(view, palette, overrides_option)
+    if previous is not None and not overrides_in_place(
+            view, previous, current, record.last_diff(view, palette, overrides_option), overrides_option, doc):
+        previous = None
+    changed, removed = palettes.colour_diff(previous or {}, current)
+
+    factory = get_override_factory(doc)
+    for key, colour_hex in changed.items():
+        view.SetElementOverrides(DB.ElementId(int(key)), factory.override(overrides_option, by_hex[colour_hex]))
+    reset = DB.OverrideGraphicSettings()
+    diff = dict(changed)
+    for key in removed:
+        element_id = DB.ElementId(int(key))
+        # deleted elements need no reset
+        if doc.GetElement(element_id):
+            view.SetElementOverrides(element_id, reset)
+            diff[key] = None
+
+    record.put(view, palette, overrides_option, current, diff)
+    return palettes.RepaintReport(len(current), len(changed), len(removed), previous is None), record
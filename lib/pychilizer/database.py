@@ -2,7 +2,7 @@
 
 from pyrevit import revit, DB, script, forms, HOST_APP, coreutils, PyRevitException
 from pyrevit.framework import List
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from pychilizer import units
 from pyrevit.revit.db import query
 from Autodesk.Revit import Exceptions
@@ -13,6 +13,225 @@ import System
 
 BIC = DB.BuiltInCategory
 
+# keys of the name maps held by the DocumentIndex
+VIEWS = "views"
+SHEETS = "sheets"
+FILTERS = "filters"
+VIEW_TEMPLATES = "view_templates"
+TITLEBLOCKS = "titleblocks"
+VIEWPORT_TYPES = "viewport_types"
+
+
+class DocumentIndex(object):
+    """Name to element maps of a document, each built on first use. Kept in step with the elements the scripts
+    create, rename and delete, so it has to be invalidated when a transaction or group is rolled back"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._maps = {}  # {key : {name : [elements]}}
+        self._names = {}  # {key : {element id : name}}, to update or forget elements
+
+    def is_for(self, doc):
+        # check if the index still belongs to the given document
+        return self.doc.IsValidObject and self.doc.Equals(doc)
+
+    def invalidate(self):
+        # forget all maps, they are built again from the document on next use
+        self._maps = {}
+        self._names = {}
+
+    def _collect(self, key):
+        # run the one collector pass for the given key
+        if key == VIEWS:
+            return DB.FilteredElementCollector(self.doc) \
+                .OfCategory(DB.BuiltInCategory.OST_Views) \
+                .WhereElementIsNotElementType().ToElements()
+        elif key == SHEETS:
+            return DB.FilteredElementCollector(self.doc) \
+                .OfCategory(DB.BuiltInCategory.OST_Sheets) \
+                .WhereElementIsNotElementType().ToElements()
+        elif key == FILTERS:
+            return DB.FilteredElementCollector(self.doc).OfClass(DB.FilterElement).ToElements()
+        elif key == VIEW_TEMPLATES:
+            return [v for v in DB.FilteredElementCollector(self.doc).OfClass(DB.View) if v.IsTemplate]
+        elif key == TITLEBLOCKS:
+            return DB.FilteredElementCollector(self.doc) \
+                .OfCategory(DB.BuiltInCategory.OST_TitleBlocks) \
+                .WhereElementIsElementType().ToElements()
+        elif key == VIEWPORT_TYPES:
+            return get_viewport_types(self.doc)
+        raise PyRevitException("Unknown index key: {}".format(key))
+
+    def _name_of(self, key, element):
+        if key == SHEETS:
+            return element.SheetNumber
+        elif key == TITLEBLOCKS:
+            return element.Family.Name + " : " + get_name(element)
+        return str(get_name(element))
+
+    def _get_map(self, key):
+        if key not in self._maps:
+            self._maps[key] = defaultdict(list)
+            self._names[key] = {}
+            for element in self._collect(key):
+                self._insert(key, element)
+        return self._maps[key]
+
+    def _insert(self, key, element):
+        name = self._name_of(key, element)
+        self._maps[key][name].append(element)
+        self._names[key][element.Id.IntegerValue] = name
+
+    def lookup(self, key, name):
+        # all elements recorded under the name, empty list if none
+        name_map = self._get_map(key)
+        if name in name_map:
+            return list(name_map[name])
+        return []
+
+    def first(self, key, name):
+        found = self.lookup(key, name)
+        if found:
+            return found[0]
+        return None
+
+    def contains(self, key, name):
+        return name in self._get_map(key) and bool(self._maps[key][name])
+
+    def names(self, key):
+        return [name for name, elements in self._get_map(key).items() if elements]
+
+    def add(self, key, element):
+        # record a created or renamed element, maps not built yet will pick it up from the collector
+        if key not in self._maps:
+            return
+        self._forget(key, element.Id)
+        self._insert(key, element)
+
+    def remove(self, element_id):
+        # forget a deleted element in all maps that were built
+        for key in self._maps:
+            self._forget(key, element_id)
+
+    def _forget(self, key, element_id):
+        name = self._names[key].pop(element_id.IntegerValue, None)
+        if name is None:
+            return
+        self._maps[key][name] = [el for el in self._maps[key][name]
+                                 if el.Id.IntegerValue != element_id.IntegerValue]
+
+
+_document_index = None
+
+
+def get_document_index(doc=revit.doc):
+    # return the index of the document, a new one is started when the document changes
+    global _document_index
+    if _document_index is None or not _document_index.is_for(doc):
+        _document_index = DocumentIndex(doc)
+    return _document_index
+
+
+def drop_document_index():
+    global _document_index
+    _document_index = None
+
+
+def invalidate_document_index():
+    # after a rollback: the index may hold elements and names the rollback undid
+    if _document_index is not None:
+        _document_index.invalidate()
+
+
+def _next_view_name(name):
+    return name + " Copy 1"
+
+
+def _next_sheet_number(number):
+    return coreutils.increment_str(number, 1)
+
+
+class NameAllocator(object):
+    """Hands out free view names and sheet numbers from a single snapshot of the document"""
+
+    def __init__(self, view_names=(), sheet_numbers=()):
+        self._taken = {VIEWS: set(view_names), SHEETS: set(sheet_numbers)}
+        self._steps = {VIEWS: _next_view_name, SHEETS: _next_sheet_number}
+        # {requested name : last name handed out for it}, so repeated requests resume where they stopped
+        self._last = {VIEWS: {}, SHEETS: {}}
+
+    @classmethod
+    def from_document(cls, doc=revit.doc):
+        index = get_document_index(doc)
+        return cls(index.names(VIEWS), index.names(SHEETS))
+
+    def _allocate(self, kind, requested, pending=None):
+        # pending is a dry run overlay of (names, last) that leaves the allocator untouched
+        taken = self._taken[kind]
+        step = self._steps[kind]
+        last = self._last[kind]
+        if pending is not None:
+            pending_names, pending_last = pending
+            candidate = pending_last.get(requested, last.get(requested, requested))
+            while candidate in taken or candidate in pending_names:
+                candidate = step(candidate)
+            pending_names.add(candidate)
+            pending_last[requested] = candidate
+        else:
+            candidate = last.get(requested, requested)
+            while candidate in taken:
+                candidate = step(candidate)
+            taken.add(candidate)
+            last[requested] = candidate
+        return candidate
+
+    def view_name(self, name, suffix=""):
+        # reserve a free view name
+        return self._allocate(VIEWS, name + suffix)
+
+    def view_names(self, names):
+        # reserve a batch of view names, in the given order
+        return [self._allocate(VIEWS, name) for name in names]
+
+    def sheet_number(self, number):
+        return self._allocate(SHEETS, str(number))
+
+    def sheet_numbers(self, numbers):
+        return [self._allocate(SHEETS, str(number)) for number in numbers]
+
+    def preview_view_names(self, names):
+        # the names view_names would hand out, without reserving them
+        pending = (set(), {})
+        return [self._allocate(VIEWS, name, pending) for name in names]
+
+    def preview_sheet_numbers(self, numbers):
+        pending = (set(), {})
+        return [self._allocate(SHEETS, str(number), pending) for number in numbers]
+
+    def release_view_name(self, name):
+        # make the name of a deleted view available again
+        self._taken[VIEWS].discard(name)
+        self._last[VIEWS] = {}
+
+    def release_sheet_number(self, number):
+        self._taken[SHEETS].discard(str(number))
+        self._last[SHEETS] = {}
+
+    def checkpoint(self):
+        # the names taken so far, to restore when the elements named since are rolled back
+        return dict((kind, set(taken)) for kind, taken in self._taken.items())
+
+    def restore(self, checkpoint):
+        self._taken = dict((kind, set(taken)) for kind, taken in checkpoint.items())
+        self._last = {VIEWS: {}, SHEETS: {}}
+
+
+def rename_view(view, name, doc=revit.doc):
+    # set the view name and keep the index in sync
+    view.Name = name
+    get_document_index(doc).add(VIEWS, view)
+    return view
+
 def get_alphabetic_labels(nr):
     # get N letters A, B, C, etc or AA, AB, AC if N more than 26
     alphabet = [chr(i) for i in range(65, 91)]
@@ -45,13 +264,7 @@ def invis_style(doc=revit.doc):
 
 
 def get_sheet(some_number, doc=revit.doc):
-    sheet_nr_filter = get_biparam_stringequals_filter({DB.BuiltInParameter.SHEET_NUMBER: str(some_number)})
-    found_sheet = DB.FilteredElementCollector(doc) \
-        .OfCategory(DB.BuiltInCategory.OST_Sheets) \
-        .WherePasses(sheet_nr_filter) \
-        .WhereElementIsNotElementType().ToElements()
-
-    return found_sheet
+    return get_document_index(doc).lookup(SHEETS, str(some_number))
 
 
 def get_biparam_stringequals_filter(bip_paramvalue_dict):
@@ -80,13 +293,7 @@ def get_biparam_stringequals_filter(bip_paramvalue_dict):
 
 
 def get_view(some_name, doc=revit.doc):
-    view_name_filter = get_biparam_stringequals_filter({DB.BuiltInParameter.VIEW_NAME: some_name})
-    found_view = DB.FilteredElementCollector(doc) \
-        .OfCategory(DB.BuiltInCategory.OST_Views) \
-        .WherePasses(view_name_filter) \
-        .WhereElementIsNotElementType().ToElements()
-
-    return found_view
+    return get_document_index(doc).lookup(VIEWS, some_name)
 
 
 def get_fam_types(family_name, doc=revit.doc):
@@ -158,15 +365,19 @@ def add_material_parameter(family_document, parameter_name, is_instance):
 
 
 
-def create_sheet(sheet_num, sheet_name, titleblock, doc=revit.doc):
+def create_sheet(sheet_num, sheet_name, titleblock, doc=revit.doc, allocator=None):
     sheet_num = str(sheet_num)
 
     new_datasheet = DB.ViewSheet.Create(doc, titleblock)
     new_datasheet.Name = sheet_name
 
-    while get_sheet(sheet_num):
-        sheet_num = coreutils.increment_str(sheet_num, 1)
+    if allocator:
+        sheet_num = allocator.sheet_number(sheet_num)
+    else:
+        while get_sheet(sheet_num, doc):
+            sheet_num = coreutils.increment_str(sheet_num, 1)
     new_datasheet.SheetNumber = str(sheet_num)
+    get_document_index(doc).add(SHEETS, new_datasheet)
 
     return new_datasheet
 
@@ -401,40 +612,29 @@ def get_mass_template_path():
 
 def vt_name_match(vt_name, doc=revit.doc):
     # return a view template with a given name, None if not found
-    views = DB.FilteredElementCollector(doc).OfClass(DB.View)
-    vt_match = None
-    for v in views:
-        if v.IsTemplate and v.Name == vt_name:
-            vt_match = v.Name
-    return vt_match
+    if get_document_index(doc).contains(VIEW_TEMPLATES, vt_name):
+        return vt_name
+    return None
 
 
 def vp_name_match(vp_name, doc=revit.doc):
-    # return a view template with a given name, None if not found
-    views = DB.FilteredElementCollector(doc).OfClass(DB.Viewport)
-    # if no viewports exist:
-    if not views.ToElements():
+    # return the viewport type name if it exists, otherwise any viewport type name, None if there are none
+    vp_names = get_document_index(doc).names(VIEWPORT_TYPES)
+    if not vp_names:
         return None
-    for v in views:
-        if v.Name == vp_name:
-            return v.Name
-    return views.FirstElement().Name
+    if vp_name in vp_names:
+        return vp_name
+    return sorted(vp_names)[0]
 
 
 def tb_name_match(tb_name, doc=revit.doc):
-    titleblocks = DB.FilteredElementCollector(doc).OfCategory(
-        DB.BuiltInCategory.OST_TitleBlocks).WhereElementIsElementType()
-    for tb in titleblocks:
-        fam_name = tb.Family.Name
-        type_name = get_name(tb)
-        joined_name = fam_name + " : " + type_name
-        if joined_name == tb_name:
-            return joined_name
+    if get_document_index(doc).contains(TITLEBLOCKS, tb_name):
+        return tb_name
 
 
-def unique_view_name(name, suffix=None):
+def unique_view_name(name, suffix=None, doc=revit.doc):
     unique_v_name = name + suffix
-    while get_view(unique_v_name):
+    while get_view(unique_v_name, doc):
         unique_v_name = unique_v_name + " Copy 1"
     return unique_v_name
 
@@ -489,10 +689,13 @@ def get_3Dviewtype_id(doc=revit.doc):
 
 
 def delete_existing_view(view_name, doc=revit.doc):
-    for view in DB.FilteredElementCollector(doc).OfClass(DB.View).ToElements():
+    index = get_document_index(doc)
+    for view in index.lookup(VIEWS, view_name):
         if view.Name == view_name:
             try:
-                doc.Delete(view.Id)
+                view_id = view.Id
+                doc.Delete(view_id)
+                index.remove(view_id)
                 break
             except:
 
@@ -528,19 +731,22 @@ def create_filter_from_rules(rules):
 
 
 def check_filter_exists(filter_name, doc=revit.doc):
-    all_view_filters = DB.FilteredElementCollector(doc).OfClass(DB.FilterElement).ToElements()
-
-    for vf in all_view_filters:
-        if filter_name == str(vf.Name):
-            return vf
+    return get_document_index(doc).first(FILTERS, filter_name)
 
 
 def create_filter(filter_name, bics_list, doc=revit.doc):
     cat_list = List[DB.ElementId](DB.ElementId(cat) for cat in bics_list)
     filter = DB.ParameterFilterElement.Create(doc, filter_name, cat_list)
+    get_document_index(doc).add(FILTERS, filter)
     return filter
 
 
+def delete_filter(filter_element, doc=revit.doc):
+    filter_id = filter_element.Id
+    doc.Delete(filter_id)
+    get_document_index(doc).remove(filter_id)
+
+
 def filter_from_rules(rules, or_rule=False):
     elem_filters = List[DB.ElementFilter]()
     for rule in rules:
@@ -555,21 +761,23 @@ def filter_from_rules(rules, or_rule=False):
 
 def get_param_value_as_string(p):
     # get the value of the element paramter as a string, regardless of the storage type
+    # for reading many elements, use parameters.ParameterColumn
 
     if p.HasValue:
-        if p_storage_type(p) == "ElementId":
+        storage_type = p.StorageType
+        if storage_type == DB.StorageType.ElementId:
             if p.Definition.Name == "Category":
 
                 return p.AsValueString()
             else:
                 return p.AsElementId().IntegerValue
-        elif p_storage_type(p) == "Integer":
+        elif storage_type == DB.StorageType.Integer:
 
             return p.AsInteger()
-        elif p_storage_type(p) == "Double":
+        elif storage_type == DB.StorageType.Double:
 
             return p.AsValueString()
-        elif p_storage_type(p) == "String":
+        elif storage_type == DB.StorageType.String:
 
             return p.AsString()
     else:
@@ -579,13 +787,14 @@ def get_param_value_by_storage_type(p):
     # get the value of the element parameter by storage type
 
     if p.HasValue:
-        if p_storage_type(p) == "ElementId":
+        storage_type = p.StorageType
+        if storage_type == DB.StorageType.ElementId:
             return p.AsElementId()
-        elif p_storage_type(p) == "Integer":
+        elif storage_type == DB.StorageType.Integer:
             return p.AsInteger()
-        elif p_storage_type(p) == "Double":
+        elif storage_type == DB.StorageType.Double:
             return p.AsDouble()
-        elif p_storage_type(p) == "String":
+        elif storage_type == DB.StorageType.String:
             return p.AsString()
     else:
         return
@@ -596,10 +805,7 @@ def p_storage_type(param):
 
 
 def get_parameter_from_name(el, param_name):
-    params = el.Parameters
-    for p in params:
-        if p.Definition.Name == param_name:
-            return p
+    return el.LookupParameter(param_name)
 
 
 def get_builtin_label(bip_or_bic):
@@ -607,32 +813,79 @@ def get_builtin_label(bip_or_bic):
     return DB.LabelUtils.GetLabelFor(bip_or_bic)
 
 def create_filter_by_name_bics(filter_name, bics_list, doc=revit.doc):
-    cat_list = List[DB.ElementId](DB.ElementId(cat) for cat in bics_list)
-    filter = DB.ParameterFilterElement.Create(doc, filter_name, cat_list)
-    return filter
+    return create_filter(filter_name, bics_list, doc)
+
+SharedParameterInfo = namedtuple("SharedParameterInfo", ["guid", "id", "name", "data_type"])
+
+
+class SharedParameterResolver(object):
+    """GUID and Id lookups of the document's shared parameters, read from one SharedParameterElement pass"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._by_guid = {}  # {guid string : SharedParameterInfo}
+        self._by_id = {}  # {id integer : SharedParameterInfo}
+        for sp in DB.FilteredElementCollector(doc).OfClass(DB.SharedParameterElement):
+            definition = sp.GetDefinition()
+            if HOST_APP.is_newer_than(2021):
+                data_type = definition.GetDataType()
+            else:
+                data_type = definition.ParameterType
+            info = SharedParameterInfo(sp.GuidValue, sp.Id, sp.Name, data_type)
+            self._by_guid[str(sp.GuidValue)] = info
+            self._by_id[sp.Id.IntegerValue] = info
+
+    def is_for(self, doc):
+        return self.doc.IsValidObject and self.doc.Equals(doc)
+
+    def by_guid(self, guid):
+        return self._by_guid.get(str(guid))
+
+    def by_id(self, parameter_id):
+        return self._by_id.get(parameter_id.IntegerValue)
+
+    def id_from_guid(self, guid):
+        info = self.by_guid(guid)
+        if info:
+            return info.id
+        return None
+
+    def guid_from_id(self, parameter_id):
+        info = self.by_id(parameter_id)
+        if info:
+            return info.guid
+        return None
+
+    def name(self, guid_or_id):
+        if isinstance(guid_or_id, DB.ElementId):
+            info = self.by_id(guid_or_id)
+        else:
+            info = self.by_guid(guid_or_id)
+        if info:
+            return info.name
+        return None
+
+
+_shared_parameter_resolver = None
+
+
+def get_shared_parameter_resolver(doc=revit.doc):
+    # return the resolver of the document, rebuilt when the document changes
+    global _shared_parameter_resolver
+    if _shared_parameter_resolver is None or not _shared_parameter_resolver.is_for(doc):
+        _shared_parameter_resolver = SharedParameterResolver(doc)
+    return _shared_parameter_resolver
+
+
+def drop_shared_parameter_resolver():
+    global _shared_parameter_resolver
+    _shared_parameter_resolver = None
+
 
 def shared_param_id_from_guid(categories_list, guid, doc=revit.doc):
     # from the GUID, return the id of the shared parameter
-    for bic in categories_list:
-        # iterating through each category helps address cases where some selected categories are not present in the model
-        any_element_of_cat = DB.FilteredElementCollector(doc).OfCategory(
-            bic).WhereElementIsNotElementType().ToElements()
-        for el in any_element_of_cat:
-            element_i_params = el.Parameters
-            for p in element_i_params:
-                try:
-                    if p.GUID == guid:
-                        return p.Id
-                except Exceptions.InvalidOperationException:
-                    pass
-            element_t_params = query.get_type(el).Parameters
-            for p in element_t_params:
-                try:
-                    if p.GUID and p.GUID == guid:
-                        return p.Id
-                except Exceptions.InvalidOperationException:
-                    pass
-    return None
+    # the categories are no longer needed - the lookup does not go through the elements
+    return get_shared_parameter_resolver(doc).id_from_guid(guid)
 
 def get_document_model_bics(doc=revit.doc):
     # get all model builtin categories of the doc
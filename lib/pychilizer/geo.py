@@ -1,7 +1,7 @@
 from pyrevit import revit, DB, script, forms, HOST_APP, coreutils
 import math
 from pyrevit.framework import List
-from pychilizer import database
+from pychilizer import database, spatial, vecmath, shapes, polygons
 from Autodesk.Revit import Exceptions
 
 output = script.get_output()
@@ -40,24 +40,52 @@ def get_ref_lvl_plane(family_doc):
     return [plane for plane in find_planes if plane.Name == ref_level.Name]
 
 
-def find_crop_box(view):
-    with DB.TransactionGroup(revit.doc, "Temp to find crop") as tg:
+def find_crop_boxes(views, doc=revit.doc):
+    # find the crop box elements of many views with one temporary transaction group
+    # the crop boxes are hidden in one go, then shown in one go, and each view's collector is diffed once
+    # returns {view id : crop box element id}, views without a crop box are reported and left out
+    views = list(views)
+    crop_boxes = {}
+    if not views:
+        return crop_boxes
+    with DB.TransactionGroup(doc, "Temp to find crop") as tg:
         tg.Start()
-        with DB.Transaction(revit.doc, "temp") as t2:
+        with DB.Transaction(doc, "temp") as t2:
             t2.Start()
-            view.CropBoxVisible = False
+            for view in views:
+                view.CropBoxVisible = False
             t2.Commit()
-            hidden = DB.FilteredElementCollector(revit.doc, view.Id).ToElementIds()
+            hidden = [DB.FilteredElementCollector(doc, view.Id).ToElementIds() for view in views]
             t2.Start()
-            view.CropBoxVisible = True
+            for view in views:
+                view.CropBoxVisible = True
             t2.Commit()
-            crop_box_el = DB.FilteredElementCollector(revit.doc, view.Id).Excluding(hidden).FirstElement()
-            tg.RollBack()
-            if crop_box_el:
-                return crop_box_el
-            else:
-                print("CROP NOT FOUND")
-                return None
+            for view, hidden_ids in zip(views, hidden):
+                crop_box_id = DB.FilteredElementCollector(doc, view.Id).Excluding(hidden_ids).FirstElementId()
+                if crop_box_id and crop_box_id != DB.ElementId.InvalidElementId:
+                    crop_boxes[view.Id.IntegerValue] = crop_box_id
+        tg.RollBack()
+    database.invalidate_document_index()
+    for view in views:
+        if view.Id.IntegerValue not in crop_boxes:
+            print("CROP NOT FOUND: {}".format(view.Name))
+    return crop_boxes
+
+
+def rotate_crop_box(view, crop_boxes, axis, angle, doc=revit.doc):
+    # rotate the view's crop box found by find_crop_boxes, returns False for views without one
+    crop_box_id = crop_boxes.get(view.Id.IntegerValue)
+    if crop_box_id is None:
+        return False
+    DB.ElementTransformUtils.RotateElement(doc, crop_box_id, axis, angle)
+    return True
+
+
+def find_crop_box(view):
+    crop_box_id = find_crop_boxes([view]).get(view.Id.IntegerValue)
+    if crop_box_id:
+        return revit.doc.GetElement(crop_box_id)
+    return None
 
 '''Create a new cropbox for a 3D view based on a Section Box
 Won't run if no Section Box is active'''
@@ -70,14 +98,9 @@ def crop_axo(view3d):
     crop_box = view3d.CropBox   # get the crop box of the view (bounding box)
     section_box = view3d.GetSectionBox()    # get the section box (bounding box)
     trans = crop_box.Transform  # get the view crop box Transform, will be used to convert from World Coordinates to View Coordinates
-    corners = bb_corners(section_box, trans)    # get the actual corners of the section box in View Coordinates
+    corners = bb_corner_points(section_box, trans)    # get the actual corners of the section box in View Coordinates
 
-    minX = min(corners, key=lambda x: x.X).X    
-    minY = min(corners, key=lambda x: x.Y).Y
-    minZ = min(corners, key=lambda x: x.Z).Z
-    maxX = max(corners, key=lambda x: x.X).X
-    maxY = max(corners, key=lambda x: x.Y).Y
-    maxZ = max(corners, key=lambda x: x.Z).Z
+    (minX, minY, minZ), (maxX, maxY, maxZ) = vecmath.bounds(corners)
 
     # offset by 1/10 of the crop box outword
     d = 0.05 * (maxX - minX)
@@ -95,76 +118,216 @@ def crop_axo(view3d):
     view3d.CropBox = crop_box
 
 '''A helper method to calculate the actual Section Box corners from World to View Coordinates'''
+def bb_corner_points(box, transform):
+    # the corners as vecmath.Vec3, box coordinates to world, then world to the given transform's coordinates
+    to_view = vecmath.from_transform(transform).inverse.multiply(vecmath.from_transform(box.Transform))
+    return [to_view.of_point(corner)
+            for corner in vecmath.box_corners(vecmath.from_xyz(box.Min), vecmath.from_xyz(box.Max))]
+
+
 def bb_corners(box, transform):
-    b_ll = box.Min    #lower left
-    b_lr = DB.XYZ(box.Max.X, box.Min.Y, box.Min.Z) # lower right
-    b_ul = DB.XYZ(box.Min.X, box.Max.Y, box.Min.Z) # upper left
-    b_ur = DB.XYZ(box.Max.X, box.Max.Y, box.Min.Z) # upper right
-    t_ur = box.Max # upper right
-    t_ul = DB.XYZ(box.Min.X, box.Max.Y, box.Max.Z) # upper left
-    t_lr = DB.XYZ(box.Max.X, box.Min.Y, box.Max.Z) # lower right
-    t_ll = DB.XYZ(box.Min.X, box.Min.Y, box.Max.Z) # lower left
-    out = [b_ll, b_lr, b_ul, b_ur, t_ur, t_ul, t_lr, t_ll]
-    for index, o in enumerate(out):
-        out[index] = box.Transform.OfPoint(out[index])
-        out[index] = transform.Inverse.OfPoint(out[index])
-    return out
-    
+    return [to_xyz(corner) for corner in bb_corner_points(box, transform)]
+
+
+def to_xyz(v):
+    return DB.XYZ(v.x, v.y, v.z)
+
+
+def to_transform(affine):
+    transform = DB.Transform.Identity
+    transform.BasisX = to_xyz(affine.basis_x)
+    transform.BasisY = to_xyz(affine.basis_y)
+    transform.BasisZ = to_xyz(affine.basis_z)
+    transform.Origin = to_xyz(affine.origin)
+    return transform
+
+
+def to_line(segment):
+    return DB.Line.CreateBound(to_xyz(segment.start), to_xyz(segment.end))
 
-def point_equal_list(pt, lst):
-    for el in list(lst):
-        if pt.IsAlmostEqualTo(el, 0.003):
-            return el
-    else:
-        return None
+
+def xyz_tuple(pt):
+    return pt.X, pt.Y, pt.Z
 
 
 def get_open_ends(curves_list):
     #check if any open ends in a curves list
-    endpoints = []
-    for curve in curves_list:
-        for i in range(2):
-            duplicate = point_equal_list(curve.GetEndPoint(i), endpoints)
-            if duplicate:
-                endpoints.remove(duplicate)
-            else:
-                endpoints.append(curve.GetEndPoint(i))
+    segments = [(xyz_tuple(curve.GetEndPoint(0)), xyz_tuple(curve.GetEndPoint(1))) for curve in curves_list]
+    endpoints = [curves_list[i].GetEndPoint(end) for pt, i, end in spatial.open_ends(segments)]
     if endpoints:
         return endpoints
     else:
         return None
 
 
+def snap_curve_endpoints(curves_list):
+    # rebuild lines whose endpoints are within tolerance of another endpoint, so they join exactly
+    # curves that are not lines are returned as they are
+    curves_list = list(curves_list)
+    segments = [(xyz_tuple(curve.GetEndPoint(0)), xyz_tuple(curve.GetEndPoint(1))) for curve in curves_list]
+    snapped = []
+    for curve, segment, snapped_segment in zip(curves_list, segments, spatial.snap_segments(segments)):
+        if segment == snapped_segment or not isinstance(curve, DB.Line):
+            snapped.append(curve)
+            continue
+        start, end = [DB.XYZ(*pt) for pt in snapped_segment]
+        snapped.append(DB.Line.CreateBound(start, end) if not start.IsAlmostEqualTo(end) else curve)
+    return snapped
+
+
+# {(document hash, room id) : RoomGeometrySnapshot} of the run. Rooms are not modified while a script runs, the room
+# scripts drop the snapshots when they start and end, so a snapshot never outlives the geometry it read
+_room_snapshots = {}
+
+
+class RoomGeometrySnapshot(object):
+    """The geometry of a room, each part read from the room once and shared by the geo helpers"""
+
+    def __init__(self, room):
+        self.room = room
+        self.id = room.Id
+        self.level = room.Level
+        self.location = room.Location.Point
+        self._loops = None
+        self._open_ends = None
+        self._longest = None
+        self._angle = None
+        self._shell = None
+        self._shell_box = None
+        self._rotated_boxes = {}  # {angle : bounding box of the shell rotated by -angle}
+        self._shape = None
+        self._crop_strategies = {}  # {offset : (strategy, reason)}
+
+    @property
+    def boundary_loops(self):
+        # [[curve]] for each boundary loop
+        if self._loops is None:
+            segments = self.room.GetBoundarySegments(DB.SpatialElementBoundaryOptions())
+            self._loops = [[s.GetCurve() for s in loop] for loop in segments] if segments else []
+        return self._loops
+
+    @property
+    def outer_loop(self):
+        return self.boundary_loops[0] if self.boundary_loops else []
+
+    @property
+    def has_open_ends(self):
+        if self._open_ends is None:
+            self._open_ends = bool(get_open_ends(self.outer_loop))
+        return self._open_ends
+
+    @property
+    def longest_boundary(self):
+        # the longest boundary that is not an arc
+        if self._longest is None:
+            longest = None
+            for loop in self.boundary_loops:
+                for curve in loop:
+                    if isinstance(curve, DB.Line) and (longest is None or curve.Length > longest.Length):
+                        longest = curve
+            self._longest = longest
+        return self._longest
+
+    @property
+    def rotation_angle(self):
+        if self._angle is None:
+            self._angle = longest_boundary_angle(self.longest_boundary)
+        return self._angle
+
+    @property
+    def closed_shell(self):
+        if self._shell is None:
+            self._shell = self.room.ClosedShell
+        return self._shell
+
+    @property
+    def shell_box(self):
+        if self._shell_box is None:
+            self._shell_box = self.closed_shell.GetBoundingBox()
+        return self._shell_box
+
+    @property
+    def shape(self):
+        # shapes.ShapeFrame of the boundary loops, None for rooms without boundaries
+        if self._shape is None and self.boundary_loops:
+            loops = []
+            for loop in self.boundary_loops:
+                points = []
+                for curve in loop:
+                    start = curve.GetEndPoint(0)
+                    if isinstance(curve, DB.Line):
+                        points.append((start.X, start.Y, start.Z, shapes.LINE))
+                    else:
+                        middle = curve.Evaluate(0.5, True)
+                        points.append((start.X, start.Y, start.Z, shapes.ARC))
+                        points.append((middle.X, middle.Y, middle.Z, shapes.ARC_MIDDLE))
+                loops.append(points)
+            self._shape = shapes.shape_frame(loops)
+        return self._shape
+
+    @property
+    def outer_points(self):
+        # (x, y) start points of the outer loop
+        return [(curve.GetEndPoint(0).X, curve.GetEndPoint(0).Y) for curve in self.outer_loop]
+
+    def crop_strategy(self, offset):
+        # (polygons strategy, reason) for offsetting the outer loop, checked before asking Revit to offset it
+        if offset not in self._crop_strategies:
+            has_arcs = any(not isinstance(curve, DB.Line) for curve in self.outer_loop)
+            self._crop_strategies[offset] = polygons.crop_strategy(self.outer_points, offset, has_arcs)
+        return self._crop_strategies[offset]
+
+    def rotated_shell_box(self, angle):
+        # bounding box of the shell rotated by -angle around the room location, and the rotation used
+        rotation = DB.Transform.CreateRotationAtPoint(DB.XYZ.BasisZ, -angle, self.location)
+        if angle not in self._rotated_boxes:
+            self._rotated_boxes[angle] = self.closed_shell.GetTransformed(rotation).GetBoundingBox()
+        return self._rotated_boxes[angle], rotation
+
+
+def get_room_snapshot(room):
+    # the snapshot of the room, shared until drop_room_snapshots. Accepts a snapshot as well
+    if isinstance(room, RoomGeometrySnapshot):
+        return room
+    key = (room.Document.GetHashCode(), room.Id.IntegerValue)
+    snapshot = _room_snapshots.get(key)
+    if snapshot is None:
+        snapshot = RoomGeometrySnapshot(room)
+        _room_snapshots[key] = snapshot
+    return snapshot
+
+
+def drop_room_snapshots():
+    global _room_snapshots
+    _room_snapshots = {}
+
+
+def room_fingerprint(room):
+    # changes with the room's boundaries, height, level, number or name
+    snapshot = get_room_snapshot(room)
+    loops = [[xyz_tuple(curve.Evaluate(p, True)) for curve in loop for p in (0.0, 0.5)]
+             for loop in snapshot.boundary_loops]
+    name = room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString()
+    return spatial.fingerprint(loops, round(room.UnboundedHeight, 3), snapshot.level.Id.IntegerValue, room.Number, name)
+
 
 def get_room_bound(r):
-    room_boundaries = DB.CurveLoop()
-    # get room boundary segments
-    room_segments = r.GetBoundarySegments(DB.SpatialElementBoundaryOptions())
-    # iterate through loops of segments and add them to the array
-    outer_loop = room_segments[0]
-    # for curve in outer_loop:
-    curve_loop = [s.GetCurve() for s in outer_loop]
-    open_ends = get_open_ends(curve_loop)
-    if open_ends:
+    snapshot = get_room_snapshot(r)
+    if snapshot.has_open_ends:
         return None
-    for curve in curve_loop:
+    room_boundaries = DB.CurveLoop()
+    # the open ends check matches endpoints within a looser tolerance than the curve loop's, make them join exactly
+    for curve in snap_curve_endpoints(snapshot.outer_loop):
         try:
             room_boundaries.Append(curve)
         except Exceptions.ArgumentException:
-            print("Boundary curve makes the loop not contiguous in room {}.".format(output.linkify(r.Id)))
+            print("Boundary curve makes the loop not contiguous in room {}.".format(output.linkify(snapshot.id)))
     return room_boundaries
 
 
 def get_longest_boundary(r):
     # get the rooms's longest boundary that is not an arc
-    bound = r.GetBoundarySegments(DB.SpatialElementBoundaryOptions())
-    longest = None
-    for loop in bound:
-        for b in loop:
-            curve = b.GetCurve()
-            if curve.Length > longest and isinstance(curve, DB.Line):
-                longest = curve
-    return longest
+    return get_room_snapshot(r).longest_boundary
 
 
 def line_as_vector(line):
@@ -176,171 +339,136 @@ def line_as_vector(line):
 
 def rotation_angle(line, base):
     # calculate the rotation of the line from a given reference
-
-    vector = line_as_vector(line)
-    up = DB.XYZ(base.X, base.Y+1, base.Z)
-    y_direction = up-base
-
-    angle = vector.AngleTo(y_direction)
-    return angle
+    # the reference is the Y direction, so the base point does not change the result
+    vector = vecmath.from_xyz(line_as_vector(line))
+    return vector.angle_to(vecmath.BASIS_Y)
 
 
 def room_rotation_angle(room):
     # get the angle of the room's longest boundary to Y axis
     # choose one longest curve to use as reference for rotation
+    return get_room_snapshot(room).rotation_angle
 
-    longest_boundary = get_longest_boundary(room)
-    v = line_as_vector(longest_boundary)
 
-    y1 = room.Location.Point
-    y2 = DB.XYZ(y1.X, y1.Y+1, y1.Z)
-    y_dir = y2-y1
+def longest_boundary_angle(longest_boundary, y1=None):
+    v = vecmath.from_xyz(line_as_vector(longest_boundary))
+    y_dir = vecmath.BASIS_Y
 
     # get angle and correct value
-    angle = v.AngleTo(y_dir)
-    # print ("initial angle: {}\n".format(math.degrees(angle)))
+    angle = v.angle_to(y_dir)
 
-    rotation = DB.Transform.CreateRotation(DB.XYZ.BasisZ, -angle)
-    rotated_vector = rotation.OfVector(v)
-    must_be_zero = math.degrees(rotated_vector.AngleTo(y_dir))
-    # print ("angle between rotated and Y vector : {}\n".format(math.degrees(must_be_zero)))
+    rotated_vector = vecmath.Affine.rotation(vecmath.BASIS_Z, -angle).of_vector(v)
+    must_be_zero = math.degrees(rotated_vector.angle_to(y_dir))
     if round(must_be_zero, 0) != math.radians(0):
         angle = -angle
-        rotation2 = DB.Transform.CreateRotation(DB.XYZ.BasisZ, -angle)
-        rotated_vector2 = rotation2.OfVector(v)
-        must_be_zero2 = math.degrees(rotated_vector2.AngleTo(y_dir))
-        # print("corrected angle {}, second check{}".format(math.degrees(angle), math.degrees(must_be_zero2)))
+        rotated_vector2 = vecmath.Affine.rotation(vecmath.BASIS_Z, -angle).of_vector(v)
+        must_be_zero2 = math.degrees(rotated_vector2.angle_to(y_dir))
         if round(must_be_zero2,0) != math.radians(0):
             angle = math.radians(90)-angle
 
 
+    return fold_angle(angle)
+
+
+def fold_angle(angle):
+    # the same view rotation, within -90 and 90 degrees
     while abs(angle) > math.radians(90):
         if angle > math.radians(0):
             angle = angle - math.radians(90)
         elif angle < math.radians(0):
             angle = angle + math.radians(90)
-    # print ("final angle", angle)
     return angle
 
 
 def get_bb_outline(bb):
+    x0, y0, z = bb.Min.X, bb.Min.Y, bb.Min.Z
+    x1, y1 = bb.Max.X, bb.Max.Y
+    outline = vecmath.rectangle([vecmath.Vec3(x0, y0, z), vecmath.Vec3(x1, y0, z),
+                                 vecmath.Vec3(x1, y1, z), vecmath.Vec3(x0, y1, z)])
+    return [to_line(segment) for segment in outline]
+
 
-    r1 = DB.XYZ(bb.Min.X, bb.Min.Y, bb.Min.Z)
-    r2 = DB.XYZ(bb.Max.X, bb.Min.Y, bb.Min.Z)
-    r3 = DB.XYZ(bb.Max.X, bb.Max.Y, bb.Min.Z)
-    r4 = DB.XYZ(bb.Min.X, bb.Max.Y, bb.Min.Z)
+def outward_offset_normal(corners, view_direction):
+    # view_direction or its opposite, whichever a loop through the corners runs counterclockwise around,
+    # so that a positive offset of the loop goes outwards
+    normal = vecmath.loop_normal(corners)
+    return view_direction if normal.dot(vecmath.from_xyz(view_direction)) >= 0 else view_direction.Negate()
 
-    l1 = DB.Line.CreateBound(r1, r2)
-    l2 = DB.Line.CreateBound(r2, r3)
-    l3 = DB.Line.CreateBound(r3, r4)
-    l4 = DB.Line.CreateBound(r4, r1)
 
-    curves_set = [l1, l2, l3, l4]
-    return curves_set
+def facing_corners(corner_sets, view_direction):
+    # the set of corners whose plane faces the view the most
+    direction = vecmath.from_xyz(view_direction)
+    return max(corner_sets, key=lambda corners: abs(vecmath.loop_normal(corners).normalize().dot(direction)))
 
 
-def set_crop_to_bb(element, view, crop_offset, doc=revit.doc):
+def offset_crop_loop(corners, crop_offset, view_direction):
+    # the loop through the corners, offset outwards in the view
+    crop_loop = DB.CurveLoop.Create(List[DB.Curve]([to_line(segment) for segment in vecmath.rectangle(corners)]))
+    normal = outward_offset_normal(corners, view_direction)
+    curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, normal)
+    # a cheap check on the side picked above
+    if curve_loop_offset.GetExactLength() < crop_loop.GetExactLength():
+        curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, normal.Negate())
+    return curve_loop_offset
+
+
+def set_crop_to_bb(element, view, crop_offset, doc=revit.doc, regenerate=True):
     try:
         # set the crop box of the view to elements's bounding box in that view
-        # draw 2 sets of outlines for each orientation (front/back, left/right)
+        # of the 2 diagonal planes of the box (front/back, left/right), crop to the one facing the view
         # deactivate crop first, just to make sure the element appears in view
-        view.CropBoxActive = False
-        doc.Regenerate()
+        # with regenerate=False the caller has deactivated the crop and regenerated already
+        if regenerate:
+            view.CropBoxActive = False
+            doc.Regenerate()
 
         bb = element.get_BoundingBox(view)
 
-        pt1 = DB.XYZ(bb.Max.X, bb.Max.Y, bb.Min.Z)
-        pt2 = DB.XYZ(bb.Max.X, bb.Max.Y, bb.Max.Z)
-        pt3 = DB.XYZ(bb.Min.X, bb.Min.Y, bb.Max.Z)
-        pt4 = DB.XYZ(bb.Min.X, bb.Min.Y, bb.Min.Z)
-
-        pt7 = DB.XYZ(bb.Min.X, bb.Max.Y, bb.Min.Z)
-        pt8 = DB.XYZ(bb.Min.X, bb.Max.Y, bb.Max.Z)
-        pt5 = DB.XYZ(bb.Max.X, bb.Min.Y, bb.Max.Z)
-        pt6 = DB.XYZ(bb.Max.X, bb.Min.Y, bb.Min.Z)
-
-        l1 = DB.Line.CreateBound(pt1, pt2)
-        l2 = DB.Line.CreateBound(pt2, pt3)
-        l3 = DB.Line.CreateBound(pt3, pt4)
-        l4 = DB.Line.CreateBound(pt4, pt1)
-
-        l5 = DB.Line.CreateBound(pt6, pt5)
-        l6 = DB.Line.CreateBound(pt5, pt8)
-        l7 = DB.Line.CreateBound(pt8, pt7)
-        l8 = DB.Line.CreateBound(pt7, pt6)
-
-        curves_set1 = [l1, l2, l3, l4]
-        curves_set2 = [l5, l6, l7, l8]
+        (x0, y0, z0), (x1, y1, z1) = vecmath.from_xyz(bb.Min), vecmath.from_xyz(bb.Max)
+        Vec3 = vecmath.Vec3
+        # the two diagonal planes of the box
+        corners_set1 = [Vec3(x1, y1, z0), Vec3(x1, y1, z1), Vec3(x0, y0, z1), Vec3(x0, y0, z0)]
+        corners_set2 = [Vec3(x1, y0, z0), Vec3(x1, y0, z1), Vec3(x0, y1, z1), Vec3(x0, y1, z0)]
 
         crsm = view.GetCropRegionShapeManager()
         view_direction = view.ViewDirection
+        corners = facing_corners([corners_set1, corners_set2], view_direction)
 
         view.CropBoxActive = True
-        # offset will fail if crop offset value too small
+        # offset will fail if crop offset value too large for the box
         try:
-            # try with set 1, if doesn't work try with set 2
-            crop_loop = DB.CurveLoop.Create(List[DB.Curve](curves_set1))
-            # offset the crop with the specified offset
-            curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, view_direction)
-            # in case the offset works inwards, correct it to offset outwards
-            if curve_loop_offset.GetExactLength() < crop_loop.GetExactLength():
-                curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, -view_direction)
-            crsm.SetCropShape(curve_loop_offset)
-        except:
-            crop_loop = DB.CurveLoop.Create(List[DB.Curve](curves_set2))
-            try:
-                curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, view_direction) # fails here
-            except Exceptions.InternalException:
-                forms.alert("Room crop failed. This might be happening if the room placement point is not in the room -- or -- if the Crop Offset is set to a value too large. Review and try again")
-                return False
-            if curve_loop_offset.GetExactLength() < crop_loop.GetExactLength():
-                curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, -view_direction)
-            crsm.SetCropShape(curve_loop_offset)
+            curve_loop_offset = offset_crop_loop(corners, crop_offset, view_direction)
+        except Exceptions.InternalException:
+            forms.alert("Room crop failed. This might be happening if the room placement point is not in the room -- or -- if the Crop Offset is set to a value too large. Review and try again")
+            return False
+        crsm.SetCropShape(curve_loop_offset)
 
         return True
     except Exception as e:
         forms.alert("An exception occurred: {}\nPlease contact 'info@archilizer.com' if you run into an error here.".format(e))
         return False
 
-def set_crop_to_boundary(room, boundary_curve, view, crop_offset, doc=revit.doc):
+def set_crop_to_boundary(room, boundary_curve, view, crop_offset, doc=revit.doc, regenerate=True):
     # set the crop box of the view to match the boundary in width and room's bounding box in that view in height
     # deactivate crop first, just to make sure the element appears in view
-    view.CropBoxActive = False
-    doc.Regenerate()
+    # with regenerate=False the caller has deactivated the crop and regenerated already
+    if regenerate:
+        view.CropBoxActive = False
+        doc.Regenerate()
 
     b_start = boundary_curve.GetEndPoint(0)
     b_end = boundary_curve.GetEndPoint(1)
 
     bb = room.get_BoundingBox(view)
 
-    pt1 = DB.XYZ(b_start.X, b_start.Y, bb.Min.Z)
-    pt2 = DB.XYZ(b_start.X, b_start.Y, bb.Max.Z)
-    pt3 = DB.XYZ(b_end.X, b_end.Y, bb.Max.Z)
-    pt4 = DB.XYZ(b_end.X, b_end.Y, bb.Min.Z)
-
-    l1 = DB.Line.CreateBound(pt1, pt2)
-    l2 = DB.Line.CreateBound(pt2, pt3)
-    l3 = DB.Line.CreateBound(pt3, pt4)
-    l4 = DB.Line.CreateBound(pt4, pt1)
-
-    curves_set = [l1, l2, l3, l4]
+    Vec3 = vecmath.Vec3
+    corners = [Vec3(b_start.X, b_start.Y, bb.Min.Z), Vec3(b_start.X, b_start.Y, bb.Max.Z),
+               Vec3(b_end.X, b_end.Y, bb.Max.Z), Vec3(b_end.X, b_end.Y, bb.Min.Z)]
 
     crsm = view.GetCropRegionShapeManager()
-    view_direction = view.ViewDirection
 
     view.CropBoxActive = True
-    # offset will fail if crop offset value too small
-
-    crop_loop = DB.CurveLoop.Create(List[DB.Curve](curves_set))
-    # offset the crop with the specified offset
-    try:
-        curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, view_direction)
-    except Exception:
-        curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, -view_direction)
-    # in case the offset works inwards, correct it to offset outwards
-    if curve_loop_offset.GetExactLength() < crop_loop.GetExactLength():
-        curve_loop_offset = DB.CurveLoop.CreateViaOffset(crop_loop, crop_offset, -view_direction)
-    crsm.SetCropShape(curve_loop_offset)
+    crsm.SetCropShape(offset_crop_loop(corners, crop_offset, view.ViewDirection))
 
     return
 
@@ -368,30 +496,36 @@ def get_aligned_crop(geo, transform):
     return crop_loop
 
 
-def get_unique_borders(borders, tolerance):
+def get_unique_borders(borders, tolerance, merge=False):
     # sort the borders discarding overlapping ones (lying on same axis)
-    axis_set = []
-    sorted_lines = []
+    # with merge, the lines on one axis are replaced by a single line spanning all of them
+    borders = list(borders)
+    axes = []
     for curve in borders:
-        deriv = curve.ComputeDerivatives(0.5, True)
-        tangent = deriv.BasisX
-        pt = curve.Evaluate(0.5, True)
-        axis = DB.Line.CreateUnbound(pt, tangent)
-        on_axis = False
-        if not axis_set:
-            axis_set.append(axis)
-            sorted_lines.append(curve)
-        for line in axis_set:
-            distance = line.Distance(pt)
-            # print (distance)
-            if distance <= tolerance:
-                on_axis = True
-        if not on_axis:
-            axis_set.append(axis)
-            sorted_lines.append(curve)
+        if isinstance(curve, DB.Line):
+            axes.append((xyz_tuple(curve.GetEndPoint(0)), xyz_tuple(curve.Direction)))
+        else:
+            axes.append((xyz_tuple(curve.Evaluate(0.5, True)),
+                         xyz_tuple(curve.ComputeDerivatives(0.5, True).BasisX)))
+    sorted_lines = []
+    for group in spatial.collinear_groups(axes, tolerance):
+        lines = [borders[i] for i in group]
+        if not merge or len(lines) == 1 or not all(isinstance(line, DB.Line) for line in lines):
+            sorted_lines.append(lines[0])
+            continue
+        start, end = spatial.merge_span(
+            [(xyz_tuple(line.GetEndPoint(0)), xyz_tuple(line.GetEndPoint(1))) for line in lines])
+        sorted_lines.append(DB.Line.CreateBound(DB.XYZ(*start), DB.XYZ(*end)))
     return sorted_lines
 
 
+def unique_border_spans(borders, tolerance):
+    # [(line spanning the borders of one axis, first border of that axis)]: an elevation cropped to the span, with
+    # its marker in front of the first border, which is a wall of the room even where the span crosses a recess
+    borders = list(borders)
+    return list(zip(get_unique_borders(borders, tolerance, merge=True), get_unique_borders(borders, tolerance)))
+
+
 def discard_short(curves, threshold):
     return [curve for curve in curves if curve.Length > threshold]
 
@@ -447,22 +581,26 @@ def room_to_extrusion(r, family_doc):
 
 
 def create_room_axo_rotate(room, angle=None, view_scale=50, doc=revit.doc):
+    snapshot = get_room_snapshot(room)
     if angle == None:
-        angle = room_rotation_angle(room)
+        angle = snapshot.rotation_angle
 
     # create 3D axo for a room, rotate the Section Box to fit
     threeD_type = database.get_view_family_types(DB.ViewFamily.ThreeDimensional, doc)[0]
 
     threeD = DB.View3D.CreateIsometric(doc, threeD_type.Id)
     threeD.Scale = view_scale
+    fit_axo_to_room(threeD, snapshot, angle, doc)
+    return threeD
+
 
-    # 1. rotate room geometry
-    room_shell = room.ClosedShell
-    rotation = DB.Transform.CreateRotationAtPoint(DB.XYZ.BasisZ, -angle, room.Location.Point)
-    rotated_shell = room_shell.GetTransformed(rotation)
+def fit_axo_to_room(threeD, room, angle=None, doc=revit.doc):
+    snapshot = get_room_snapshot(room)
+    if angle == None:
+        angle = snapshot.rotation_angle
 
-    # 2. get the bbox of the rotated shell
-    shell_bb = rotated_shell.GetBoundingBox()
+    # 1. rotate room geometry and get the bbox of the rotated shell
+    shell_bb, rotation = snapshot.rotated_shell_box(angle)
     rotate_back = rotation.Inverse
 
     # rotate the bbox back
@@ -485,41 +623,189 @@ def create_room_axo_rotate(room, angle=None, view_scale=50, doc=revit.doc):
     doc.Regenerate()
     crop_axo(threeD)
 
-    return threeD
-
 
 def room_bb_outlines(room, angle=None):
+    snapshot = get_room_snapshot(room)
     if angle==None:
-        angle=room_rotation_angle(room)
+        angle=snapshot.rotation_angle
     # get the outlines of a room's bounding box, rotated
-    rotation = DB.Transform.CreateRotationAtPoint(DB.XYZ.BasisZ, angle, room.Location.Point)
-    rotated_crop_loop = get_aligned_crop(room.ClosedShell, rotation.Inverse)
-    return rotated_crop_loop
-
-
-def orient_elevation_to_line(doc, elevation_marker, marker_center, line, elevation_id, view):
-    # rotate the elevation marker to face a line, with given marker center
-    # get the elevation with the elevation id
-    elevation_view = doc.GetElement(elevation_marker.GetViewId(elevation_id))
-    # get the view direction of the elevation view (facing the viewer)
-    view_direction = elevation_view.ViewDirection
-    # note: the origin of the elevation view is NOT the center of the marker
-    bb = elevation_marker.get_BoundingBox(view)
-    center = (bb.Max + bb.Min) / 2
-
-    # project the origin onto the line and get closest point
-    project = line.Project(center)
-    project_point = project.XYZPoint
-    # construct a line from from the projected point to origin and get its vector
-    projection_direction = DB.Line.CreateBound(project_point, center).Direction
-    vectors_angle = view_direction.AngleOnPlaneTo(projection_direction, DB.XYZ.BasisZ)
-    # calculate the rotation angle
-    rotation_angle = vectors_angle - math.radians(360)
+    rb, rotation = snapshot.rotated_shell_box(angle)
+    # rotate the curves back using the opposite direction
+    tr_back = rotation.Inverse
+    rotate_curves_back = [c.CreateTransformed(tr_back) for c in get_bb_outline(rb)]
+    return DB.CurveLoop.Create(List[DB.Curve](rotate_curves_back))
+
+
+def boundary_box_loop(room, angle=None):
+    # the rectangle around the room's outer boundary, turned by angle, at the level of the boundary
+    # the same box as room_bb_outlines, without the room's closed shell
+    snapshot = get_room_snapshot(room)
+    if angle is None:
+        angle = snapshot.rotation_angle
+    z = snapshot.outer_loop[0].GetEndPoint(0).Z
+    corners = [vecmath.Vec3(x, y, z) for x, y in polygons.rotated_rectangle(snapshot.outer_points, angle)]
+    return DB.CurveLoop.Create(List[DB.Curve]([to_line(segment) for segment in vecmath.rectangle(corners)]))
+
+
+class RepeatedRooms(object):
+    """Crop loops, rotation angles and elevation boundaries worked out once per room shape, and moved onto the
+    other rooms of that shape. Rooms share a shape when they differ only by translation and rotation in plan"""
+
+    def __init__(self):
+        self.cache = shapes.ShapeCache()
+        self.crop_paths = {}  # {room id : (crop strategy, reason)}, rooms tried again are counted once
+
+    def _lookup(self, room, name, compute, *values):
+        # (result, shape it was worked out for, shape of this room)
+        shape = get_room_snapshot(room).shape
+        if shape is None:
+            return compute(), None, None
+        key = (name, shape.key, values)
+        found = self.cache.get(key)
+        if found is None:
+            found = self.cache.put(key, (shape, compute()))
+        source, result = found
+        return result, source, shape
+
+    def rotation_angle(self, room):
+        angle, source, shape = self._lookup(room, "angle", lambda: room_rotation_angle(room))
+        if source is None or source is shape:
+            return angle
+        return fold_angle(angle + source.turn_to(shape))
+
+    def crop_loop(self, room, offset, angle=None):
+        # the room's boundary offset outwards, or its bounding box turned by angle for shapes the offset fails on
+        # the strategy is picked by checking the boundary first, only boundaries with arcs are tried and caught
+        if angle is None:
+            angle = self.rotation_angle(room)
+        # the box turns with the room: rooms of one shape share it when their angles agree in the shape's frame,
+        # a rectangle turned by a quarter turn being the same rectangle
+        shape = get_room_snapshot(room).shape
+        frame_angle = round((angle - shape.angle) % (math.pi / 2), 6) if shape else None
+        if frame_angle == round(math.pi / 2, 6):
+            frame_angle = 0.0
+
+        def offset_loop():
+            room_boundaries = get_room_bound(room)
+            if not room_boundaries:
+                return None, None, None
+            snapshot = get_room_snapshot(room)
+            strategy, reason = snapshot.crop_strategy(offset)
+            if strategy == polygons.BOUNDING_BOX:
+                return DB.CurveLoop.CreateViaOffset(boundary_box_loop(snapshot, angle), offset, DB.XYZ.BasisZ), \
+                    strategy, reason
+            try:
+                return DB.CurveLoop.CreateViaOffset(room_boundaries, offset, DB.XYZ.BasisZ), strategy, reason
+            except Exception:
+                # an arc the offset cannot follow, or a boundary the checks let through
+                reason = reason or "offset failed"
+                return DB.CurveLoop.CreateViaOffset(boundary_box_loop(snapshot, angle), offset, DB.XYZ.BasisZ), \
+                    polygons.BOUNDING_BOX, reason
+
+        found, source, shape = self._lookup(room, "crop", offset_loop, round(offset, 6), frame_angle)
+        loop, strategy, reason = found
+        if strategy:
+            self.crop_paths[room.Id.IntegerValue] = (strategy, reason)
+        if loop is None or source is None or source is shape:
+            return loop
+        return DB.CurveLoop.CreateViaTransform(loop, to_transform(source.transform_to(shape)))
+
+    def elevation_boundaries(self, room, min_length, marker_offset, tolerance):
+        # [(boundary line, elevation marker point)] for the lines of the room's boundary longer than min_length,
+        # one per axis: the lines lying on one axis within tolerance make one boundary spanning them.
+        # None for rooms whose boundary is not closed
+        def boundaries():
+            room_loop = get_room_bound(room)
+            if not room_loop:
+                return None
+            lines = [curve for curve in discard_short(room_loop, min_length) if isinstance(curve, DB.Line)]
+            spans = unique_border_spans(lines, tolerance)
+            points = boundary_marker_points([first for span, first in spans], marker_offset,
+                                            is_counterclockwise(room_loop))
+            return list(zip([span for span, first in spans], points))
+
+        found, source, shape = self._lookup(room, "elevations", boundaries, round(min_length, 6),
+                                            round(marker_offset, 6), round(tolerance, 6))
+        if found is None or source is None or source is shape:
+            return found
+        transform = to_transform(source.transform_to(shape))
+        return [(line.CreateTransformed(transform), transform.OfPoint(point)) for line, point in found]
+
+    def summary(self):
+        return self.cache.summary("room lookups")
+
+    def crop_report(self):
+        # how many rooms were cropped to their boundary and which fell back to their bounding box, and why
+        lines = []
+        for strategy in (polygons.OFFSET, polygons.TRY_OFFSET, polygons.BOUNDING_BOX):
+            rooms = sorted((room_id, reason) for room_id, (room_strategy, reason) in self.crop_paths.items()
+                           if room_strategy == strategy)
+            if not rooms:
+                continue
+            lines.append("Crop by {}: {} rooms".format(strategy, len(rooms)))
+            if strategy != polygons.OFFSET:
+                for room_id, reason in rooms:
+                    lines.append("    {} ({})".format(output.linkify(DB.ElementId(room_id)), reason))
+        return "\n".join(lines)
+
+
+# view directions (towards the viewer) of the elevations of an unrotated marker, by elevation index:
+# 0 looks left, 1 up, 2 right and 3 down in plan
+ELEVATION_VIEW_DIRECTIONS = {
+    0: vecmath.Vec3(1.0, 0.0, 0.0),
+    1: vecmath.Vec3(0.0, -1.0, 0.0),
+    2: vecmath.Vec3(-1.0, 0.0, 0.0),
+    3: vecmath.Vec3(0.0, 1.0, 0.0),
+}
+
+
+def elevation_marker_turn(marker_center, line, elevation_id=0, view_direction=None):
+    # the angle to turn an unrotated marker around its center, so the elevation faces the line
+    # worked out from the line's end points, without asking Revit for the marker's bounding box
+    if view_direction is None:
+        view_direction = ELEVATION_VIEW_DIRECTIONS[elevation_id]
+    center = vecmath.from_xyz(marker_center)
+    segment = vecmath.Segment(vecmath.from_xyz(line.GetEndPoint(0)), vecmath.from_xyz(line.GetEndPoint(1)))
+    # from the closest point of the line to the marker, in plan
+    facing = center - segment.project(center)
+    return view_direction.angle_on_plane_to(vecmath.Vec3(facing.x, facing.y, 0.0), vecmath.BASIS_Z)
+
+
+def orient_elevation_to_line(doc, elevation_marker, marker_center, line, elevation_id, view=None):
+    # rotate a new elevation marker to face a line, with given marker center (its insertion point)
+    angle = elevation_marker_turn(marker_center, line, elevation_id)
     marker_axis = DB.Line.CreateBound(marker_center, marker_center + DB.XYZ.BasisZ)
-    elevation_marker.Location.Rotate(marker_axis, rotation_angle)
+    elevation_marker.Location.Rotate(marker_axis, angle)
     return elevation_marker
 
 
+def orient_elevation_markers(doc, markers, elevation_id=0):
+    # orient_elevation_to_line for [(marker, marker center, line)]
+    # each marker turns around its own center, so markers cannot share one RotateElements call
+    for marker, marker_center, line in markers:
+        orient_elevation_to_line(doc, marker, marker_center, line, elevation_id)
+    return len(markers)
+
+
+def is_counterclockwise(curves):
+    # orientation of a closed loop of curves in plan, from their start and middle points
+    points = []
+    for curve in curves:
+        points.append(vecmath.from_xyz(curve.GetEndPoint(0)))
+        points.append(vecmath.from_xyz(curve.Evaluate(0.5, True)))
+    return vecmath.signed_area(points) > 0
+
+
+def boundary_marker_points(lines, offset, counterclockwise=True):
+    # elevation marker points for lines of a boundary loop: the middle of each line offset into the room
+    # worked out from the loop's orientation, without point in room tests
+    points = []
+    for line in lines:
+        segment = vecmath.Segment(vecmath.from_xyz(line.GetEndPoint(0)), vecmath.from_xyz(line.GetEndPoint(1)))
+        points.append(to_xyz(segment.midpoint + vecmath.inward_normal(segment, counterclockwise) * offset))
+    return points
+
+
 def offset_curve_inwards_into_room(curve, room, offset_distance):
     # offset inwards and check if it's the right side (check if inside room)
     offset_curve = curve.CreateOffset(offset_distance, DB.XYZ(0, 0, 1))
@@ -0,0 +1,182 @@
+"""Live mode of Colorize by Value: a dynamic model updater that recolours the elements of one category as they are
+added or modified, in the transaction that changed them. One view at a time, unregistered when the view or its
+document closes"""
+from pyrevit import HOST_APP, DB, UI, script
+from System import Guid
+from pychilizer import colorize, parameters
+
+logger = script.get_logger()
+
+UPDATER_GUID = Guid("79aa67cc-5e82-4818-b6b8-82d1ef96cfd4")
+# elements recoloured in one transaction at most, the rest waits for a run of Colorize by Value
+MAX_QUEUE = 2000
+
+# the running updater
+_live = None
+
+
+class LiveColourUpdater(DB.IUpdater):
+    """Recolours added and modified elements of a category with the colours of a palette"""
+
+    def __init__(self, doc, view, bic, parameter, source, palette, overrides_option):
+        self.updater_id = DB.UpdaterId(HOST_APP.addin_id, UPDATER_GUID)
+        self.doc = doc
+        self.view_id = view.Id
+        self.bic = bic
+        self.parameter = parameter
+        self.source = source
+        self.palette = palette
+        self.overrides_option = overrides_option
+        self.store = colorize.PaletteStore(doc)
+        # {element id : hex colour} applied in the view, starting from what the last run recorded. Kept for the
+        # record only: undo does not roll it back, the view's overrides are read to decide what to recolour
+        recorded = colorize.OverrideRecord(doc).previous(view, palette, overrides_option) or {}
+        self.applied = dict((int(key), colour_hex) for key, colour_hex in recorded.items())
+        self.diff = {}  # {element id : hex colour, None where reset} overridden while live, for the record
+        self.recoloured = 0
+        self.dropped = 0  # elements left for Colorize by Value when the queue was full
+
+    def GetUpdaterId(self):
+        return self.updater_id
+
+    def GetUpdaterName(self):
+        return "pyChilizer Live Colorize"
+
+    def GetAdditionalInformation(self):
+        return "Recolours the elements of a colorized view as their values change"
+
+    def GetChangePriority(self):
+        return DB.ChangePriority.Views
+
+    def Execute(self, data):
+        # an exception here would make Revit disable the updater for the session
+        try:
+            self.recolour(data)
+        except Exception as e:
+            logger.error("Live colorize failed: {}".format(e))
+
+    def queue(self, data, doc):
+        # ids of the elements to recolour: added and modified instances, and the instances of modified types
+        queue = set()
+        modified_types = set()
+        for element_id in list(data.GetAddedElementIds()) + list(data.GetModifiedElementIds()):
+            if isinstance(doc.GetElement(element_id), DB.ElementType):
+                modified_types.add(element_id)
+            else:
+                queue.add(element_id.IntegerValue)
+        if modified_types:
+            for element in DB.FilteredElementCollector(doc).OfCategory(self.bic).WhereElementIsNotElementType():
+                if element.GetTypeId() in modified_types:
+                    queue.add(element.Id.IntegerValue)
+        return sorted(queue)
+
+    def recolour(self, data):
+        doc = data.GetDocument()
+        view = doc.GetElement(self.view_id)
+        if view is None:
+            return
+        queue = self.queue(data, doc)
+        if len(queue) > MAX_QUEUE:
+            self.dropped += len(queue) - MAX_QUEUE
+            logger.warning("Live colorize: {} elements changed at once, run Colorize by Value to colour the "
+                           "rest".format(len(queue)))
+            queue = queue[:MAX_QUEUE]
+        # a fresh column each time, the type values it keeps may have changed
+        column = parameters.ParameterColumn(self.parameter, doc, self.source)
+        palette = self.store.palette(self.palette)
+        factory = colorize.get_override_factory(doc)
+        for key in queue:
+            element = doc.GetElement(DB.ElementId(key))
+            if element is None:
+                continue
+            read = column.read(element)
+            applied_hex = colorize.override_colour(view.GetElementOverrides(element.Id), self.overrides_option)
+            if read is None:
+                # the element lost the parameter. Elements without a value keep the palette's colour for None,
+                # as in Colorize by Value
+                self.applied.pop(key, None)
+                if applied_hex:
+                    view.SetElementOverrides(element.Id, DB.OverrideGraphicSettings())
+                    self.diff[key] = None
+                    self.recoloured += 1
+                continue
+            colour_hex = palette.colour(colorize.value_key(read[1]))
+            # repeated edits that keep the value cost no override call
+            if applied_hex == colour_hex:
+                self.applied[key] = colour_hex
+                continue
+            view.SetElementOverrides(element.Id,
+                                     factory.override(self.overrides_option, colorize.revit_colour(colour_hex)))
+            self.applied[key] = colour_hex
+            self.diff[key] = colour_hex
+            self.recoloured += 1
+        self.store.save()
+
+    def view_is_open(self):
+        if not self.doc.IsValidObject:
+            return False
+        return any(ui_view.ViewId == self.view_id for ui_view in UI.UIDocument(self.doc).GetOpenUIViews())
+
+    def save_record(self):
+        # the colours in the view as the record of the next run of Colorize by Value to diff against
+        view = self.doc.GetElement(self.view_id)
+        if view is None or not self.recoloured:
+            return
+        record = colorize.OverrideRecord(self.doc)
+        record.put(view, self.palette, self.overrides_option,
+                   dict((str(key), colour_hex) for key, colour_hex in self.applied.items()),
+                   dict((str(key), colour_hex) for key, colour_hex in self.diff.items()))
+        record.save()
+
+
+def _on_view_activated(sender, args):
+    if _live and not _live.view_is_open():
+        stop()
+
+
+def _on_document_closing(sender, args):
+    if _live and args.Document.Equals(_live.doc):
+        stop()
+
+
+def start(doc, view, bic, parameter, parameter_id, source, palette, overrides_option):
+    # recolour the category in the view when elements are added or the parameter changes
+    # the calling script needs __persistentengine__ = True, so the updater and the event handlers stay alive
+    global _live
+    stop()
+    updater = LiveColourUpdater(doc, view, bic, parameter, source, palette, overrides_option)
+    if DB.UpdaterRegistry.IsUpdaterRegistered(updater.updater_id, doc):
+        # left by a previous session of the script
+        DB.UpdaterRegistry.UnregisterUpdater(updater.updater_id, doc)
+    # optional, so opening the model without pyChilizer does not warn about a missing updater
+    DB.UpdaterRegistry.RegisterUpdater(updater, doc, True)
+    category_filter = DB.ElementCategoryFilter(bic)
+    DB.UpdaterRegistry.AddTrigger(updater.updater_id, doc, category_filter, DB.Element.GetChangeTypeElementAddition())
+    DB.UpdaterRegistry.AddTrigger(updater.updater_id, doc, category_filter,
+                                  DB.Element.GetChangeTypeParameter(parameter_id))
+    HOST_APP.uiapp.ViewActivated += _on_view_activated
+    HOST_APP.app.DocumentClosing += _on_document_closing
+    _live = updater
+    return updater
+
+
+def stop():
+    # unregister the running updater, returns the number of elements it recoloured
+    global _live
+    if _live is None:
+        return 0
+    updater = _live
+    _live = None
+    HOST_APP.uiapp.ViewActivated -= _on_view_activated
+    HOST_APP.app.DocumentClosing -= _on_document_closing
+    if updater.doc.IsValidObject:
+        updater.save_record()
+        if DB.UpdaterRegistry.IsUpdaterRegistered(updater.updater_id, updater.doc):
+            DB.UpdaterRegistry.UnregisterUpdater(updater.updater_id, updater.doc)
+    if updater.dropped:
+        logger.warning("Live colorize left {} elements uncoloured, run Colorize by Value".format(updater.dropped))
+    return updater.recoloured
+
+
+def is_running():
+    return _live is not None
@@ -0,0 +1,423 @@
+"""Value to colour mappings that last between runs, and what changes between the colours of two runs, and the
+perceptually distinct colours they are picked from. Plain Python on hex colours, so it can run outside Revit.
+colorize stores the mappings for a document and applies them in Revit
+
+Distances are measured in OKLab, where equal distances look about equally different. The colour blind safe
+distance is the smallest of the normal one and the ones seen with protanopia and deuteranopia"""
+import math
+
+# colours are spread by picking the candidate furthest from those picked so far, up to GREEDY_LIMIT colours.
+# Beyond that they follow a low discrepancy sequence over hue and lightness, which costs the same for each colour
+GREEDY_LIMIT = 256
+# lightness range of the candidates: darker colours hide line work, lighter ones look like no override
+MIN_LIGHTNESS = 0.45
+MAX_LIGHTNESS = 0.9
+# greys look like elements that were not coloured
+MIN_CHROMA = 0.05
+# steps of each sRGB channel in the candidate grid
+GRID_STEPS = 11
+# colours of the sequence closer than this to a colour before them are skipped, the distance shrinks by
+# SEPARATION_FACTOR each time SEPARATION_PATIENCE colours in a row are skipped
+MIN_SEPARATION = 0.03
+SEPARATION_FACTOR = 0.8
+SEPARATION_PATIENCE = 100
+
+# ordered colours of ranges of values, low to high
+RAMP = ("#2C7BB6", "#ABD9E9", "#FFFFBF", "#FDAE61", "#D7191C")
+
+# severity 1 simulations of Machado et al. (2009), on linear RGB
+PROTANOPIA = ((0.152286, 1.052583, -0.204868), (0.114503, 0.786281, 0.099216), (-0.003882, -0.048116, 1.051998))
+DEUTERANOPIA = ((0.367322, 0.860646, -0.227968), (0.280085, 0.672501, 0.047413), (-0.011820, 0.042940, 0.968881))
+
+
+def hex_to_rgb(hex):
+    return [int(hex[i:i + 2], 16) for i in range(1, 6, 2)]
+
+
+def rgb_to_hex(rgb):
+    return "#" + "".join("{:02X}".format(int(v)) for v in rgb)
+
+
+def _to_linear(c):
+    c /= 255.0
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+
+def _from_linear(c):
+    c = max(0.0, min(1.0, c))
+    c = 12.92 * c if c <= 0.0031308 else 1.055 * c ** (1 / 2.4) - 0.055
+    return int(round(c * 255))
+
+
+def _cube_root(x):
+    return x ** (1 / 3.0) if x >= 0 else -((-x) ** (1 / 3.0))
+
+
+def linear_to_oklab(r, g, b):
+    l = _cube_root(0.4122214708 * r + 0.5363325363 * g + 0.0514459929 * b)
+    m = _cube_root(0.2119034982 * r + 0.6806995451 * g + 0.1073969566 * b)
+    s = _cube_root(0.0883024619 * r + 0.2817188376 * g + 0.6299787005 * b)
+    return (0.2104542553 * l + 0.7936177850 * m - 0.0040720403 * s,
+            1.9779984951 * l - 2.4285922050 * m + 0.4505937099 * s,
+            0.0259040371 * l + 0.7827717662 * m - 0.8086757660 * s)
+
+
+def oklab_to_linear(lightness, a, b):
+    l = (lightness + 0.3963377774 * a + 0.2158037573 * b) ** 3
+    m = (lightness - 0.1055613458 * a - 0.0638541728 * b) ** 3
+    s = (lightness - 0.0894841775 * a - 1.2914855480 * b) ** 3
+    return (4.0767416621 * l - 3.3077115913 * m + 0.2309699292 * s,
+            -1.2684380046 * l + 2.6097574011 * m - 0.3413193965 * s,
+            -0.0041960863 * l - 0.7034186147 * m + 1.7076147010 * s)
+
+
+def rgb_to_oklab(rgb):
+    return linear_to_oklab(*[_to_linear(c) for c in rgb])
+
+
+def _simulate(matrix, linear):
+    return [max(0.0, min(1.0, sum(k * c for k, c in zip(row, linear)))) for row in matrix]
+
+
+def perceptual_points(rgb, colour_blind_safe=False):
+    # the OKLab point of the colour, with its points as seen with protanopia and deuteranopia when safe
+    linear = [_to_linear(c) for c in rgb]
+    points = [linear_to_oklab(*linear)]
+    if colour_blind_safe:
+        points.append(linear_to_oklab(*_simulate(PROTANOPIA, linear)))
+        points.append(linear_to_oklab(*_simulate(DEUTERANOPIA, linear)))
+    return points
+
+
+def perceptual_distance(a, b):
+    # squared distance of two colours' perceptual_points, the smallest of the ways they can be seen
+    nearest = None
+    for p, q in zip(a, b):
+        d = (p[0] - q[0]) * (p[0] - q[0]) + (p[1] - q[1]) * (p[1] - q[1]) + (p[2] - q[2]) * (p[2] - q[2])
+        if nearest is None or d < nearest:
+            nearest = d
+    return nearest
+
+
+def candidate_grid(steps=GRID_STEPS):
+    # sRGB colours of a grid over the cube, in the lightness and chroma range of the palettes
+    levels = [int(round(255.0 * i / (steps - 1))) for i in range(steps)]
+    grid = []
+    for r in levels:
+        for g in levels:
+            for b in levels:
+                lightness, a, b_ = rgb_to_oklab((r, g, b))
+                if MIN_LIGHTNESS <= lightness <= MAX_LIGHTNESS and math.hypot(a, b_) >= MIN_CHROMA:
+                    grid.append((r, g, b))
+    return grid
+
+
+def farthest_point_order(candidates, n, colour_blind_safe=False):
+    # n of the (r, g, b) candidates, each the furthest from those before it. Starts from the most colourful
+    points = [perceptual_points(rgb, colour_blind_safe) for rgb in candidates]
+    first = max(range(len(candidates)), key=lambda i: math.hypot(points[i][0][1], points[i][0][2]))
+    order = [first]
+    remaining = [i for i in range(len(candidates)) if i != first]
+    nearest = [float("inf")] * len(candidates)
+    while remaining and len(order) < n:
+        last = points[order[-1]]
+        best = None
+        for i in remaining:
+            d = perceptual_distance(points[i], last)
+            if d < nearest[i]:
+                nearest[i] = d
+            if best is None or nearest[i] > nearest[best]:
+                best = i
+        remaining.remove(best)
+        order.append(best)
+    return [candidates[i] for i in order]
+
+
+class SeparationGrid(object):
+    """perceptual_points of colours in buckets of OKLab cells, one set of buckets per way of seeing them,
+    to find a colour close to another without measuring them all"""
+
+    def __init__(self, cell):
+        self.cell = cell
+        self._buckets = {}  # {(way of seeing, cell) : [OKLab points]}
+        self._colours = []  # perceptual_points of the colours added
+
+    def _cell(self, point):
+        return tuple(int(math.floor(c / self.cell)) for c in point)
+
+    def _bucket(self, points):
+        for way, point in enumerate(points):
+            self._buckets.setdefault((way, self._cell(point)), []).append(point)
+
+    def add(self, points):
+        self._colours.append(points)
+        self._bucket(points)
+
+    def resize(self, cell):
+        # smaller cells for a smaller distance, so a cell holds few colours
+        self.cell = cell
+        self._buckets = {}
+        for points in self._colours:
+            self._bucket(points)
+
+    def is_near(self, points, distance):
+        # a colour closer than distance (at most the cell size) in any of the ways of seeing it
+        limit = distance * distance
+        for way, point in enumerate(points):
+            x, y, z = self._cell(point)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for dz in (-1, 0, 1):
+                        for other in self._buckets.get((way, (x + dx, y + dy, z + dz)), ()):
+                            if (point[0] - other[0]) * (point[0] - other[0]) + (point[1] - other[1]) * \
+                                    (point[1] - other[1]) + (point[2] - other[2]) * (point[2] - other[2]) < limit:
+                                return True
+        return False
+
+
+def spread_colours(n, start=0, exclude=(), colour_blind_safe=False):
+    # n colours spread over hue and lightness by a low discrepancy (R2) sequence, the chroma reduced until
+    # the colour is in sRGB. Each colour costs about the same however many there are
+    # skips colours closer than the separation to the excluded colours or those before them, measured as
+    # perceptual_distance, so colour blind safe palettes stay apart as they are seen with colour blindness
+    plastic = 1.32471795724474602596
+    step_hue, step_lightness = 1 / plastic, 1 / (plastic * plastic)
+    seen = set(exclude)
+    grid = SeparationGrid(MIN_SEPARATION)
+    for rgb in exclude:
+        grid.add(perceptual_points(rgb, colour_blind_safe))
+    separation = MIN_SEPARATION
+    skipped = 0
+    colours = []
+    i = start
+    while len(colours) < n:
+        hue = 2 * math.pi * ((0.5 + i * step_hue) % 1.0)
+        lightness = MIN_LIGHTNESS + (MAX_LIGHTNESS - MIN_LIGHTNESS) * ((0.5 + i * step_lightness) % 1.0)
+        i += 1
+        chroma = 0.2
+        while chroma > MIN_CHROMA:
+            linear = oklab_to_linear(lightness, chroma * math.cos(hue), chroma * math.sin(hue))
+            if all(-1e-4 <= c <= 1.0001 for c in linear):
+                break
+            chroma -= 0.01
+        rgb = tuple(_from_linear(c) for c in linear)
+        if rgb in seen:
+            continue
+        points = perceptual_points(rgb, colour_blind_safe)
+        if grid.is_near(points, separation):
+            skipped += 1
+            if skipped == SEPARATION_PATIENCE:
+                # the space is filling up
+                separation *= SEPARATION_FACTOR
+                grid.resize(separation)
+                skipped = 0
+            continue
+        skipped = 0
+        seen.add(rgb)
+        grid.add(points)
+        colours.append(rgb)
+    return colours
+
+
+_perceptual_cache = {}  # {colour blind safe : hex colours}, extended as longer palettes are asked for
+
+
+def perceptual_colours(n, colour_blind_safe=False):
+    # n hex colours, as far apart as possible. The first n of a longer palette are the same as the palette of n
+    cached = _perceptual_cache.get(colour_blind_safe, [])
+    if len(cached) < n:
+        if not cached:
+            greedy = farthest_point_order(candidate_grid(), GREEDY_LIMIT, colour_blind_safe)
+            cached = [rgb_to_hex(rgb) for rgb in greedy]
+        if len(cached) < n:
+            # the sequence is made again from the greedy part, so the colours do not depend on how the palette grew
+            greedy = cached[:GREEDY_LIMIT]
+            exclude = [tuple(hex_to_rgb(c)) for c in greedy]
+            cached = greedy + [rgb_to_hex(rgb) for rgb in
+                               spread_colours(n - len(greedy), len(greedy), exclude, colour_blind_safe)]
+        _perceptual_cache[colour_blind_safe] = cached
+    return cached[:n]
+
+
+def ramp_colours(n, anchors=RAMP):
+    # n hex colours evenly spaced along the anchors, interpolated in OKLab so the steps look even
+    points = [rgb_to_oklab(hex_to_rgb(anchor)) for anchor in anchors]
+    segments = len(points) - 1
+    colours = []
+    for i in range(n):
+        t = float(i) * segments / (n - 1) if n > 1 else 0.0
+        k = min(int(t), segments - 1)
+        point = [a + (t - k) * (b - a) for a, b in zip(points[k], points[k + 1])]
+        colours.append(rgb_to_hex([_from_linear(c) for c in oklab_to_linear(*point)]))
+    return colours
+
+
+class Palette(object):
+    """{value key : hex colour} of one category or parameter. Values keep the colour they were given first,
+    new values get the candidate colour furthest from the colours in use"""
+
+    def __init__(self, colours=None, candidates=(), colour_blind_safe=False):
+        self.colours = dict(colours or {})
+        self.candidates = [c.upper() for c in candidates]
+        self.colour_blind_safe = colour_blind_safe
+        self.added = []  # keys given a colour since the palette was loaded
+        self._used = set(c.upper() for c in self.colours.values())
+        # the smallest distance of each of the first GREEDY_LIMIT candidates to a colour in use,
+        # kept up to date as colours are added. The candidates after them are taken in turn
+        self._points = None
+        self._nearest = None
+        self._cursor = 0
+
+    def __contains__(self, key):
+        return key in self.colours
+
+    def __len__(self):
+        return len(self.colours)
+
+    def _perceptual_points(self, colour):
+        return perceptual_points(hex_to_rgb(colour), self.colour_blind_safe)
+
+    def _start(self):
+        self._points = [self._perceptual_points(c) for c in self.candidates[:GREEDY_LIMIT]]
+        used = [self._perceptual_points(c) for c in self._used]
+        self._nearest = [min(perceptual_distance(p, u) for u in used) if used else None for p in self._points]
+
+    def _use(self, colour):
+        self._used.add(colour)
+        if self._nearest is None:
+            return
+        used = self._perceptual_points(colour)
+        for i, p in enumerate(self._points):
+            d = perceptual_distance(p, used)
+            if self._nearest[i] is None or d < self._nearest[i]:
+                self._nearest[i] = d
+
+    def _furthest(self):
+        # the unused candidate of the first GREEDY_LIMIT furthest from the colours in use, None if all are used
+        if self._nearest is None:
+            self._start()
+        best = None
+        for i, candidate in enumerate(self.candidates[:GREEDY_LIMIT]):
+            if candidate in self._used:
+                continue
+            if best is None or (self._nearest[i] is not None and
+                                (self._nearest[best] is None or self._nearest[i] > self._nearest[best])):
+                best = i
+        return None if best is None else self.candidates[best]
+
+    def next_colour(self):
+        # the first candidate while nothing is in use, then the one furthest from the colours in use
+        colour = self._furthest() if len(self._used) < GREEDY_LIMIT else None
+        if colour:
+            return colour
+        # the candidates after the first GREEDY_LIMIT are spread already, take them in turn
+        while self._cursor < len(self.candidates) and self.candidates[self._cursor] in self._used:
+            self._cursor += 1
+        if self._cursor < len(self.candidates):
+            return self.candidates[self._cursor]
+        # more values than candidates, reuse them in turn
+        return self.candidates[len(self.colours) % len(self.candidates)]
+
+    def colour(self, key):
+        if key not in self.colours:
+            colour = self.next_colour()
+            self._use(colour)
+            self.colours[key] = colour
+            self.added.append(key)
+        return self.colours[key]
+
+    def assign(self, keys):
+        # hex colours of the keys, in order. New keys are coloured in sorted order, so the result does not
+        # depend on the order the values were found in
+        for key in sorted(k for k in set(keys) if k not in self.colours):
+            self.colour(key)
+        return [self.colours[key] for key in keys]
+
+
+def colour_diff(previous, current):
+    # previous and current are {element key : hex colour}
+    # returns ({element key : hex colour} to override, [element keys] to reset)
+    changed = dict((key, colour) for key, colour in current.items() if previous.get(key) != colour)
+    removed = [key for key in previous if key not in current]
+    return changed, removed
+
+
+class RepaintReport(object):
+    """Override calls of a run, against the calls of a full repaint"""
+
+    def __init__(self, elements, changed, removed, full):
+        self.elements = elements
+        self.changed = changed
+        self.removed = removed
+        self.full = full
+
+    @property
+    def calls(self):
+        return self.changed + self.removed
+
+    @property
+    def saved(self):
+        return max(0, self.elements - self.calls)
+
+    def __str__(self):
+        if self.full:
+            return "Overrode all {} elements".format(self.elements)
+        return "Overrode {} of {} elements whose colour changed, reset {} elements no longer coloured, " \
+               "{} override calls saved".format(self.changed, self.elements, self.removed, self.saved)
+
+
+def min_separation(colours, colour_blind_safe=False):
+    # the smallest perceptual distance between two of the hex colours
+    points = [perceptual_points(hex_to_rgb(c), colour_blind_safe) for c in colours]
+    return math.sqrt(min(perceptual_distance(points[i], points[j])
+                         for i in range(len(points)) for j in range(i)))
+
+
+def benchmark(sizes=(16, 150, 1000, 5000)):
+    # time to build palettes of each size, and the separation of their first 500 colours
+    # the first size includes the greedy part, longer palettes only add the sequence after it
+    import time
+    for colour_blind_safe in (False, True):
+        _perceptual_cache.clear()
+        for n in sizes:
+            start = time.time()
+            colours = perceptual_colours(n, colour_blind_safe)
+            elapsed = time.time() - start
+            print("{:>5} colours{}  {:8.4f}s  min separation {:.4f}".format(
+                n, " (colour blind safe)" if colour_blind_safe else "", elapsed,
+                min_separation(colours[:500], colour_blind_safe)))
+
+
+def _check():
+    candidates = ["#FF0000", "#FF1000", "#00FF00", "#0000FF", "#FFFF00"]
+    palette = Palette(candidates=candidates)
+    first = palette.assign(["b", "a"])
+    assert first[1] == "#FF0000" and first[0] != "#FF1000", first
+    # a reloaded palette keeps the colours and gives a new value a colour far from them
+    reloaded = Palette(palette.colours, candidates)
+    assert reloaded.assign(["c", "a", "b"])[1:] == first[::-1]
+    assert reloaded.added == ["c"]
+    assert reloaded.colour("d") != "#FF1000"
+    for rgb in ([0, 0, 0], [255, 255, 255], [64, 223, 255]):
+        assert [_from_linear(c) for c in oklab_to_linear(*rgb_to_oklab(rgb))] == rgb
+    colours = perceptual_colours(40)
+    assert len(set(colours)) == 40 and perceptual_colours(10) == colours[:10]
+    assert len(perceptual_colours(300)) == 300
+    assert perceptual_colours(400)[:300] == perceptual_colours(300)
+    # the colours after the greedy part stay apart, as seen with colour blindness in the safe mode
+    assert min_separation(perceptual_colours(600)[GREEDY_LIMIT:]) > 0.015
+    assert min_separation(perceptual_colours(600, True)[GREEDY_LIMIT:], True) > 0.005
+    assert ramp_colours(5) == list(RAMP)
+    # a fresh palette follows the perceptual order
+    big = Palette(candidates=perceptual_colours(2048))
+    assert big.assign(range(1000)) == perceptual_colours(1000)
+    changed, removed = colour_diff({"1": "#FF0000", "2": "#00FF00", "3": "#0000FF"},
+                                   {"1": "#FF0000", "2": "#0000FF", "4": "#0000FF"})
+    assert changed == {"2": "#0000FF", "4": "#0000FF"} and removed == ["3"]
+    assert RepaintReport(3, 2, 1, False).saved == 0
+    print("palettes ok")
+
+
+if __name__ == "__main__":
+    _check()
+    benchmark()
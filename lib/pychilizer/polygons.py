@@ -0,0 +1,186 @@
+"""Offsets and validity checks of closed polygons in plan, on (x, y) points. Plain Python, so it can run outside Revit.
+Used to tell up front whether CurveLoop.CreateViaOffset will succeed on a room boundary, instead of trying it"""
+import math
+
+# Revit's short curve tolerance, in feet
+MIN_EDGE = 1 / 256.0
+EPSILON = 1e-9
+
+# crop strategies
+OFFSET = "offset boundary"
+BOUNDING_BOX = "bounding box"
+TRY_OFFSET = "try offset"  # boundaries with arcs, the checks here cover straight edges only
+
+
+def signed_area(points):
+    # positive for counterclockwise loops
+    area = 0.0
+    for i in range(len(points)):
+        (x0, y0), (x1, y1) = points[i], points[(i + 1) % len(points)]
+        area += x0 * y1 - x1 * y0
+    return area / 2.0
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def remove_collinear(points, tolerance=EPSILON):
+    # drop vertices in the middle of straight runs, and repeated vertices
+    result = []
+    n = len(points)
+    for i in range(n):
+        previous, point, following = points[i - 1], points[i], points[(i + 1) % n]
+        if math.hypot(point[0] - previous[0], point[1] - previous[1]) < tolerance:
+            continue
+        if abs(_cross(previous, point, following)) < tolerance and \
+                (point[0] - previous[0]) * (following[0] - point[0]) + \
+                (point[1] - previous[1]) * (following[1] - point[1]) > 0:
+            continue
+        result.append(point)
+    return result
+
+
+def segments_cross(a, b, c, d):
+    # the segments ab and cd share a point, touching included
+    d1 = _cross(c, d, a)
+    d2 = _cross(c, d, b)
+    d3 = _cross(a, b, c)
+    d4 = _cross(a, b, d)
+    if ((d1 > EPSILON and d2 < -EPSILON) or (d1 < -EPSILON and d2 > EPSILON)) and \
+            ((d3 > EPSILON and d4 < -EPSILON) or (d3 < -EPSILON and d4 > EPSILON)):
+        return True
+
+    def on_segment(p, q, r):
+        return min(p[0], q[0]) - EPSILON <= r[0] <= max(p[0], q[0]) + EPSILON and \
+            min(p[1], q[1]) - EPSILON <= r[1] <= max(p[1], q[1]) + EPSILON
+
+    return (abs(d1) <= EPSILON and on_segment(c, d, a)) or (abs(d2) <= EPSILON and on_segment(c, d, b)) or \
+        (abs(d3) <= EPSILON and on_segment(a, b, c)) or (abs(d4) <= EPSILON and on_segment(a, b, d))
+
+
+def self_intersection(points):
+    # (i, j) of the first two edges that cross, or None. Neighbouring edges are not compared
+    n = len(points)
+    boxes = []
+    for i in range(n):
+        (x0, y0), (x1, y1) = points[i], points[(i + 1) % n]
+        boxes.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+    for i in range(n):
+        for j in range(i + 2, n):
+            if i == 0 and j == n - 1:
+                continue
+            a, b = boxes[i], boxes[j]
+            if a[0] > b[2] + EPSILON or b[0] > a[2] + EPSILON or a[1] > b[3] + EPSILON or b[1] > a[3] + EPSILON:
+                continue
+            if segments_cross(points[i], points[(i + 1) % n], points[j], points[(j + 1) % n]):
+                return i, j
+    return None
+
+
+def offset_polygon(points, distance):
+    # mitred offset, outwards for a positive distance whatever the orientation of the loop
+    # the offset of each edge keeps its index. Returns None if two neighbouring edges are parallel
+    n = len(points)
+    side = 1.0 if signed_area(points) > 0 else -1.0
+    lines = []  # (point on the offset edge, direction)
+    for i in range(n):
+        (x0, y0), (x1, y1) = points[i], points[(i + 1) % n]
+        length = math.hypot(x1 - x0, y1 - y0)
+        dx, dy = (x1 - x0) / length, (y1 - y0) / length
+        # outwards is to the right of a counterclockwise loop
+        nx, ny = dy * side, -dx * side
+        lines.append(((x0 + nx * distance, y0 + ny * distance), (dx, dy)))
+    result = []
+    for i in range(n):
+        (p, u), (q, v) = lines[i - 1], lines[i]
+        denominator = u[0] * v[1] - u[1] * v[0]
+        if abs(denominator) < EPSILON:
+            return None
+        t = ((q[0] - p[0]) * v[1] - (q[1] - p[1]) * v[0]) / denominator
+        result.append((p[0] + u[0] * t, p[1] + u[1] * t))
+    return result
+
+
+def loop_problem(points, min_edge=MIN_EDGE):
+    # why the loop cannot be offset, or None
+    if len(points) < 3:
+        return "fewer than 3 corners"
+    if abs(signed_area(points)) < EPSILON:
+        return "no area"
+    n = len(points)
+    for i in range(n):
+        (x0, y0), (x1, y1) = points[i], points[(i + 1) % n]
+        if math.hypot(x1 - x0, y1 - y0) < min_edge:
+            return "edge shorter than {:.4f}".format(min_edge)
+    if self_intersection(points):
+        return "self-intersecting boundary"
+    return None
+
+
+def offset_problem(points, distance, min_edge=MIN_EDGE):
+    # why offsetting the loop by distance would fail, or None
+    points = remove_collinear(points)
+    problem = loop_problem(points, min_edge)
+    if problem:
+        return problem
+    offset = offset_polygon(points, distance)
+    if offset is None:
+        return "parallel neighbouring edges"
+    n = len(points)
+    for i in range(n):
+        (x0, y0), (x1, y1) = points[i], points[(i + 1) % n]
+        (u0, v0), (u1, v1) = offset[i], offset[(i + 1) % n]
+        if (x1 - x0) * (u1 - u0) + (y1 - y0) * (v1 - v0) <= 0:
+            return "edge collapses in the offset"
+        if math.hypot(u1 - u0, v1 - v0) < min_edge:
+            return "edge too short after the offset"
+    if (signed_area(offset) > 0) != (signed_area(points) > 0):
+        return "offset turns inside out"
+    if self_intersection(offset):
+        return "offset intersects itself"
+    return None
+
+
+def crop_strategy(points, distance, has_arcs=False):
+    # (strategy, reason) for cropping to the loop offset by distance
+    if has_arcs:
+        return TRY_OFFSET, "boundary with arcs"
+    problem = offset_problem(points, distance)
+    if problem:
+        return BOUNDING_BOX, problem
+    return OFFSET, None
+
+
+def rotated_rectangle(points, angle):
+    # corners of the smallest rectangle around the points, turned by angle, counterclockwise
+    c, s = math.cos(-angle), math.sin(-angle)
+    turned = [(x * c - y * s, x * s + y * c) for x, y in points]
+    min_x = min(p[0] for p in turned)
+    min_y = min(p[1] for p in turned)
+    max_x = max(p[0] for p in turned)
+    max_y = max(p[1] for p in turned)
+    c, s = math.cos(angle), math.sin(angle)
+    return [(x * c - y * s, x * s + y * c) for x, y in ((min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y))]
+
+
+def _check():
+    square = [(0.0, 0.0), (4.0, 0.0), (4.0, 4.0), (0.0, 4.0)]
+    assert offset_problem(square, 1.0) is None
+    assert offset_problem(list(reversed(square)), 1.0) is None
+    offset = offset_polygon(square, 1.0)
+    assert abs(signed_area(offset) - 36.0) < 1e-9
+    # a narrow notch closes up when offset outwards
+    notch = [(0.0, 0.0), (10.0, 0.0), (10.0, 4.0), (5.2, 4.0), (5.2, 1.0), (4.8, 1.0), (4.8, 4.0), (0.0, 4.0)]
+    assert offset_problem(notch, 0.1) is None
+    assert offset_problem(notch, 0.5) == "edge collapses in the offset"
+    bow_tie = [(0.0, 0.0), (4.0, 4.0), (4.0, 0.0), (0.0, 6.0)]
+    assert loop_problem(bow_tie) == "self-intersecting boundary"
+    assert loop_problem([(0.0, 0.0), (0.001, 0.0), (1.0, 1.0)]) == "edge shorter than 0.0039"
+    box = rotated_rectangle(square, math.radians(45))
+    assert abs(signed_area(box) - 32.0) < 1e-9
+    print("polygons ok")
+
+
+if __name__ == "__main__":
+    _check()
@@ -0,0 +1,188 @@
+"""Opt-in timing of the Revit calls of a script run, switched on from the shift-click config of the profiled tools.
+Phases are always timed; transactions, regenerations, collectors and wrapped calls only when profiling is on.
+Transactions and wrapped functions are patched only while a phase runs, and put back when it ends however it ends"""
+from pyrevit import revit, script, forms, HOST_APP
+from contextlib import contextmanager
+import datetime
+import json
+import time
+
+PROFILE_CONFIG_SECTION = "pychilizer_profile"
+PROFILE_CONFIG_OPTION_NAME = "profile"
+RECORD_FILE_ID = "pychilizer_profile"  # JSONL file in the pyRevit data folder, one record per run
+NO_PHASE = "-"
+
+
+def is_enabled():
+    return bool(script.get_config(PROFILE_CONFIG_SECTION).get_option(PROFILE_CONFIG_OPTION_NAME, False))
+
+
+def config_profile():
+    """Ask whether to profile the runs of the profiled tools"""
+    config = script.get_config(PROFILE_CONFIG_SECTION)
+    profile = forms.alert("Profile the next runs?\n"
+                          "Prints the time spent in transactions and Revit calls, and keeps a record of each run. "
+                          "Applies to all pyChilizer tools that can be profiled.", yes=True, no=True)
+    config.set_option(PROFILE_CONFIG_OPTION_NAME, bool(profile))
+    script.save_config()
+
+
+class Profiler(object):
+    """Counters and wall clock timers, grouped by the phase they ran in"""
+
+    def __init__(self, name, enabled=None):
+        self.name = name
+        self.enabled = is_enabled() if enabled is None else enabled
+        self.phases = []  # [(phase, seconds)]
+        self.counters = {}  # {(phase, label) : [count, seconds]}
+        self._order = []  # counter keys in the order they were first hit
+        self._phase = NO_PHASE
+        self._depth = 0  # phases running, one inside the other
+        self._wraps = []  # [(owner, attribute, label)] to time while a phase runs
+        self._patched = []  # [(owner, attribute, original)]
+        self._started = time.time()
+
+    def add(self, label, seconds, count=1):
+        key = (self._phase, label)
+        if key not in self.counters:
+            self.counters[key] = [0, 0.0]
+            self._order.append(key)
+        self.counters[key][0] += count
+        self.counters[key][1] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        # the outermost phase installs the timers and uninstalls them, also on exceptions and script exits
+        previous = self._phase
+        self._phase = name
+        if not self._depth:
+            self.install()
+        self._depth += 1
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.time() - start))
+            self._phase = previous
+            self._depth -= 1
+            if not self._depth:
+                self.uninstall()
+
+    @contextmanager
+    def measure(self, label):
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(label, time.time() - start)
+
+    def timed(self, label, func):
+        # func wrapped with a timer, or func itself when profiling is off
+        if not self.enabled:
+            return func
+
+        def timed_call(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(label, time.time() - start)
+        return timed_call
+
+    def wrap(self, owner, attribute, label=None):
+        # time a function of a module or Python class while a phase runs
+        if self.enabled:
+            self._wraps.append((owner, attribute, label or "{}.{}".format(owner.__name__, attribute)))
+
+    def regenerate(self, doc=revit.doc):
+        with self.measure("Regenerate"):
+            doc.Regenerate()
+
+    def elements(self, collector, label="Collector"):
+        # materialise a FilteredElementCollector
+        with self.measure(label):
+            return collector.ToElements()
+
+    def install(self):
+        # time the commits of pyRevit transactions and transaction groups, and the wrapped functions
+        if not self.enabled or self._patched:
+            return
+        for cls, label in ((revit.Transaction, "Transaction commit"), (revit.TransactionGroup, "TransactionGroup")):
+            original = cls.__dict__.get("__exit__") or getattr(cls, "__exit__")
+            self._patched.append((cls, "__exit__", original))
+            setattr(cls, "__exit__", self._timed_exit(original, label))
+        for owner, attribute, label in self._wraps:
+            original = getattr(owner, attribute)
+            self._patched.append((owner, attribute, original))
+            setattr(owner, attribute, self.timed(label, original))
+
+    def _timed_exit(self, original, label):
+        profiler = self
+
+        def __exit__(self, exception, exception_value, traceback):
+            start = time.time()
+            try:
+                return original(self, exception, exception_value, traceback)
+            finally:
+                profiler.add(label, time.time() - start)
+        return __exit__
+
+    def uninstall(self):
+        while self._patched:
+            owner, attribute, original = self._patched.pop()
+            setattr(owner, attribute, original)
+
+    def rows(self):
+        # [phase, operation, count, total s, mean ms]
+        rows = []
+        for phase, seconds in self.phases:
+            rows.append([phase, "phase total", 1, round(seconds, 3), round(1000 * seconds, 1)])
+            rows.extend(self._counter_rows(phase))
+        rows.extend(self._counter_rows(NO_PHASE))
+        return rows
+
+    def _counter_rows(self, phase):
+        rows = []
+        for key in self._order:
+            if key[0] == phase:
+                count, seconds = self.counters[key]
+                rows.append([phase, key[1], count, round(seconds, 3), round(1000 * seconds / count, 1)])
+        return rows
+
+    def record(self):
+        return {
+            "script": self.name,
+            "timestamp": datetime.datetime.now().isoformat(),
+            "revit": HOST_APP.version,
+            "total": round(time.time() - self._started, 3),
+            "phases": [[phase, round(seconds, 3)] for phase, seconds in self.phases],
+            "counters": [[phase, label] + self.counters[(phase, label)] for phase, label in self._order],
+        }
+
+    def write_record(self):
+        # append the run to the JSONL file, returns its path
+        path = script.get_universal_data_file(RECORD_FILE_ID, "jsonl")
+        with open(path, "a") as f:
+            f.write(json.dumps(self.record()) + "\n")
+        return path
+
+    def report(self, print_phases=False):
+        # profiling on: print the table and append the record. Off: print the phase times if asked to
+        self.uninstall()
+        if self.enabled:
+            output = script.get_output()
+            output.print_table(table_data=self.rows(),
+                               columns=["Phase", "Operation", "Count", "Total [s]", "Mean [ms]"],
+                               title="{} profile".format(self.name))
+            print("Profile appended to {}".format(self.write_record()))
+        elif print_phases:
+            for phase, seconds in self.phases:
+                print("{:<24}{:>10.2f} s".format(phase, seconds))
+
+
+def start(name, enabled=None):
+    # a profiler for the script run, its timers are installed by its phases
+    return Profiler(name, enabled)
@@ -0,0 +1,157 @@
+"""Ranges of numeric parameter values: equal interval, quantile and natural (Jenks) breaks. Plain Python, so it can
+run outside Revit. Filters by Value makes a filter for each range instead of one for each value
+
+Boundaries are placed halfway between two neighbouring values, so no value sits on a boundary. Filter rules with a
+tolerance keep each value in its range only while the tolerance stays below the boundary's clearance, the distance
+from the boundary to the nearest value"""
+from bisect import bisect_left, bisect_right
+
+EQUAL_INTERVAL = "Equal interval"
+QUANTILE = "Quantile"
+JENKS = "Natural breaks (Jenks)"
+METHODS = [EQUAL_INTERVAL, QUANTILE, JENKS]
+
+# natural breaks cost the square of the number of values, larger sets are sampled down to this many
+JENKS_SAMPLE = 500
+
+
+def _boundaries(data, indices):
+    # boundaries halfway between data[j - 1] and data[j] for the indices, sorted and without repeats
+    result = []
+    for j in sorted(set(indices)):
+        if 0 < j < len(data) and data[j - 1] != data[j]:
+            result.append((data[j - 1] + data[j]) / 2.0)
+    return result
+
+
+def equal_interval(data, k):
+    low, high = data[0], data[-1]
+    step = (high - low) / float(k)
+    return [bisect_left(data, low + step * i) for i in range(1, k)]
+
+
+def quantile(data, k):
+    indices = []
+    for i in range(1, k):
+        j = int(round(len(data) * i / float(k)))
+        j = min(max(j, 1), len(data) - 1)
+        # keep equal values in one range
+        first = bisect_left(data, data[j])
+        indices.append(first if first > 0 else bisect_right(data, data[j]))
+    return indices
+
+
+def jenks_upper_values(data, k):
+    # the largest value of each but the last of k classes, minimising the variance within the classes
+    # Fisher's dynamic programme on sorted data
+    n = len(data)
+    lower = [[0] * (k + 1) for _ in range(n + 1)]
+    variance = [[float("inf")] * (k + 1) for _ in range(n + 1)]
+    for j in range(1, k + 1):
+        lower[1][j] = 1
+        variance[1][j] = 0.0
+    for l in range(2, n + 1):
+        s1 = s2 = 0.0
+        v = 0.0
+        for m in range(1, l + 1):
+            i3 = l - m + 1
+            value = data[i3 - 1]
+            s1 += value
+            s2 += value * value
+            v = s2 - s1 * s1 / m
+            i4 = i3 - 1
+            if i4 != 0:
+                for j in range(2, k + 1):
+                    if variance[l][j] >= v + variance[i4][j - 1]:
+                        lower[l][j] = i3
+                        variance[l][j] = v + variance[i4][j - 1]
+        lower[l][1] = 1
+        variance[l][1] = v
+    uppers = []
+    count = n
+    for j in range(k, 1, -1):
+        start = lower[count][j]
+        uppers.append(data[start - 2])
+        count = start - 1
+    return sorted(uppers)
+
+
+def jenks(data, k):
+    sample = data
+    if len(data) > JENKS_SAMPLE:
+        # evenly spaced through the sorted values, keeping both ends
+        step = (len(data) - 1) / float(JENKS_SAMPLE - 1)
+        sample = [data[int(round(i * step))] for i in range(JENKS_SAMPLE)]
+    k = min(k, len(sample))
+    return [bisect_right(data, upper) for upper in jenks_upper_values(sample, k)] if k > 1 else []
+
+
+_METHODS = {EQUAL_INTERVAL: equal_interval, QUANTILE: quantile, JENKS: jenks}
+
+
+def breaks(values, k, method=EQUAL_INTERVAL):
+    # up to k - 1 ascending boundaries dividing the values into up to k ranges. Fewer when there are fewer
+    # distinct values, or when a method puts two boundaries between the same values
+    data = sorted(values)
+    if len(data) < 2 or k < 2 or data[0] == data[-1]:
+        return []
+    return _boundaries(data, _METHODS[method](data, k))
+
+
+def range_index(value, boundaries):
+    # index of the range the value falls in, 0 below the first boundary
+    return bisect_right(boundaries, value)
+
+
+def group(values, boundaries):
+    # [[indices of the values]] of each range
+    groups = [[] for _ in range(len(boundaries) + 1)]
+    for i, value in enumerate(values):
+        groups[range_index(value, boundaries)].append(i)
+    return groups
+
+
+def clearances(values, boundaries):
+    # distance from each boundary to the nearest value, half the gap between the values either side of it
+    data = sorted(values)
+    result = []
+    for boundary in boundaries:
+        i = bisect_left(data, boundary)
+        result.append(min(abs(boundary - data[j]) for j in (i - 1, i) if 0 <= j < len(data)))
+    return result
+
+
+def _check():
+    values = [1.0, 1.0, 2.0, 2.5, 3.0, 10.0, 11.0, 12.0, 30.0, 31.0]
+    assert breaks(values, 3, EQUAL_INTERVAL) == [10.5, 21.0]  # steps of 10, from 1
+    assert breaks(values, 2, QUANTILE) == [6.5]
+    assert breaks(values, 3, JENKS) == [6.5, 21.0]
+    assert group(values, [6.5, 21.0]) == [[0, 1, 2, 3, 4], [5, 6, 7], [8, 9]]
+    # equal values never straddle a boundary
+    assert breaks([5] * 10 + [6], 4, QUANTILE) == [5.5]
+    assert breaks([4.0] * 3, 5, JENKS) == []
+    # values closer together than a filter's tolerance leave a small clearance
+    assert clearances(values, [6.5, 21.0]) == [3.5, 9.0]
+    close = [1.0, 1.0005, 2.0]
+    assert [round(c, 9) for c in clearances(close, breaks(close, 3, QUANTILE))] == [0.00025, 0.49975]
+    print("ranges ok")
+
+
+def benchmark(sizes=(1000, 20000, 100000), k=7):
+    import random
+    import time
+    rng = random.Random(1)
+    for n in sizes:
+        values = [rng.lognormvariate(3.0, 1.0) for _ in range(n)]
+        timings = []
+        for method in METHODS:
+            start = time.time()
+            boundaries = breaks(values, k, method)
+            group(values, boundaries)
+            timings.append("{} {:.4f}s".format(method, time.time() - start))
+        print("{:>7} values  {}".format(n, "  ".join(timings)))
+
+
+if __name__ == "__main__":
+    _check()
+    benchmark()
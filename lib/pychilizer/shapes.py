@@ -0,0 +1,153 @@
+"""Canonical shapes of room boundaries, the same for rooms that differ only by translation and rotation in plan.
+Plain Python on (x, y, z) points, so it can run outside Revit. geo reads the boundaries and applies the results"""
+import math
+from pychilizer import vecmath
+
+# lengths are rounded to the tolerance of spatial, angles to a tenth of a degree
+LENGTH_TOLERANCE = 0.003
+ANGLE_TOLERANCE = math.radians(0.1)
+
+LINE = "L"
+ARC = "A"  # the start of an arc
+ARC_MIDDLE = "M"  # the middle of the same arc
+
+
+def _quantise(value, tolerance):
+    return int(round(value / tolerance))
+
+
+def _turn(a, b):
+    # signed angle from vector a to vector b, in plan
+    return math.atan2(a[0] * b[1] - a[1] * b[0], a[0] * b[0] + a[1] * b[1])
+
+
+def _edge(points, i):
+    a = points[i]
+    b = points[(i + 1) % len(points)]
+    return b[0] - a[0], b[1] - a[1]
+
+
+def edge_sequence(points, kinds):
+    # (kind, length, turn from the previous edge) for each vertex of a closed loop, rounded to the tolerances
+    n = len(points)
+    sequence = []
+    for i in range(n):
+        edge = _edge(points, i)
+        previous = _edge(points, i - 1)
+        sequence.append((kinds[i], _quantise(math.hypot(edge[0], edge[1]), LENGTH_TOLERANCE),
+                         _quantise(_turn(previous, edge), ANGLE_TOLERANCE)))
+    return sequence
+
+
+def least_rotation(sequence):
+    # index of the start that makes the cyclic sequence smallest, ties go to the first
+    n = len(sequence)
+    doubled = sequence + sequence
+    best = 0
+    for start in range(1, n):
+        if doubled[start:start + n] < doubled[best:best + n]:
+            best = start
+    return best
+
+
+class ShapeFrame(object):
+    """The canonical key of a shape and where it sits: the origin and direction (angle in plan) of its first edge"""
+    __slots__ = ("key", "origin", "angle")
+
+    def __init__(self, key, origin, angle):
+        self.key = key
+        self.origin = origin  # vecmath.Vec3
+        self.angle = angle
+
+    def __repr__(self):
+        return "ShapeFrame({}, {}, {})".format(hash(self.key), self.origin, self.angle)
+
+    def turn_to(self, other):
+        # how much the other frame is rotated from this one
+        return other.angle - self.angle
+
+    def transform_to(self, other):
+        # vecmath.Affine taking the shape from this frame to the other
+        rotation = vecmath.Affine.rotation(vecmath.BASIS_Z, self.turn_to(other), self.origin)
+        return vecmath.Affine.translation(other.origin - self.origin).multiply(rotation)
+
+
+def shape_frame(loops, *values):
+    # loops: [[(x, y, z, kind)]], the outer loop first. values: anything else that has to match, e.g. the height
+    # returns None for loops too small to have a direction
+    outer = loops[0] if loops else []
+    if len(outer) < 2:
+        return None
+    points = [(p[0], p[1]) for p in outer]
+    kinds = [p[3] for p in outer]
+    sequence = edge_sequence(points, kinds)
+    start = least_rotation(sequence)
+    origin = vecmath.Vec3(outer[start][0], outer[start][1], outer[start][2])
+    edge = _edge(points, start)
+    angle = math.atan2(edge[1], edge[0])
+    # the inner loops, as point sets in the frame of the outer loop
+    to_frame = vecmath.Affine.rotation(vecmath.BASIS_Z, -angle, origin)
+    inner = []
+    for loop in loops[1:]:
+        local = [to_frame.of_point(vecmath.Vec3(p[0], p[1], p[2])) for p in loop]
+        inner.append(tuple(sorted((_quantise(p.x, LENGTH_TOLERANCE), _quantise(p.y, LENGTH_TOLERANCE), p3[3])
+                                  for p, p3 in zip(local, loop))))
+    key = (tuple(sequence[start:] + sequence[:start]), tuple(sorted(inner)), values)
+    return ShapeFrame(key, origin, angle)
+
+
+class ShapeCache(object):
+    """Results worked out once per shape key, with the number of lookups that found one"""
+
+    def __init__(self):
+        self._results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        if key in self._results:
+            self.hits += 1
+            return self._results[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        self._results[key] = result
+        return result
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def summary(self, what="rooms"):
+        return "{} of {} {} reused the results of an identical room ({:.0%}), {} distinct shapes".format(
+            self.hits, self.hits + self.misses, what, self.hit_rate, len(self._results))
+
+
+def _check():
+    # a room moved and turned has the same key, and its frame maps the first room onto it
+    room = [(0.0, 0.0, 0.0, LINE), (4.0, 0.0, 0.0, LINE), (4.0, 3.0, 0.0, LINE), (1.0, 3.0, 0.0, LINE),
+            (0.0, 2.0, 0.0, LINE)]
+    move = vecmath.Affine.translation(vecmath.Vec3(10.0, -5.0, 3.0)).multiply(
+        vecmath.Affine.rotation(vecmath.BASIS_Z, 0.7))
+    moved = []
+    for x, y, z, kind in room[2:] + room[:2]:
+        p = move.of_point(vecmath.Vec3(x, y, z))
+        moved.append((p.x, p.y, p.z, kind))
+    a = shape_frame([room], 3.0)
+    b = shape_frame([moved], 3.0)
+    assert a.key == b.key
+    for x, y, z, kind in room:
+        p = a.transform_to(b).of_point(vecmath.Vec3(x, y, z))
+        assert p.is_almost_equal_to(move.of_point(vecmath.Vec3(x, y, z)), 1e-6)
+    mirrored = [(-x, y, z, kind) for x, y, z, kind in room]
+    assert shape_frame([mirrored], 3.0).key != a.key
+    print("shapes ok")
+
+
+if __name__ == "__main__":
+    _check()
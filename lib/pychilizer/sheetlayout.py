@@ -0,0 +1,176 @@
+"""Viewport layout on sheets, in sheet (u, v) coordinates. Plain Python, so layouts can be checked against made up
+sheet outlines without Revit. The locators of the room data sheets convert to and from Revit types"""
+
+
+class Box(object):
+    __slots__ = ("min_u", "min_v", "max_u", "max_v")
+
+    def __init__(self, min_u, min_v, max_u, max_v):
+        self.min_u = min_u
+        self.min_v = min_v
+        self.max_u = max_u
+        self.max_v = max_v
+
+    def __repr__(self):
+        return "Box({}, {}, {}, {})".format(self.min_u, self.min_v, self.max_u, self.max_v)
+
+    @classmethod
+    def around(cls, center, width, height):
+        return cls(center[0] - width / 2.0, center[1] - height / 2.0, center[0] + width / 2.0, center[1] + height / 2.0)
+
+    @property
+    def width(self):
+        return self.max_u - self.min_u
+
+    @property
+    def height(self):
+        return self.max_v - self.min_v
+
+    @property
+    def center(self):
+        return (self.min_u + self.max_u) / 2.0, (self.min_v + self.max_v) / 2.0
+
+    def overlaps(self, other):
+        return self.min_u < other.max_u and other.min_u < self.max_u \
+            and self.min_v < other.max_v and other.min_v < self.max_v
+
+    def contains(self, other):
+        return self.min_u <= other.min_u and self.min_v <= other.min_v \
+            and other.max_u <= self.max_u and other.max_v <= self.max_v
+
+
+def titleblock_grid(outline, offset, tb_orientation, col, row):
+    # centres of col x row cells of the sheet outline, column by column, as the locators number them
+    # the titleblock (internal) offset is taken off the width of vertical titleblocks, added to the height otherwise
+    width = outline.width
+    height = outline.height
+    if str(tb_orientation) == "Vertical":
+        width -= offset
+    else:
+        height += offset
+    col_width = width / float(col)
+    row_height = height / float(row)
+    positions = []
+    for i in range(int(col)):
+        for j in range(int(row)):
+            positions.append((outline.min_u + col_width * (i + 0.5), outline.min_v + row_height * (j + 0.5)))
+    return positions
+
+
+class GridCache(object):
+    """Titleblock grids, worked out once per titleblock type"""
+
+    def __init__(self):
+        self._grids = {}
+
+    def grid(self, titleblock_key, outline, offset, tb_orientation, col, row):
+        key = (titleblock_key, offset, str(tb_orientation), col, row)
+        if titleblock_key is None or key not in self._grids:
+            self._grids[key] = titleblock_grid(outline, offset, tb_orientation, col, row)
+        return self._grids[key]
+
+
+class ViewportMargins(object):
+    """How far a viewport's box reaches past its view's extents on each side, per viewport type.
+    Learned from one placed viewport, then used to place the others without measuring them"""
+
+    def __init__(self):
+        self._margins = {}  # {key : (left, bottom, right, top)}
+
+    def __contains__(self, key):
+        return key in self._margins
+
+    def get(self, key):
+        return self._margins.get(key, (0.0, 0.0, 0.0, 0.0))
+
+    def learn(self, key, point, view_size, box):
+        # point: where the viewport was created, view_size: (width, height) of the view on the sheet,
+        # box: the outline of the placed viewport
+        view = Box.around(point, view_size[0], view_size[1])
+        self._margins[key] = (view.min_u - box.min_u, view.min_v - box.min_v,
+                              box.max_u - view.max_u, box.max_v - view.max_v)
+        return self._margins[key]
+
+    def box_size(self, key, view_size):
+        left, bottom, right, top = self.get(key)
+        return view_size[0] + left + right, view_size[1] + bottom + top
+
+    def placement_point(self, key, target, view_size):
+        # the point to create the viewport at, so its box is centred on target
+        left, bottom, right, top = self.get(key)
+        return target[0] - (right - left) / 2.0, target[1] - (top - bottom) / 2.0
+
+
+def shelf_pack(sizes, region, spacing=0.0):
+    # centres for boxes of (width, height), filled row by row from the top left of the region, and the row of each
+    # each row is as high as its highest box. Boxes that do not fit carry on below the region
+    centres = []
+    rows = []
+    row = 0
+    u = region.min_u
+    top = region.max_v
+    row_height = 0.0
+    for width, height in sizes:
+        if u > region.min_u and u + width > region.max_u:
+            # start a new row
+            top -= row_height + spacing
+            u = region.min_u
+            row_height = 0.0
+            row += 1
+        centres.append((u + width / 2.0, top - height / 2.0))
+        rows.append(row)
+        u += width + spacing
+        row_height = max(row_height, height)
+    return centres, rows
+
+
+def centred_row(sizes, region, spacing=0.0):
+    # shelf_pack, with each row centred in the region
+    centres, rows = shelf_pack(sizes, region, spacing)
+    grouped = {}
+    for index, row in enumerate(rows):
+        grouped.setdefault(row, []).append(index)
+    for indices in grouped.values():
+        left = centres[indices[0]][0] - sizes[indices[0]][0] / 2.0
+        right = centres[indices[-1]][0] + sizes[indices[-1]][0] / 2.0
+        shift = (region.min_u + region.max_u) / 2.0 - (left + right) / 2.0
+        for index in indices:
+            centres[index] = (centres[index][0] + shift, centres[index][1])
+    return centres
+
+
+# shared by all locators of a run
+GRIDS = GridCache()
+MARGINS = ViewportMargins()
+
+
+def _check():
+    # the offset of a vertical titleblock comes off the width, the cells are numbered column by column
+    outline = Box(0.0, 0.0, 4.0, 2.0)
+    assert titleblock_grid(outline, 0.5, "Vertical", 2, 2) == [(0.875, 0.5), (0.875, 1.5), (2.625, 0.5), (2.625, 1.5)]
+    # tops of boxes in one row can come out a float step apart, the row still centres as one
+    region = Box(0.0, -1.0, 1.0, 0.22)
+    sizes = [(0.3, 0.43), (0.3, 0.17)]
+    assert 0.22 - 0.43 / 2.0 + 0.43 / 2.0 != 0.22 - 0.17 / 2.0 + 0.17 / 2.0
+    assert shelf_pack(sizes, region)[1] == [0, 0]
+    assert [round(u, 9) for u, v in centred_row(sizes, region)] == [0.35, 0.65]
+    # random layouts never overlap
+    region = Box(0.1, 0.1, 1.0, 0.7)
+    import random
+    rng = random.Random(1)
+    for _ in range(2000):
+        sizes = [(rng.uniform(0.05, 0.5), rng.uniform(0.05, 0.4)) for _ in range(rng.randint(1, 12))]
+        placed = [Box.around(c, w, h) for c, (w, h) in zip(centred_row(sizes, region, rng.uniform(0, 0.05)), sizes)]
+        for i, a in enumerate(placed):
+            assert not any(a.overlaps(b) for b in placed[i + 1:])
+    # the margins learned from one viewport centre the next one on its target
+    margins = ViewportMargins()
+    margins.learn("type", (1.0, 1.0), (0.4, 0.3), Box(0.75, 0.8, 1.25, 1.2))
+    u, v = margins.placement_point("type", (2.0, 2.0), (0.4, 0.3))
+    left, bottom, right, top = margins.get("type")
+    assert Box(u - 0.2 - left, v - 0.15 - bottom, u + 0.2 + right, v + 0.15 + top).center == (2.0, 2.0)
+    print("sheetlayout ok")
+
+
+if __name__ == "__main__":
+    _check()
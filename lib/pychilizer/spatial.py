@@ -0,0 +1,361 @@
+"""Tolerance-aware point and axis matching on plain (x, y, z) tuples. No Revit imports, so it can run outside Revit"""
+import hashlib
+import math
+
+# endpoints closer than this (feet) are the same point
+TOLERANCE = 0.003
+
+
+def _distance_sq(a, b):
+    dx = a[0] - b[0]
+    dy = a[1] - b[1]
+    dz = a[2] - b[2]
+    return dx * dx + dy * dy + dz * dz
+
+
+class PointHash(object):
+    """Points bucketed in grid cells the size of the tolerance, so a match is only looked for in the 27 cells
+    around a point"""
+    __slots__ = ("tolerance", "_tol_sq", "_cells", "_count")
+
+    def __init__(self, tolerance=TOLERANCE):
+        self.tolerance = tolerance
+        self._tol_sq = tolerance * tolerance
+        self._cells = {}  # {cell : [(point, item)]}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _cell(self, pt):
+        t = self.tolerance
+        return int(math.floor(pt[0] / t)), int(math.floor(pt[1] / t)), int(math.floor(pt[2] / t))
+
+    def _match(self, pt):
+        # (cell, index in cell) of the first stored point within tolerance, None if there is none
+        cx, cy, cz = self._cell(pt)
+        cells = self._cells
+        for i in (cx - 1, cx, cx + 1):
+            for j in (cy - 1, cy, cy + 1):
+                for k in (cz - 1, cz, cz + 1):
+                    bucket = cells.get((i, j, k))
+                    if not bucket:
+                        continue
+                    for index, (stored, item) in enumerate(bucket):
+                        if _distance_sq(pt, stored) <= self._tol_sq:
+                            return (i, j, k), index
+        return None
+
+    def find(self, pt):
+        # (point, item) stored within tolerance of pt, None if there is none
+        match = self._match(pt)
+        if match is None:
+            return None
+        cell, index = match
+        return self._cells[cell][index]
+
+    def add(self, pt, item=None):
+        self._cells.setdefault(self._cell(pt), []).append((pt, item))
+        self._count += 1
+
+    def pop(self, pt):
+        # remove and return the (point, item) matching pt, None if there is none
+        match = self._match(pt)
+        if match is None:
+            return None
+        cell, index = match
+        bucket = self._cells[cell]
+        found = bucket.pop(index)
+        if not bucket:
+            del self._cells[cell]
+        self._count -= 1
+        return found
+
+    def toggle(self, pt, item=None):
+        # remove the matching point if there is one, otherwise store pt. Return the removed (point, item)
+        found = self.pop(pt)
+        if found is None:
+            self.add(pt, item)
+        return found
+
+    def items(self):
+        for bucket in self._cells.values():
+            for entry in bucket:
+                yield entry
+
+
+def open_ends(segments, tolerance=TOLERANCE):
+    # endpoints of ((x, y, z), (x, y, z)) segments that are not matched by another endpoint
+    # returned as (point, segment index, end index), in the order they were met
+    ends = PointHash(tolerance)
+    order = 0
+    for seg_index, segment in enumerate(segments):
+        for end_index in range(2):
+            ends.toggle(segment[end_index], (order, seg_index, end_index))
+            order += 1
+    unmatched = sorted(ends.items(), key=lambda entry: entry[1][0])
+    return [(pt, item[1], item[2]) for pt, item in unmatched]
+
+
+def snap_points(points, tolerance=TOLERANCE):
+    # replace each point with the first point met within tolerance of it
+    seen = PointHash(tolerance)
+    snapped = []
+    for pt in points:
+        found = seen.find(pt)
+        if found is None:
+            seen.add(pt)
+            snapped.append(pt)
+        else:
+            snapped.append(found[0])
+    return snapped
+
+
+def snap_segments(segments, tolerance=TOLERANCE):
+    # snap the endpoints of segments so near-coincident ends become identical
+    flat = snap_points([pt for segment in segments for pt in segment], tolerance)
+    return [(flat[2 * i], flat[2 * i + 1]) for i in range(len(segments))]
+
+
+# parallel lines within this angle (radians) share an axis
+ANGLE_TOLERANCE = 1e-3
+
+
+def _axis(origin, direction, reference=(0.0, 0.0)):
+    # (angle in [0, pi), signed offset of the line from the reference point, unit direction) of a line in plan
+    dx, dy = direction[0], direction[1]
+    length = math.hypot(dx, dy)
+    dx, dy = dx / length, dy / length
+    angle = math.atan2(dy, dx)
+    if angle < 0:
+        angle += math.pi
+        dx, dy = -dx, -dy
+    if angle >= math.pi:
+        angle -= math.pi
+        dx, dy = -dx, -dy
+    return angle, dx * (origin[1] - reference[1]) - dy * (origin[0] - reference[0]), (dx, dy)
+
+
+class AxisIndex(object):
+    """Lines in plan bucketed by quantised angle and perpendicular offset, so the collinear lines already
+    indexed are found by checking the neighbouring buckets only.
+    Offsets are measured from the first line indexed: lines within the angle tolerance drift apart in offset by
+    up to their distance from that point times the angle, so the search widens with it. Rooms on survey
+    coordinates, far from the model's origin, still search a few buckets"""
+    __slots__ = ("tolerance", "angle_tolerance", "_bins", "_sin_tol", "_buckets", "axes", "_reference")
+
+    def __init__(self, tolerance=TOLERANCE, angle_tolerance=ANGLE_TOLERANCE):
+        self.tolerance = tolerance
+        self.angle_tolerance = angle_tolerance
+        self._bins = max(int(math.pi / angle_tolerance), 1)
+        self._sin_tol = math.sin(angle_tolerance)
+        self._buckets = {}  # {angle bin : {offset bin : [axis index]}}
+        self.axes = []  # [(origin, unit direction)]
+        self._reference = None
+
+    def _key(self, angle, offset):
+        return int(angle * self._bins / math.pi) % self._bins, int(math.floor(offset / self.tolerance))
+
+    def _near(self, angle_bin, offset_bin, reach):
+        # [axis index] of the buckets of the angle bin within reach of the offset bin
+        buckets = self._buckets.get(angle_bin)
+        if not buckets:
+            return []
+        if len(buckets) <= 2 * reach:
+            return [index for o, indices in buckets.items() if abs(o - offset_bin) <= reach for index in indices]
+        return [index for o in range(offset_bin - reach, offset_bin + reach + 1) for index in buckets.get(o, ())]
+
+    def _is_on(self, index, origin, direction):
+        axis_origin, axis_dir = self.axes[index]
+        if abs(axis_dir[0] * direction[1] - axis_dir[1] * direction[0]) > self._sin_tol:
+            return False
+        dx, dy = origin[0] - axis_origin[0], origin[1] - axis_origin[1]
+        return abs(axis_dir[0] * dy - axis_dir[1] * dx) <= self.tolerance
+
+    def find(self, origin, direction):
+        # index of the axis the line lies on, None if there is none
+        if self._reference is None:
+            return None
+        angle, offset, unit = _axis(origin, direction, self._reference)
+        angle_bin, offset_bin = self._key(angle, offset)
+        # offset bins either side: the tolerance, and the drift of a line turned by the angle tolerance
+        drift = math.hypot(origin[0] - self._reference[0], origin[1] - self._reference[1]) * self.angle_tolerance
+        reach = int(math.ceil(drift / self.tolerance)) + 1
+        found = None
+        for step in (0, -1, 1):
+            b = angle_bin + step
+            off_bin = offset_bin
+            if b < 0 or b >= self._bins:
+                # across the 0 / pi seam the direction flips, and with it the sign of the offset
+                b %= self._bins
+                off_bin = int(math.floor(-offset / self.tolerance))
+            for index in self._near(b, off_bin, reach):
+                # the first axis indexed, as a pairwise search would find
+                if (found is None or index < found) and self._is_on(index, origin, unit):
+                    found = index
+        return found
+
+    def add(self, origin, direction):
+        if self._reference is None:
+            self._reference = (origin[0], origin[1])
+        angle, offset, unit = _axis(origin, direction, self._reference)
+        index = len(self.axes)
+        self.axes.append((origin, unit))
+        angle_bin, offset_bin = self._key(angle, offset)
+        self._buckets.setdefault(angle_bin, {}).setdefault(offset_bin, []).append(index)
+        return index
+
+
+def collinear_groups(lines, tolerance=TOLERANCE, angle_tolerance=ANGLE_TOLERANCE):
+    # group (origin, direction) lines lying on the same axis. Returns a list of [line indices], one per axis,
+    # in the order the axes were met
+    index = AxisIndex(tolerance, angle_tolerance)
+    groups = []
+    for i, (origin, direction) in enumerate(lines):
+        found = index.find(origin, direction)
+        if found is None:
+            index.add(origin, direction)
+            groups.append([i])
+        else:
+            groups[found].append(i)
+    return groups
+
+
+def unique_segments(segments, tolerance=TOLERANCE, angle_tolerance=ANGLE_TOLERANCE):
+    # indices of the first segment on each axis
+    lines = [(a, (b[0] - a[0], b[1] - a[1])) for a, b in segments]
+    return [group[0] for group in collinear_groups(lines, tolerance, angle_tolerance)]
+
+
+def merge_span(segments):
+    # the segment spanning all (start, end) segments of one axis, measured along the first one
+    origin, end = segments[0]
+    dx, dy = end[0] - origin[0], end[1] - origin[1]
+    length = math.hypot(dx, dy)
+    dx, dy = dx / length, dy / length
+    params = [(pt[0] - origin[0]) * dx + (pt[1] - origin[1]) * dy for segment in segments for pt in segment]
+    low, high = min(params), max(params)
+    z = origin[2]
+    return (origin[0] + dx * low, origin[1] + dy * low, z), (origin[0] + dx * high, origin[1] + dy * high, z)
+
+
+def merge_collinear(segments, tolerance=TOLERANCE, angle_tolerance=ANGLE_TOLERANCE):
+    # one spanning segment per axis
+    lines = [(a, (b[0] - a[0], b[1] - a[1])) for a, b in segments]
+    return [merge_span([segments[i] for i in group])
+            for group in collinear_groups(lines, tolerance, angle_tolerance)]
+
+
+def fingerprint(loops, *values):
+    # short hash of point loops ([[(x, y, z)]]) and other values. Points are rounded to the tolerance
+    parts = [";".join(",".join(str(int(round(c / TOLERANCE))) for c in pt) for pt in loop) for loop in loops]
+    parts.extend(u"{}".format(value) for value in values)
+    return hashlib.sha1(u"|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _open_ends_quadratic(segments, tolerance=TOLERANCE):
+    # the list based matching formerly used by geo.get_open_ends, kept for the benchmark
+    tol_sq = tolerance * tolerance
+    endpoints = []
+    for segment in segments:
+        for pt in segment:
+            for other in endpoints:
+                if _distance_sq(pt, other) <= tol_sq:
+                    endpoints.remove(other)
+                    break
+            else:
+                endpoints.append(pt)
+    return endpoints
+
+
+def _unique_segments_quadratic(segments, tolerance=TOLERANCE):
+    # the pairwise axis distance check formerly used by geo.get_unique_borders, kept for the benchmark
+    axes = []
+    unique = []
+    for i, (a, b) in enumerate(segments):
+        mid = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        length = math.hypot(dx, dy)
+        dx, dy = dx / length, dy / length
+        on_axis = False
+        for origin, d in axes:
+            if abs(d[0] * (mid[1] - origin[1]) - d[1] * (mid[0] - origin[0])) <= tolerance:
+                on_axis = True
+        if not on_axis:
+            axes.append((mid, (dx, dy)))
+            unique.append(i)
+    return unique
+
+
+def _split_room_segments(n, pieces=10, jitter=1e-4, centre=(0.0, 0.0), drift=0.0):
+    # a jagged room outline of n / pieces walls, each wall split into collinear pieces
+    # pieces turned by up to drift radians, around a centre as far from the origin as survey coordinates can be
+    import random
+    rnd = random.Random(0)
+    walls = max(n // pieces, 4)
+    segments = []
+    for w in range(walls):
+        angle = 2 * math.pi * w / walls
+        origin = (centre[0] + 1000.0 * math.cos(angle), centre[1] + 1000.0 * math.sin(angle), 0.0)
+        d = (-math.sin(angle), math.cos(angle))
+        for p in range(pieces):
+            t0 = p * 10.0
+            turn = angle + rnd.uniform(-drift, drift)
+            piece = (-math.sin(turn) * 10.0, math.cos(turn) * 10.0)
+            start = (origin[0] + d[0] * t0, origin[1] + d[1] * t0 + rnd.uniform(-jitter, jitter), 0.0)
+            segments.append((start, (start[0] + piece[0], start[1] + piece[1], 0.0)))
+    rnd.shuffle(segments)
+    return segments
+
+
+def _polygon_segments(n, radius=100.0, jitter=0.001):
+    # a closed n-gon whose shared endpoints differ by less than the tolerance, segments in random order
+    import random
+    rnd = random.Random(0)
+    pts = [(radius * math.cos(2 * math.pi * i / n), radius * math.sin(2 * math.pi * i / n), 0.0) for i in range(n)]
+    segments = []
+    for i in range(n):
+        a = pts[i]
+        b = pts[(i + 1) % n]
+        b = (b[0] + rnd.uniform(-jitter, jitter), b[1] + rnd.uniform(-jitter, jitter), 0.0)
+        segments.append((a, b))
+    rnd.shuffle(segments)
+    return segments
+
+
+def benchmark(sizes=(100, 1000, 4000)):
+    import time
+    for n in sizes:
+        segments = _polygon_segments(n)
+        start = time.time()
+        hashed = open_ends(segments)
+        t_hash = time.time() - start
+        start = time.time()
+        quadratic = _open_ends_quadratic(segments)
+        t_quad = time.time() - start
+        print("{:>6} segments  hash {:8.4f}s  list {:8.4f}s  open ends {} / {}".format(
+            n, t_hash, t_quad, len(hashed), len(quadratic)))
+
+
+def benchmark_unique(sizes=(1000, 10000), tolerance=10 / 304.8):
+    import time
+    cases = [("", {}), ("survey, drift", {"centre": (100000.0, -50000.0), "drift": 1e-4})]
+    for n in sizes:
+        for label, options in cases:
+            segments = _split_room_segments(n, **options)
+            start = time.time()
+            bucketed = unique_segments(segments, tolerance)
+            t_bucket = time.time() - start
+            start = time.time()
+            merge_collinear(segments, tolerance)
+            t_merge = time.time() - start
+            start = time.time()
+            quadratic = _unique_segments_quadratic(segments, tolerance)
+            t_quad = time.time() - start
+            print("{:>6} segments  buckets {:8.4f}s  merge {:8.4f}s  pairwise {:8.4f}s  axes {} / {}  {}".format(
+                n, t_bucket, t_merge, t_quad, len(bucketed), len(quadratic), label))
+
+
+if __name__ == "__main__":
+    benchmark()
+    benchmark_unique()
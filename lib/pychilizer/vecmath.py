@@ -0,0 +1,304 @@
+"""Small vector, segment and transform types for the geometry math, in plain Python so it needs no Revit.
+Convert from Revit objects with from_xyz / from_transform and back only at the edges (see geo.to_xyz)"""
+import math
+
+TOLERANCE = 1e-9
+
+
+class Vec3(object):
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __repr__(self):
+        return "Vec3({}, {}, {})".format(self.x, self.y, self.z)
+
+    def __eq__(self, other):
+        return isinstance(other, Vec3) and self.x == other.x and self.y == other.y and self.z == other.z
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.x, self.y, self.z))
+
+    def __add__(self, other):
+        return Vec3(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return Vec3(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __neg__(self):
+        return Vec3(-self.x, -self.y, -self.z)
+
+    def __mul__(self, k):
+        return Vec3(self.x * k, self.y * k, self.z * k)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, k):
+        k = float(k)
+        return Vec3(self.x / k, self.y / k, self.z / k)
+
+    __div__ = __truediv__
+
+    def dot(self, other):
+        return self.x * other.x + self.y * other.y + self.z * other.z
+
+    def cross(self, other):
+        return Vec3(self.y * other.z - self.z * other.y,
+                    self.z * other.x - self.x * other.z,
+                    self.x * other.y - self.y * other.x)
+
+    @property
+    def length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def normalize(self):
+        length = self.length
+        if length < TOLERANCE:
+            return Vec3()
+        return Vec3(self.x / length, self.y / length, self.z / length)
+
+    def distance_to(self, other):
+        return (self - other).length
+
+    def is_almost_equal_to(self, other, tolerance=TOLERANCE):
+        return self.distance_to(other) <= tolerance
+
+    def angle_to(self, other):
+        # angle between the vectors, 0 to pi, as XYZ.AngleTo
+        cross = self.cross(other).length
+        return math.atan2(cross, self.dot(other))
+
+    def angle_on_plane_to(self, other, normal):
+        # angle from this vector to the other measured counterclockwise around normal, 0 to 2pi,
+        # as XYZ.AngleOnPlaneTo
+        n = normal.normalize()
+        a = self - n * self.dot(n)
+        b = other - n * other.dot(n)
+        angle = math.atan2(n.dot(a.cross(b)), a.dot(b))
+        if angle < 0:
+            angle += 2 * math.pi
+        return angle
+
+
+BASIS_X = Vec3(1.0, 0.0, 0.0)
+BASIS_Y = Vec3(0.0, 1.0, 0.0)
+BASIS_Z = Vec3(0.0, 0.0, 1.0)
+ORIGIN = Vec3()
+
+
+class Segment(object):
+    __slots__ = ("start", "end")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return "Segment({!r}, {!r})".format(self.start, self.end)
+
+    @property
+    def vector(self):
+        return self.end - self.start
+
+    @property
+    def direction(self):
+        return self.vector.normalize()
+
+    @property
+    def length(self):
+        return self.vector.length
+
+    @property
+    def midpoint(self):
+        return (self.start + self.end) * 0.5
+
+    def evaluate(self, parameter):
+        # point at a normalized parameter, 0 at the start and 1 at the end
+        return self.start + self.vector * parameter
+
+    def project(self, point):
+        # closest point of the segment to the point
+        vector = self.vector
+        length_sq = vector.dot(vector)
+        if length_sq < TOLERANCE:
+            return self.start
+        parameter = max(0.0, min(1.0, (point - self.start).dot(vector) / length_sq))
+        return self.evaluate(parameter)
+
+    def distance_to(self, point):
+        return self.project(point).distance_to(point)
+
+    def transformed(self, transform):
+        return Segment(transform.of_point(self.start), transform.of_point(self.end))
+
+
+class Affine(object):
+    """A rotation or general linear part given by its basis vectors, and a translation, as DB.Transform"""
+    __slots__ = ("basis_x", "basis_y", "basis_z", "origin")
+
+    def __init__(self, basis_x=BASIS_X, basis_y=BASIS_Y, basis_z=BASIS_Z, origin=ORIGIN):
+        self.basis_x = basis_x
+        self.basis_y = basis_y
+        self.basis_z = basis_z
+        self.origin = origin
+
+    @classmethod
+    def identity(cls):
+        return cls()
+
+    @classmethod
+    def translation(cls, vector):
+        return cls(origin=vector)
+
+    @classmethod
+    def rotation(cls, axis, angle, point=ORIGIN):
+        # rotation by angle (counterclockwise, radians) around the axis through point
+        u = axis.normalize()
+        c = math.cos(angle)
+        s = math.sin(angle)
+        t = 1 - c
+
+        def rotate(v):
+            return v * c + u.cross(v) * s + u * (u.dot(v) * t)
+
+        rotated = cls(rotate(BASIS_X), rotate(BASIS_Y), rotate(BASIS_Z))
+        rotated.origin = point - rotated.of_vector(point)
+        return rotated
+
+    def of_vector(self, v):
+        return Vec3(self.basis_x.x * v.x + self.basis_y.x * v.y + self.basis_z.x * v.z,
+                    self.basis_x.y * v.x + self.basis_y.y * v.y + self.basis_z.y * v.z,
+                    self.basis_x.z * v.x + self.basis_y.z * v.y + self.basis_z.z * v.z)
+
+    def of_point(self, p):
+        return self.of_vector(p) + self.origin
+
+    def multiply(self, other):
+        # the transform applying other first, then this one
+        return Affine(self.of_vector(other.basis_x), self.of_vector(other.basis_y), self.of_vector(other.basis_z),
+                      self.of_point(other.origin))
+
+    @property
+    def determinant(self):
+        return self.basis_x.dot(self.basis_y.cross(self.basis_z))
+
+    @property
+    def inverse(self):
+        det = self.determinant
+        if abs(det) < TOLERANCE:
+            raise ValueError("The transform cannot be inverted")
+        # rows of the inverse are the cross products of the basis vectors over the determinant
+        r0 = self.basis_y.cross(self.basis_z) / det
+        r1 = self.basis_z.cross(self.basis_x) / det
+        r2 = self.basis_x.cross(self.basis_y) / det
+        inverse = Affine(Vec3(r0.x, r1.x, r2.x), Vec3(r0.y, r1.y, r2.y), Vec3(r0.z, r1.z, r2.z))
+        inverse.origin = -inverse.of_vector(self.origin)
+        return inverse
+
+
+def from_xyz(xyz):
+    # anything with X, Y and Z
+    return Vec3(xyz.X, xyz.Y, xyz.Z)
+
+
+def from_transform(transform):
+    # anything with BasisX, BasisY, BasisZ and Origin
+    return Affine(from_xyz(transform.BasisX), from_xyz(transform.BasisY), from_xyz(transform.BasisZ),
+                  from_xyz(transform.Origin))
+
+
+def box_corners(box_min, box_max):
+    # the 8 corners of a box, bottom then top, in the order geo.bb_corners returns them
+    x0, y0, z0 = box_min
+    x1, y1, z1 = box_max
+    return [Vec3(x0, y0, z0), Vec3(x1, y0, z0), Vec3(x0, y1, z0), Vec3(x1, y1, z0),
+            Vec3(x1, y1, z1), Vec3(x0, y1, z1), Vec3(x1, y0, z1), Vec3(x0, y0, z1)]
+
+
+def rectangle(points):
+    # closed outline through the points, as segments
+    return [Segment(points[i], points[(i + 1) % len(points)]) for i in range(len(points))]
+
+
+def bounds(points):
+    # (min, max) corners of the points
+    xs = [p.x for p in points]
+    ys = [p.y for p in points]
+    zs = [p.z for p in points]
+    return Vec3(min(xs), min(ys), min(zs)), Vec3(max(xs), max(ys), max(zs))
+
+
+def signed_area(points):
+    # area of the closed loop through the points, in plan. Positive when the loop runs counterclockwise
+    area = 0.0
+    for i in range(len(points)):
+        a = points[i]
+        b = points[(i + 1) % len(points)]
+        area += a.x * b.y - b.x * a.y
+    return area / 2.0
+
+
+def inward_normal(segment, counterclockwise=True):
+    # horizontal normal of a segment of a closed loop, pointing to the side the loop encloses
+    d = segment.direction
+    left = Vec3(-d.y, d.x, 0.0).normalize()
+    return left if counterclockwise else -left
+
+
+def loop_normal(points):
+    # normal of the plane of a closed loop (Newell's method), the loop runs counterclockwise around it
+    x = y = z = 0.0
+    for i in range(len(points)):
+        a = points[i]
+        b = points[(i + 1) % len(points)]
+        x += (a.y - b.y) * (a.z + b.z)
+        y += (a.z - b.z) * (a.x + b.x)
+        z += (a.x - b.x) * (a.y + b.y)
+    return Vec3(x, y, z)
+
+
+def _check():
+    # a rotation about an axis off the origin, undone by its inverse
+    point = Vec3(1.0, -2.0, 0.5)
+    turn = Affine.rotation(Vec3(1.0, 1.0, 1.0), 1.1, Vec3(3.0, 0.0, -1.0))
+    move = Affine.translation(Vec3(10.0, -5.0, 3.0)).multiply(turn)
+    assert move.inverse.of_point(move.of_point(point)).is_almost_equal_to(point, 1e-9)
+    assert move.multiply(move.inverse).of_point(point).is_almost_equal_to(point, 1e-9)
+    # a quarter turn counterclockwise about Z through (1, 0, 0), as Transform.CreateRotationAtPoint
+    quarter = Affine.rotation(BASIS_Z, math.pi / 2, Vec3(1.0, 0.0, 0.0))
+    assert quarter.of_point(Vec3(2.0, 0.0, 4.0)).is_almost_equal_to(Vec3(1.0, 1.0, 4.0), 1e-9)
+    assert abs(turn.determinant - 1.0) < 1e-9
+    try:
+        Affine(BASIS_X, BASIS_X, BASIS_Z).inverse
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a flat transform has no inverse")
+    # a counterclockwise rectangle: positive area, inward normals into it, normal up
+    rect = [Vec3(0.0, 0.0), Vec3(4.0, 0.0), Vec3(4.0, 3.0), Vec3(0.0, 3.0)]
+    assert signed_area(rect) == 12.0
+    assert signed_area(list(reversed(rect))) == -12.0
+    bottom = Segment(rect[0], rect[1])
+    assert inward_normal(bottom).is_almost_equal_to(BASIS_Y)
+    assert inward_normal(Segment(rect[1], rect[0]), counterclockwise=False).is_almost_equal_to(BASIS_Y)
+    assert loop_normal(rect).normalize().is_almost_equal_to(BASIS_Z)
+    assert loop_normal(list(reversed(rect))).normalize().is_almost_equal_to(-BASIS_Z)
+    # the loop turned onto a wall still has its normal along the turned Z
+    upright = Affine.rotation(BASIS_X, math.pi / 2)
+    assert loop_normal([upright.of_point(p) for p in rect]).normalize().is_almost_equal_to(-BASIS_Y)
+    print("vecmath ok")
+
+
+if __name__ == "__main__":
+    _check()
@@ -5,7 +5,7 @@ from itertools import izip
 from pyrevit import revit, DB, script, HOST_APP, forms
 from rpw.ui.forms import (FlexForm, Label, ComboBox, Separator, Button, CheckBox)
 import sys
-from pychilizer import database
+from pychilizer import database, parameters
 # select all legend components in active view
 view = revit.active_view
 if view.ViewType != DB.ViewType.Legend:
@@ -105,21 +105,23 @@ selected_parameters = forms.SelectFromList.show(parameters_names_list,
 
 forms.alert_ifnot(selected_parameters, "No Parameters Selected", exitscript=True)
 
+# one column per parameter - the name lookup is resolved once per family
+parameter_columns = [(sp, parameters.ParameterColumn(sp, revit.doc)) for sp in selected_parameters]
+
 # TAG TAG TAG
 with revit.Transaction("Tag parameter values"):
     for l, ton in izip(legend_components, types_on_legend):
         all_p_txt = []
 
-        for sp in selected_parameters:
-            try:
-                p = ton.LookupParameter(sp)
-                param_value = database.get_param_value_as_string(p)
-                if show_p_name:
-                    all_p_txt.append("{0} : {1}".format(sp, str(param_value)))
-                else:
-                    all_p_txt.append(str(param_value))
-            except:
-                pass
+        for sp, column in parameter_columns:
+            read = column.read(ton) if ton else None
+            if read is None:
+                continue
+            param_value = read[1]
+            if show_p_name:
+                all_p_txt.append("{0} : {1}".format(sp, str(param_value)))
+            else:
+                all_p_txt.append(str(param_value))
 
         # position the note
 
@@ -13,7 +13,6 @@ logger = script.get_logger()
 BIC = DB.BuiltInCategory
 doc = revit.doc
 overrides_option = threedconfig.get_overrides_config()
-solid_fill_pattern = database.get_solid_fill_pat(doc=doc)
 
 categories_for_selection = colorize.get_categories_config(doc)
 sorted_cats = sorted(categories_for_selection.keys(), key=lambda x: x)
@@ -39,7 +38,7 @@ with revit.Transaction("Create Colorized 3D"):
         viewtype_id = database.get_3Dviewtype_id(doc=doc)
         database.remove_viewtemplate(viewtype_id, doc=doc)
         view = DB.View3D.CreateIsometric(doc, viewtype_id)
-        view.Name = view_name
+        database.rename_view(view, view_name, doc)
 
     # hide other categories
     for cat in hide_categories_except:
@@ -75,14 +74,9 @@ for el in get_view_elements:
             type_id = el.GetTypeId()
     types_dict[type_id].add(el.Id)
 
-# colour dictionary
-n = len(types_dict)
-revit_colours = colorize.get_colours(n)
+# types keep their colour between runs
+revit_colours = colorize.palette_colours(colorize.palette_name("Type", selected_cat), types_dict.keys(), doc)
 
 with revit.Transaction("Isolate and Colorize Types"):
-    for type_id, colour in zip(types_dict.keys(), revit_colours):
-        type_instance = types_dict[type_id]
-        override = colorize.set_colour_overrides_by_option(overrides_option, colour, doc)
-        for inst in type_instance:
-            view.SetElementOverrides(inst, override)
+    colorize.apply_colour_groups(view, types_dict, revit_colours, overrides_option, doc)
 revit.active_view = view
@@ -10,3 +10,4 @@ def get_overrides_config():
 if __name__ == "__main__":
     colorize.config_overrides(overrides_config, colorize.OVERRIDES_CONFIG_OPTION_NAME)
     colorize.config_category_overrides(revit.doc)
+    colorize.config_colour_blind_safe()
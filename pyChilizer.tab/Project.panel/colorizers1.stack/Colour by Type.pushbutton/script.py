@@ -13,7 +13,6 @@ BIC = DB.BuiltInCategory
 doc = revit.doc
 view = revit.active_view
 overrides_option = inviewconfig.get_overrides_config()
-solid_fill_pattern = database.get_solid_fill_pat(doc=doc)
 # get all model builtin categories of the doc
 categories_for_selection = colorize.get_categories_config(doc)
 sorted_cats = sorted(categories_for_selection.keys(), key=lambda x: x)
@@ -50,12 +49,17 @@ for el in get_view_elements:
             type_id = el.GetTypeId()
     types_dict[type_id].add(el.Id)
 
-n = len(types_dict)
-revit_colours = colorize.get_colours(n)
+# types keep their colour between runs
+palette = colorize.palette_name("Type", selected_cat)
+revit_colours = colorize.palette_colours(palette, types_dict.keys(), doc)
 
-with revit.Transaction("Isolate and Colorize Types"):
-    for type_id, colour in zip(types_dict.keys(), revit_colours):
-        type_instance = types_dict[type_id]
-        override = colorize.set_colour_overrides_by_option(overrides_option, colour, doc)
-        for inst in type_instance:
-            view.SetElementOverrides(inst, override)
+# only the elements whose colour changed since the last run in the view are overridden
+with DB.Transaction(doc, "Isolate and Colorize Types") as t:
+    t.Start()
+    report, record = colorize.apply_colour_diff(view, types_dict, revit_colours, overrides_option, palette, doc,
+                                                inviewconfig.get_full_repaint_config())
+    committed = t.Commit() == DB.TransactionStatus.Committed
+# the record is a file next to the model, it only follows overrides that were committed
+if committed:
+    record.save()
+print(report)
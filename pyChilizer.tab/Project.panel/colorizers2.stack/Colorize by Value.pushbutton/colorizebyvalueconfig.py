@@ -7,6 +7,17 @@ def get_overrides_config():
     return colorize.get_config(overrides_config, colorize.OVERRIDES_CONFIG_OPTION_NAME, colorize.default_override_options)
 
 
+def get_full_repaint_config():
+    return colorize.get_full_repaint_config(overrides_config)
+
+
+def get_live_config():
+    return colorize.get_live_config(overrides_config)
+
+
 if __name__ == "__main__":
     colorize.config_overrides(overrides_config, colorize.OVERRIDES_CONFIG_OPTION_NAME)
     colorize.config_category_overrides(revit.doc)
+    colorize.config_colour_blind_safe()
+    colorize.config_full_repaint(overrides_config)
+    colorize.config_live(overrides_config)
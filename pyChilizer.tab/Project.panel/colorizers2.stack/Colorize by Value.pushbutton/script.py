@@ -4,6 +4,8 @@ from pyrevit import revit, DB, forms
 from pyrevit import script
 from pychilizer import database
 from pychilizer import colorize
+from pychilizer import livecolour
+from pychilizer import parameters
 import colorizebyvalueconfig
 from collections import defaultdict
 from pyrevit.revit.db import query
@@ -13,7 +15,16 @@ BIC = DB.BuiltInCategory
 doc = revit.doc
 view = revit.active_view
 
+# keeps the live colorize updater and its event handlers alive between runs
+__persistentengine__ = True
+# the engine also keeps the module caches, drop them so a run sees parameters and elements added since the last one
+database.drop_document_index()
+database.drop_shared_parameter_resolver()
+colorize.drop_override_factory()
+
 overrides_option = colorizebyvalueconfig.get_overrides_config()
+# a run replaces the live colorize of the previous run
+livecolour.stop()
 categories_for_selection = colorize.get_categories_config(doc)
 
 
@@ -51,6 +62,8 @@ get_view_elements = DB.FilteredElementCollector(doc) \
 
 inst_param_dict = {}
 type_param_dict = {}
+# GUID, Id and name lookups of all shared parameters, collected once
+shared_parameters = database.get_shared_parameter_resolver(doc)
 
 
 def param_is_bip(param):
@@ -61,10 +74,11 @@ def param_is_bip(param):
 for e in get_view_elements:
     element_parameter_set = e.Parameters
     for ip in element_parameter_set:
-        # if the parameter is shared - store as Id
-        if ip.IsShared and ip.Definition.Id not in inst_param_dict:
-            pretty_param_name = "".join([str(ip.Definition.Name), " [Shared Parameter]"])
-            inst_param_dict[ip.Definition.Id] = pretty_param_name
+        # if the parameter is shared - store as GUID
+        if ip.IsShared:
+            shared_param = shared_parameters.by_id(ip.Id)
+            if shared_param and shared_param.guid not in inst_param_dict:
+                inst_param_dict[shared_param.guid] = "".join([str(shared_param.name), " [Shared Parameter]"])
         # if the param is BIP - store as BIP
         elif param_is_bip(ip) and ip.Definition.Name not in inst_param_dict:
             inst_param_dict[ip.Definition.BuiltInParameter] = str(ip.Definition.Name)
@@ -75,9 +89,10 @@ for e in get_view_elements:
 
     type_parameter_set = doc.GetElement(e.GetTypeId()).Parameters
     for tp in type_parameter_set:
-        if tp.IsShared and tp.Definition.Id not in type_param_dict:
-            pretty_param_name = "".join([str(tp.Definition.Name), " [Shared Parameter]"])
-            type_param_dict[tp.Definition.Id] = pretty_param_name
+        if tp.IsShared:
+            shared_param = shared_parameters.by_id(tp.Id)
+            if shared_param and shared_param.guid not in type_param_dict:
+                type_param_dict[shared_param.guid] = "".join([str(shared_param.name), " [Shared Parameter]"])
         elif param_is_bip(tp) and tp.Definition.Name not in type_param_dict:
             type_param_dict[tp.Definition.BuiltInParameter] = str(tp.Definition.Name)
         # elif not (tp.IsShared) and not(param_is_bip(tp)) and tp.Definition.Id not in inst_param_dict:
@@ -92,41 +107,44 @@ i_p_ops = sorted(instance_p_class, key=lambda x: x.name)
 t_p_ops = sorted(type_p_class, key=lambda x: x.name)
 ops = {"Type Parameters": t_p_ops, "Instance Parameters": i_p_ops}
 
-# note: the selection will not actually be a parameter but either an Element Id or a BIP
+# note: the selection will not actually be a parameter but either a shared parameter GUID or a BIP
 selected_parameter = forms.SelectFromList.show(ops,
                                                button_name="Select Parameters",
                                                multiselect=False)
 
 forms.alert_ifnot(selected_parameter, "No Parameters Selected", exitscript=True)
 
-# get elements in current view
-first_el = get_view_elements[0]
-
-# need a nested dictionary
-values_dict = defaultdict(list)  # {value of parameter : element id}
+# read the parameter of all elements in one pass, type parameters once per type
+if selected_parameter in inst_param_dict.keys():
+    parameter_source = parameters.INSTANCE
+else:
+    parameter_source = parameters.TYPE
+column = parameters.ParameterColumn(selected_parameter, doc, parameter_source)
+values_dict = column.extract(get_view_elements).groups()  # {value of parameter : element ids}
 
-for el in get_view_elements:
-    if selected_parameter in inst_param_dict.keys():
-        el_parameter = el.get_Parameter(selected_parameter)
-        if el_parameter:
-            param_value = database.get_param_value_as_string(el_parameter)
-            # values_dict[param_value] = []
-            values_dict[param_value].append(el.Id)
-    else:
-        el_type = query.get_type(el)
-        element_type_parameter = el_type.get_Parameter(selected_parameter)
-        if element_type_parameter:
-            param_value = database.get_param_value_as_string(element_type_parameter)
-            values_dict[param_value].append(el.Id)
-
-# colour dictionary
-n = len(values_dict.keys())
-revit_colours = colorize.get_colours(n)
+# values keep their colour between runs
+palette = colorize.palette_name("Value", selected_cat, selected_parameter)
+revit_colours = colorize.palette_colours(palette, values_dict.keys(), doc)
 
 override_filters = 0
 
-with revit.Transaction("Colorize by Value", doc):
-    for param_value, colour in zip(values_dict.keys(), revit_colours):
-        override = colorize.set_colour_overrides_by_option(overrides_option, colour, doc)
-        for el_id in values_dict[param_value]:
-            view.SetElementOverrides(el_id, override)
+# only the elements whose colour changed since the last run in the view are overridden
+with DB.Transaction(doc, "Colorize by Value") as t:
+    t.Start()
+    report, record = colorize.apply_colour_diff(view, values_dict, revit_colours, overrides_option, palette, doc,
+                                                colorizebyvalueconfig.get_full_repaint_config())
+    committed = t.Commit() == DB.TransactionStatus.Committed
+# the record is a file next to the model, it only follows overrides that were committed
+if committed:
+    record.save()
+print(report)
+
+# live mode: keep recolouring the view as elements are added or the parameter changes
+if colorizebyvalueconfig.get_live_config():
+    if isinstance(selected_parameter, DB.BuiltInParameter):
+        parameter_id = DB.ElementId(selected_parameter)
+    else:
+        parameter_id = shared_parameters.id_from_guid(selected_parameter)
+    livecolour.start(doc, view, chosen_bic, selected_parameter, parameter_id, parameter_source, palette,
+                     overrides_option)
+    print("Live colorize is on until the view is closed or Colorize by Value is run again")
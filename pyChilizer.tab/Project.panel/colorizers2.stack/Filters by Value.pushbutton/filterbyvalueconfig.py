@@ -1,5 +1,5 @@
 from pyrevit import script, revit
-from pychilizer import colorize, database
+from pychilizer import colorize, database, profiler
 
 overrides_config = script.get_config() #get colorizebyvalue config - to store override options
 
@@ -10,3 +10,5 @@ def get_overrides_config():
 if __name__ == "__main__":
     colorize.config_overrides(overrides_config, colorize.OVERRIDES_CONFIG_OPTION_NAME)
     colorize.config_category_overrides(revit.doc)
+    colorize.config_colour_blind_safe()
+    profiler.config_profile()
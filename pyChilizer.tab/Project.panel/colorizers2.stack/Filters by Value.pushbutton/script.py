@@ -1,9 +1,13 @@
 import sys
+import math
 
 from pyrevit import revit, DB, forms
 from pyrevit import script
 from pychilizer import database
 from pychilizer import colorize
+from pychilizer import parameters
+from pychilizer import profiler
+from pychilizer import ranges
 from pyrevit.framework import List
 import filterbyvalueconfig
 from pyrevit.revit.db import query
@@ -17,11 +21,19 @@ doc = revit.doc
 view = revit.active_view
 
 overrides_option = filterbyvalueconfig.get_overrides_config()
+# timings of the run, profiling is switched on from the shift-click config
+prof = profiler.start("Filters by Value")
+prof.wrap(database, "create_filter_by_name_bics")
+prof.wrap(database, "check_filter_exists")
 
 # TODO - disabled for now, let's see .. Line 141-ish
 # OTHER NOTES
 EPSILON = 0.001  # for parameters with storage type Double
 SHARED_PARAMETER_LABEL = " [Shared Parameter]"
+# numeric parameters can have a filter for each value, or for each range of values
+ONE_FILTER_PER_VALUE = "One filter per value"
+DEFAULT_RANGES = 7
+MAX_RANGES = 20
 
 
 class ParameterOption(forms.TemplateListItem):
@@ -70,22 +82,20 @@ def get_multicat_param_storage_type(categories_list, parameter):
                 return database.p_storage_type(type_parameter)
 
 
-def add_param_value(param, param_storage_type, values):
-    el_parameter_value = database.get_param_value_by_storage_type(param)
+def add_param_value(el_parameter_value, display_value, param_storage_type, values, seen):
+    # seen holds the values (or display strings of Doubles) already added
     if el_parameter_value and param_storage_type == "Double":
         # special approach for values stored as a Double :
         # {pretty AsValueString name for the filter name : actual value as a double}
-        display_value = param.AsValueString()
-        values_set = display_value, el_parameter_value
-        if len(values) > 0 and display_value not in [x[0] for x in values]:
-            values.append(values_set)
-        elif len(values) == 0:
-            return values.append(values_set)
+        if display_value not in seen:
+            seen.add(display_value)
+            values.append((display_value, el_parameter_value))
     elif el_parameter_value is not None \
-            and el_parameter_value not in values \
+            and el_parameter_value not in seen \
             and el_parameter_value != DB.ElementId.InvalidElementId \
             and param_storage_type != "Double":
-        return values.append(el_parameter_value)
+        seen.add(el_parameter_value)
+        values.append(el_parameter_value)
     return
 
 
@@ -112,9 +122,12 @@ chosen_category_ids = [all_cats.get_Item(bic).Id for bic in chosen_bics]
 
 # get elements of chosen categories in current view
 multicatfilter = DB.ElementMulticategoryFilter(List[BIC](chosen_bics))
-get_view_elements = DB.FilteredElementCollector(doc, view.Id).WherePasses(multicatfilter).ToElements()
+with prof.phase("Collect elements"):
+    get_view_elements = prof.elements(DB.FilteredElementCollector(doc, view.Id).WherePasses(multicatfilter))
 
 param_dict = {}
+# GUID, Id and name lookups of all shared parameters, collected once
+shared_parameters = database.get_shared_parameter_resolver(doc)
 
 # a list of Ids of parameters that can be used for filters
 filterable_parameter_ids = DB.ParameterFilterUtilities.GetFilterableParametersInCommon(doc, List[DB.ElementId](
@@ -133,14 +146,11 @@ for id in filterable_parameter_ids:
             param_dict[bip] = database.get_builtin_label(bip)
     else:
         # Shared Parameter or (?) Project parameter
-        shared_param = doc.GetElement(id)
-        try:
+        shared_param = shared_parameters.by_id(id)
+        if shared_param:
             # It's a shared parameter
-            param_dict[shared_param.GuidValue] = shared_param.Name + SHARED_PARAMETER_LABEL
-        except:
-            # It's a project parameter - we are not using project parameters ? 
-            # param_dict[shared_param.Id] = shared_param.Name + "PROJECT PARAMETER"
-            pass
+            param_dict[shared_param.guid] = shared_param.name + SHARED_PARAMETER_LABEL
+        # otherwise it's a project parameter - we are not using project parameters
  
 
 forms.alert_ifnot(param_dict, "No parameters or elements found for selected categories", exitscript=True)
@@ -155,6 +165,7 @@ selected_parameter = forms.SelectFromList.show(p_ops,
 forms.alert_ifnot(selected_parameter, "No Parameters Selected", exitscript=True)
 
 values = []
+seen_values = set()
 
 # get the storage type of the selected parameter - used when constructing filters
 selected_param_storage_type = get_multicat_param_storage_type(chosen_bics, selected_parameter)
@@ -164,24 +175,40 @@ selected_param_storage_type = get_multicat_param_storage_type(chosen_bics, selec
 # * shared parameters can be both type and instance
 # BIP can exist for both type and instance
 # parameters can exist for both main and nested elements
-for el in get_view_elements:
-    el_param = el.get_Parameter(selected_parameter)
-    # if the element is an instance parameter and not a symbol parameter, query its value
-    if el_param \
-        and database.get_param_value_by_storage_type(el_param) is not None \
-        and selected_parameter not in banned_symbol_parameters:
-        add_param_value(el_param, selected_param_storage_type, values)
-    # if not - look for the parameter of the type of the element
-    elif selected_parameter != BIP.ELEM_PARTITION_PARAM:  # excluded workset parameter to ignore non user-created worksets
-        el_type = query.get_type(el)  # get type of the element
-        el_type_param = el_type.get_Parameter(selected_parameter)
-        if el_type_param:
-            add_param_value(el_type_param, selected_param_storage_type, values)  # add value
-
-# colour dictionary
+if selected_parameter in banned_symbol_parameters:
+    # symbol parameters exist on instances, but only the type holds the value
+    parameter_source = parameters.TYPE
+elif selected_parameter == BIP.ELEM_PARTITION_PARAM:
+    # excluded workset parameter of types to ignore non user-created worksets
+    parameter_source = parameters.INSTANCE
+else:
+    parameter_source = parameters.INSTANCE_OR_TYPE
+column = parameters.ParameterColumn(selected_parameter, doc, parameter_source)
+with prof.phase("Read values"):
+    extracted = column.extract(get_view_elements)
+    for value, display_value in zip(extracted.values, extracted.display):
+        add_param_value(value, display_value, selected_param_storage_type, values, seen_values)
+
 n = len(values)
 forms.alert_ifnot(n > 0, "There are no values found for the selected parameter.", exitscript=True)
-revit_colours = colorize.get_colours(n)
+
+# numeric parameters with many values can be split into ranges, so the number of filters stays bounded
+range_method = None
+if selected_param_storage_type in ("Double", "Integer") and n > 2:
+    range_method = forms.CommandSwitchWindow.show([ONE_FILTER_PER_VALUE] + ranges.METHODS,
+                                                  message="{} values found. Create filters for".format(n),
+                                                  width=400)
+    if not range_method:
+        script.exit()
+    if range_method == ONE_FILTER_PER_VALUE:
+        range_method = None
+    else:
+        range_count = forms.ask_for_number_slider(default=min(DEFAULT_RANGES, n), min=2, max=min(MAX_RANGES, n),
+                                                  interval=1, prompt="Number of ranges", title="Filters by Value")
+        if not range_count:
+            script.exit()
+        range_count = int(range_count)
+
 # keep record of the decision to override filters or not
 override_filters = 0
 # parameter id for filters
@@ -189,20 +216,87 @@ if isinstance(selected_parameter, DB.BuiltInParameter):
     parameter_id = DB.ElementId(selected_parameter)
 
 else:
-    parameter_id = database.shared_param_id_from_guid(chosen_bics, selected_parameter, doc)
+    parameter_id = shared_parameters.id_from_guid(selected_parameter)
     forms.alert_ifnot(parameter_id, "no id found for parameter {}".format(selected_parameter), exitscript=True)
 
-with revit.Transaction("Filters by Value", doc):
-    for param_value, colour in zip(values, revit_colours):
-        override = colorize.set_colour_overrides_by_option(overrides_option, colour, doc)
-        # create a filter for each param value
-        if selected_param_storage_type == "ElementId":
-            value_name = database.get_name(doc.GetElement(param_value))
-        elif selected_param_storage_type == "Double":
-            value_name = param_value[0]
-            param_value = param_value[1]
-        else:
-            value_name = str(param_value)
+
+def value_filter(param_value):
+    # (value name, filter rules) of the filter matching one value
+    if selected_param_storage_type == "ElementId":
+        value_name = database.get_name(doc.GetElement(param_value))
+    elif selected_param_storage_type == "Double":
+        value_name = param_value[0]
+        param_value = param_value[1]
+    else:
+        value_name = str(param_value)
+    if selected_param_storage_type == "ElementId":
+        equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, param_value)
+    elif selected_param_storage_type == "Integer":
+        equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, int(param_value))
+    elif selected_param_storage_type == "Double":
+        equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, param_value, EPSILON)
+    else:
+        try:
+            equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, param_value)
+        except TypeError:  # different method in versions earlier than R2023
+            equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, param_value, True)
+    return value_name, [equals_rule]
+
+
+def range_rule(create_rule, boundary, clearance):
+    # a GreaterOrEqual or Less rule on the boundary. Boundaries lie halfway between two values,
+    # for integers the next whole number keeps the values on the same side
+    if selected_param_storage_type == "Double":
+        # values within the tolerance of the boundary count as equal to it, so it stays below the clearance
+        # for values closer together than EPSILON
+        return create_rule(parameter_id, boundary, min(EPSILON, clearance / 2.0))
+    return create_rule(parameter_id, int(math.ceil(boundary)))
+
+
+def range_filters(numbers, boundaries):
+    # [(value name, filter rules)] of the filters matching each range of the numbers, [(value, display)]
+    # the first range has no lower bound and the last no upper bound, so together they match every value
+    filters = []
+    groups = ranges.group([number[0] for number in numbers], boundaries)
+    clearances = ranges.clearances([number[0] for number in numbers], boundaries)
+    for i, members in enumerate(groups):
+        if not members:
+            continue
+        low = min(numbers[m] for m in members)
+        high = max(numbers[m] for m in members)
+        value_name = str(low[1]) if low[0] == high[0] else "{} to {}".format(low[1], high[1])
+        rules = []
+        if i > 0:
+            rules.append(range_rule(DB.ParameterFilterRuleFactory.CreateGreaterOrEqualRule, boundaries[i - 1],
+                                    clearances[i - 1]))
+        if i < len(boundaries):
+            rules.append(range_rule(DB.ParameterFilterRuleFactory.CreateLessRule, boundaries[i], clearances[i]))
+        filters.append((value_name, rules))
+    return filters
+
+
+if range_method:
+    # the breaks are worked out from the values read above, in one pass over them
+    with prof.phase("Compute ranges"):
+        numbers = [(value, display) for value, display in zip(extracted.values, extracted.display)
+                   if value is not None]
+        boundaries = ranges.breaks([number[0] for number in numbers], range_count, range_method)
+        filter_specs = range_filters(numbers, boundaries)
+    # ranges are ordered, low to high
+    revit_colours = colorize.get_ramp_colours(len(filter_specs))
+else:
+    filter_specs = [value_filter(param_value) for param_value in values]
+    # values keep their colour between runs, the same as in Colorize by Value for a single category
+    palette = colorize.palette_name("Value", ", ".join(sorted(selected_cat)), selected_parameter)
+    revit_colours = colorize.palette_colours(palette, values, doc)
+
+# overrides are built once per colour, with the solid fill pattern looked up once
+override_factory = colorize.get_override_factory(doc)
+
+with prof.phase("Create filters"), revit.Transaction("Filters by Value", doc):
+    for (value_name, rules), colour in zip(filter_specs, revit_colours):
+        override = override_factory.override(overrides_option, colour)
+        # create a filter for each param value, or range of values
         filter_name = param_dict[selected_parameter].replace(SHARED_PARAMETER_LABEL, "") + " - " + value_name
         # replace forbidden characters (replace all occurrences, not just strip from ends):
         forbidden_chars = "{}[]:\|?/<>*"
@@ -233,26 +327,14 @@ with revit.Transaction("Filters by Value", doc):
             if filter_exists and override_filters == -1:
                 # Delete existing filter if user chose not to reuse
                 try:
-                    doc.Delete(filter_exists.Id)
+                    database.delete_filter(filter_exists, doc)
                     # Re-check if filter still exists after deletion
                     filter_exists = database.check_filter_exists(filter_name, doc)
                 except:
                     # If deletion fails, filter still exists - we'll use it below
                     pass
             
-            # Create filter rules
-            if selected_param_storage_type == "ElementId":
-                equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, param_value)
-            elif selected_param_storage_type == "Integer":
-                equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, int(param_value))
-            elif selected_param_storage_type == "Double":
-                equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, param_value, EPSILON)
-            elif selected_param_storage_type == "String":
-                try:
-                    equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, param_value)
-                except TypeError:  # different method in versions earlier than R2023
-                    equals_rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(parameter_id, param_value, True)
-            f_rules = List[DB.FilterRule]([equals_rule])
+            f_rules = List[DB.FilterRule](rules)
             parameter_filter = database.filter_from_rules(f_rules)
             
             # Check if filter exists before creating (handles cases where deletion didn't work or wasn't attempted)
@@ -279,4 +361,6 @@ with revit.Transaction("Filters by Value", doc):
             if not view.GetFilters().Contains(filter_id):
                 view.AddFilter(filter_id)
         
-        view.SetFilterOverrides(filter_id, override)
+        colorize.apply_filter_overrides(view, [filter_id], override)
+
+prof.report()
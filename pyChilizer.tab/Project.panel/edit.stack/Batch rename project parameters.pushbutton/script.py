@@ -3,6 +3,7 @@ __title__ = 'Batch Rename Shared Parameters'
 __doc__ = 'Creates new shared parameters by replacing one text value in the parameter name with another and copies values from the original parameters. Only processes shared parameters (skips project parameters).'
 
 from pyrevit import revit, DB, forms
+from pychilizer import parameters, profiler
 import os
 import sys
 
@@ -13,6 +14,9 @@ DEFAULT_OLD = ""
 DEFAULT_NEW = ""
 DEFAULT_GROUP = ""
 
+# timings of the run, profiling is switched on from the shift-click config
+prof = profiler.start("Batch Rename Shared Parameters")
+
 
 def temp_sp_path():
     # creates a temp file path for shared parameters
@@ -81,28 +85,16 @@ def find_definition_by_name(doc, name):
     return None
 
 
-def get_all_elements_with_param(param_name, is_type_param=False):
-    # finds all elements that have this parameter
-    all_elements = []
-
+def get_all_elements(is_type_param=False):
+    # collects the elements that can hold the parameter
     if is_type_param:
-        collector = DB.FilteredElementCollector(doc).WhereElementIsElementType()
-    else:
-        collector = DB.FilteredElementCollector(doc).WhereElementIsNotElementType()
-
-    for elem in collector:
-        param = elem.LookupParameter(param_name)
-        if param and not param.IsReadOnly:
-            all_elements.append(elem)
+        return DB.FilteredElementCollector(doc).WhereElementIsElementType()
+    return DB.FilteredElementCollector(doc).WhereElementIsNotElementType()
 
-    return all_elements
 
-
-def copy_parameter_value(elem, old_param_name, new_param_name):
+def copy_parameter_value(old_param, new_param, old_column):
     # copies value from old param to new param
-    old_param = elem.LookupParameter(old_param_name)
-    new_param = elem.LookupParameter(new_param_name)
-
+    # the column has picked the storage type reader once, for all elements
     if not old_param or not new_param:
         return False
 
@@ -113,17 +105,12 @@ def copy_parameter_value(elem, old_param_name, new_param_name):
         if not old_param.HasValue:
             return False
 
-        storage_type = old_param.StorageType
-
-        # different types need different methods
-        if storage_type == DB.StorageType.String:
-            new_param.Set(old_param.AsString() or "")
-        elif storage_type == DB.StorageType.Integer:
-            new_param.Set(old_param.AsInteger())
-        elif storage_type == DB.StorageType.Double:
-            new_param.Set(old_param.AsDouble())
-        elif storage_type == DB.StorageType.ElementId:
-            new_param.Set(old_param.AsElementId())
+        value = old_column.read_parameter(old_param)[0]
+        if value is None and old_column.storage_type == DB.StorageType.String:
+            value = ""
+        if value is None:
+            return False
+        new_param.Set(value)
 
         return True
     except:
@@ -288,34 +275,35 @@ created_defs = {}
 
 
 # create new definitions in shared params file
-for c in candidates:
-    new_name = c["new_name"]
+with prof.phase("Create definitions"):
+    for c in candidates:
+        new_name = c["new_name"]
 
-    # check if it already exists
-    try:
-        existing = grp.Definitions.get_Item(new_name)
-        if existing:
-            created_defs[new_name] = existing
-            stats["existed_defs"] += 1
-            continue
-    except:
-        pass
+        # check if it already exists
+        try:
+            existing = grp.Definitions.get_Item(new_name)
+            if existing:
+                created_defs[new_name] = existing
+                stats["existed_defs"] += 1
+                continue
+        except:
+            pass
 
-    # create the new definition
-    try:
-        opts = DB.ExternalDefinitionCreationOptions(new_name, c["dtype"])
-        opts.Visible = True
-        new_def = grp.Definitions.Create(opts)
-        created_defs[new_name] = new_def
-        stats["created_defs"] += 1
-    except:
-        created_defs[new_name] = None
-        stats["failed_create_defs"] += 1
-        print("Failed to create: {}".format(new_name))
+        # create the new definition
+        try:
+            opts = DB.ExternalDefinitionCreationOptions(new_name, c["dtype"])
+            opts.Visible = True
+            new_def = grp.Definitions.Create(opts)
+            created_defs[new_name] = new_def
+            stats["created_defs"] += 1
+        except:
+            created_defs[new_name] = None
+            stats["failed_create_defs"] += 1
+            print("Failed to create: {}".format(new_name))
 
 
 # bind new parameters to project
-with revit.Transaction("Bind new parameters"):
+with prof.phase("Bind parameters"), revit.Transaction("Bind new parameters"):
     for c in candidates:
         new_name = c["new_name"]
         new_def = created_defs.get(new_name)
@@ -356,31 +344,31 @@ with revit.Transaction("Bind new parameters"):
 
 
 # copy values from old params to new params
-with revit.Transaction("Copy values to new parameter"):
+with prof.phase("Copy values"), revit.Transaction("Copy values to new parameter"):
     for c in candidates:
         old_name = c["old_name"]
         new_name = c["new_name"]
         is_type_param = c["is_type_param"]
 
-        elements = get_all_elements_with_param(old_name, is_type_param)
+        # read both parameters through their definitions, not by name
+        old_column = parameters.ParameterColumn(c["old_def"], doc)
+        new_def = find_definition_by_name(doc, new_name)
+        new_column = parameters.ParameterColumn(new_def if new_def else new_name, doc)
 
         # copy for each element
-        for elem in elements:
-            old_p = elem.LookupParameter(old_name)
-            new_p = elem.LookupParameter(new_name)
-
-            if not old_p or not new_p:
-                continue
-            if old_p.IsReadOnly or new_p.IsReadOnly:
+        for elem in prof.elements(get_all_elements(is_type_param)):
+            old_p = old_column.parameter(elem)
+            if not old_p or old_p.IsReadOnly or not old_p.HasValue:
                 continue
-            if not old_p.HasValue:
+            new_p = new_column.parameter(elem)
+            if not new_p or new_p.IsReadOnly:
                 continue
 
-            copy_parameter_value(elem, old_name, new_name)
+            copy_parameter_value(old_p, new_p, old_column)
 
 
 # delete old parameters
-with revit.Transaction("Delete old parameters"):
+with prof.phase("Delete old parameters"), revit.Transaction("Delete old parameters"):
     for c in candidates:
         try:
             bindings_map.Remove(c["old_def"])
@@ -430,4 +418,5 @@ if (
     final_report.append("")
     final_report.append("Some operations failed. Check printed output and verify project parameters.")
 
+prof.report()
 forms.alert("\n".join(final_report), title="AUTO_RENAME - Complete")
\ No newline at end of file
@@ -1,5 +1,22 @@
 from pyrevit import DB
 from itertools import izip
+from pychilizer import sheetlayout
+
+
+def view_sheet_size(view):
+    # (width, height) of the view's crop on the sheet
+    crop = view.CropBox
+    return (crop.Max.X - crop.Min.X) / view.Scale, (crop.Max.Y - crop.Min.Y) / view.Scale
+
+
+def viewport_box(viewport):
+    outline = viewport.GetBoxOutline()
+    return sheetlayout.Box(outline.MinimumPoint.X, outline.MinimumPoint.Y,
+                           outline.MaximumPoint.X, outline.MaximumPoint.Y)
+
+
+def viewport_key(view, viewport_type):
+    return viewport_type.Id.IntegerValue if viewport_type else None, str(view.ViewType), False
 
 
 class Locator:
@@ -9,12 +26,16 @@ class Locator:
 
     '''Constructor'''
 
-    def __init__(self, sheet, offset, tb_orientation, elevation_widths):
+    def __init__(self, sheet, offset, tb_orientation, titleblock_key=None):
         col = 4
         row = 2
-        self.pos = self.get_sheet_pos(sheet, offset, col, row, tb_orientation)
+        self.pos = self.get_sheet_pos(sheet, offset, col, row, tb_orientation, titleblock_key)
         self.set_pos_plans(self.pos)
-        self.set_pos_elevs(self.pos, elevation_widths)
+        # the top row holds the elevations
+        col_width = self.pos[row].X - self.pos[0].X
+        row_height = self.pos[1].Y - self.pos[0].Y
+        self.elevation_region = sheetlayout.Box(self.pos[1].X - col_width / 2, self.pos[1].Y - row_height / 2,
+                                                self.pos[-1].X + col_width / 2, self.pos[-1].Y + row_height / 2)
 
     '''Set positions based on the type of layout
     Allows us to introduce future layouts or layout management ui'''
@@ -24,45 +45,66 @@ class Locator:
         self.plan = (pos[0] + pos[2]) / 2
         self.rcp = (pos[4] + pos[6]) / 2
 
-    def set_pos_elevs(self, pos, elevation_widths):
-        previous_elevation = (pos[1]+pos[3])/2
-        # print ("First {}".format(previous_elevation))
-        offset_positions = [previous_elevation]
-        # iterate in widths except last
-        for width in elevation_widths[:-1]:
-            previous_elevation = previous_elevation.Add(DB.XYZ(width, 0,0))
-            offset_positions.append(previous_elevation)
-        self.elevations = offset_positions
+    '''Pack the elevations, of any number and width, in rows across the top of the sheet'''
+
+    def set_pos_elevs(self, elevation_sizes, spacing):
+        centres = sheetlayout.centred_row(elevation_sizes, self.elevation_region, spacing)
+        self.elevations = [DB.XYZ(u, v, 0) for u, v in centres]
+        return self.elevations
 
     '''get positions based on the layout
-    pass num columns and rows'''
-
-    def get_sheet_pos(self, sheet, offset, col, row, tb_orientation):
-        x_min = sheet.Outline.Min.U
-        y_min = sheet.Outline.Min.V
-        x_max = sheet.Outline.Max.U
-        y_max = sheet.Outline.Max.V
-        width = x_max - x_min
-        height = y_max - y_min
-        if str(tb_orientation) == 'Vertical':
-            width -= offset
-        else:
-            height += offset
-        col_width = width / float(col)
-        row_height = height / float(row)
-
-        # adjust for the relative 0,0,0 of the sheet (for some weird reason the sheet is not placed in the 0,0,0)
-        delta = DB.XYZ(x_min, y_min, 0)
-
-        # all points on screen. the middle of column x row
-        positions = []
-
-        for i in range(int(col)):
-            for j in range(int(row)):
-                positions.append(
-                    DB.XYZ((col_width * 0.5) + i * col_width, (row_height * 0.5) + j * row_height, 0) + delta)
-
-        return positions
+    pass num columns and rows
+    the grid is worked out once per titleblock type (titleblock_key)'''
+
+    def get_sheet_pos(self, sheet, offset, col, row, tb_orientation, titleblock_key=None):
+        outline = sheetlayout.Box(sheet.Outline.Min.U, sheet.Outline.Min.V, sheet.Outline.Max.U, sheet.Outline.Max.V)
+        grid = sheetlayout.GRIDS.grid(titleblock_key, outline, offset, tb_orientation, col, row)
+        return [DB.XYZ(u, v, 0) for u, v in grid]
+
+    '''create a viewport whose box is centred on the position, so it needs no realign
+    the first viewport of each viewport type and kind of view is measured and moved,
+    the ones after it are placed from its margins'''
+
+    def place(self, doc, sheet, view, position, viewport_type=None):
+        view_size = view_sheet_size(view)
+        key = viewport_key(view, viewport_type)
+        u, v = sheetlayout.MARGINS.placement_point(key, (position.X, position.Y), view_size)
+        viewport = DB.Viewport.Create(doc, sheet.Id, view.Id, DB.XYZ(u, v, 0))
+        if viewport_type:
+            viewport.ChangeTypeId(viewport_type.Id)
+        if key not in sheetlayout.MARGINS:
+            doc.Regenerate()
+            sheetlayout.MARGINS.learn(key, (u, v), view_size, viewport_box(viewport))
+            self.realign_pos(doc, [viewport], [position])
+        return viewport
+
+    '''place the elevations packed across the top of the sheet, sized with their viewport margins'''
+
+    def place_elevations(self, doc, sheet, views, viewport_type=None, spacing=0.0):
+        if not views:
+            return []
+        first = None
+        key = viewport_key(views[0], viewport_type)
+        centre = self.elevation_region_center()
+        if key not in sheetlayout.MARGINS:
+            # measure the first elevation, so all of them can be packed with their real size
+            first = self.place(doc, sheet, views[0], centre, viewport_type)
+        sizes = [sheetlayout.MARGINS.box_size(viewport_key(view, viewport_type), view_sheet_size(view))
+                 for view in views]
+        positions = self.set_pos_elevs(sizes, spacing)
+        viewports = []
+        for view, pos in izip(views, positions):
+            if first is not None and view.Id == views[0].Id:
+                # its box is centred on the region centre already
+                DB.ElementTransformUtils.MoveElement(doc, first.Id, pos - centre)
+                viewports.append(first)
+            else:
+                viewports.append(self.place(doc, sheet, view, pos, viewport_type))
+        return viewports
+
+    def elevation_region_center(self):
+        u, v = self.elevation_region.center
+        return DB.XYZ(u, v, 0)
 
     '''due to some unknown mystic forces, 
     the location of the view creation is not correct
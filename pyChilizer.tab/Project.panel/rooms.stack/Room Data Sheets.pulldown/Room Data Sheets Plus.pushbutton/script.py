@@ -3,13 +3,15 @@ from rpw.ui.forms import FlexForm, Label, TextBox, Button, ComboBox, CheckBox, S
 import rdspluslocator, rdsplusui
 from itertools import izip
 import sys
-from pychilizer import units, select, geo, database
+from pychilizer import units, select, geo, database, batchjournal
 from Autodesk.Revit import Exceptions
 import math
 
 ui = rdsplusui.UI(script)
 ui.is_metric = units.is_metric
 doc = __revit__.ActiveUIDocument.Document
+# room geometry is read once per run, not kept from an earlier run of the engine
+geo.drop_room_snapshots()
 
 MINIMAL_LENGTH = 1.5
 UNIQUE_BORDERS_TOLERANCE = 10 / 304.8
@@ -18,21 +20,6 @@ ELEVATION_ID = 0  # elevation on the marker placed facing left
 VIEW_SCALE = 50
 RDS_FLOOR_PLAN_TYPE_NAME = "RDS Floor Plan Type"
 
-def elevation_offsets(el_widths, spacing):
-    el_offsets = [el_widths[0] + spacing]
-    for i in range(len(el_widths) - 1):
-        offset = (el_widths[i] + el_widths[i + 1]) / 2 + spacing
-        el_offsets.append(offset)
-    return el_offsets
-
-
-def get_view_width_scaled(view):
-    crop_bbox = view.CropBox
-    real_width = crop_bbox.Max.X - crop_bbox.Min.X
-    scaled_width = real_width / view.Scale
-    return scaled_width
-
-
 def get_view_family_type_by_name(view_family_category, name, doc=revit.doc):
     # get ViewFamilyType by type and name
     all_view_family_types = database.get_view_family_types(view_family_category, doc)
@@ -156,11 +143,25 @@ ui.set_config("viewplan", form.values["vt_plans"])
 ui.set_config("viewceiling", form.values["vt_rcp_plans"])
 ui.set_config("viewsection", form.values["vt_elevs"])
 
-for room in selection:
+# snapshot view names and sheet numbers once, so naming never queries the document
+name_allocator = database.NameAllocator.from_document(doc)
+# crop loops worked out once per room shape
+repeated_rooms = geo.RepeatedRooms()
+
+
+def room_sheet_name(room):
+    return room.Number + " - " + room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString()
+
+
+def create_room_sheet(room):
+    # the views, markers and sheet of one room, returns their ids
+    # the room's level and location, read with its boundaries and shell once per run
+    room_geometry = geo.get_room_snapshot(room)
     with revit.Transaction("Create Plan", doc):
-        level = room.Level
-        rm_loc = room.Location.Point
-        room_angle = geo.room_rotation_angle(room)  # helper method get room rotation by longest boundary
+        level = room_geometry.level
+        rm_loc = room_geometry.location
+        # rotation by the longest boundary, the same for all rooms of one shape as their crop loops
+        room_angle = repeated_rooms.rotation_angle(room)
 
         # Create Floor Plan
         viewplan = DB.ViewPlan.Create(doc, rds_floor_plan_type.Id, level.Id)
@@ -170,20 +171,14 @@ for room in selection:
         viewRCP = DB.ViewPlan.Create(doc, ceiling_plan_type.Id, level.Id)
         viewRCP.Scale = VIEW_SCALE
 
-    # find crop box element (method with transactions, must be outside transaction)
-    crop_box_plan = geo.find_crop_box(viewplan)
-    crop_box_rcp = geo.find_crop_box(viewRCP)
+    # find crop box elements of both plans (method with transactions, must be outside transaction)
+    crop_boxes = geo.find_crop_boxes([viewplan, viewRCP], doc)
 
     with revit.Transaction("Crop and Create Elevations", doc):
-        # rotate the view plan
+        # rotate the view plan and RCP, views without a crop box found keep theirs unrotated
         axis = geo.get_bb_axis_in_view(room, viewplan)  # get the axis for rotation
-        rotated_plan = DB.ElementTransformUtils.RotateElement(
-            doc, crop_box_plan.Id, axis, room_angle
-        )
-        # rotate RCP
-        rotated_rcp = DB.ElementTransformUtils.RotateElement(
-            doc, crop_box_rcp.Id, axis, room_angle
-        )
+        geo.rotate_crop_box(viewplan, crop_boxes, axis, room_angle, doc)
+        geo.rotate_crop_box(viewRCP, crop_boxes, axis, room_angle, doc)
 
         viewplan.CropBoxActive = True
         viewRCP.CropBoxActive = True
@@ -194,31 +189,17 @@ for room in selection:
         if room_boundaries:
             crsm_plan = viewplan.GetCropRegionShapeManager()
             crsm_rcp = viewRCP.GetCropRegionShapeManager()
-            # try offsetting boundaries (to include walls in plan view)
-            try:
-                offset_loop = room_boundaries.CreateViaOffset(
-                    room_boundaries, chosen_crop_offset, DB.XYZ(0, 0, 1))
-                crsm_plan.SetCropShape(offset_loop)
-                crsm_rcp.SetCropShape(offset_loop)
-            # for some shapes the offset is not obvious and will fail, then use BBox method:
-            except:
-                # using a helper method, get the outlines of the room's bounding box,
-                rotated_crop_loop = geo.room_bb_outlines(room, room_angle)
-                # offset the curve loop with given offset
-                offset_loop = DB.CurveLoop.CreateViaOffset(rotated_crop_loop, chosen_crop_offset, DB.XYZ.BasisZ)
-                # set the loop as Crop Shape of the view using CropRegionShapeManager
-                crsm_plan.SetCropShape(offset_loop)
-                crsm_rcp.SetCropShape(offset_loop)
+            # the boundary offset to include walls in plan view, or the bounding box for shapes it would fail on
+            offset_loop = repeated_rooms.crop_loop(room, chosen_crop_offset, room_angle)
+            crsm_plan.SetCropShape(offset_loop)
+            crsm_rcp.SetCropShape(offset_loop)
 
         # Construct View Names
-        room_name_nr = (
-                room.Number
-                + " - "
-                + room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString())
+        room_name_nr = room_sheet_name(room)
 
         # rename views
-        viewplan.Name = database.unique_view_name(room_name_nr, suffix=" Plan")
-        viewRCP.Name = database.unique_view_name(room_name_nr, suffix=" Reflected Ceiling Plan")
+        database.rename_view(viewplan, name_allocator.view_name(room_name_nr, " Plan"), doc)
+        database.rename_view(viewRCP, name_allocator.view_name(room_name_nr, " Reflected Ceiling Plan"), doc)
 
         # activate annotation crop
         database.set_anno_crop(viewplan)
@@ -226,92 +207,110 @@ for room in selection:
 
         # Create Elevations
         elevations_col = []
+        markers = []
+        marker_borders = []  # [(marker, marker point, border)]
 
-        # discard segments lying on the same axis of the room - not in scope anymore
-        # unique_borders = geo.get_unique_borders(room_boundaries, UNIQUE_BORDERS_TOLERANCE)
-
-        border_widths = []
-        for border in room_boundaries:
-
-            if isinstance(border, DB.Line) and border.Length >= MINIMAL_LENGTH:
-                viewplan.Scale = VIEW_SCALE
+        # one elevation per axis of the room: cropped to the span of the borders on the axis, the marker in front of
+        # the first of them
+        long_borders = [border for border in room_boundaries
+                        if isinstance(border, DB.Line) and border.Length >= MINIMAL_LENGTH]
 
-                # elevation marker position - middle of the boundary
-                border_center = border.Evaluate(0.5, True)
+        for border, first_border in geo.unique_border_spans(long_borders, UNIQUE_BORDERS_TOLERANCE):
+            viewplan.Scale = VIEW_SCALE
 
-                # offset inwards and check if it's the right side (check if inside room)
-                marker_position = geo.offset_curve_inwards_into_room(border, room, chosen_marker_offset).Evaluate(0.5, True)
+            # elevation marker position - middle of the first border, offset inwards
+            # check if it's the right side (check if inside room)
+            marker_position = geo.offset_curve_inwards_into_room(first_border, room, chosen_marker_offset).Evaluate(
+                0.5, True)
 
-                # create marker
-                new_marker = DB.ElevationMarker.CreateElevationMarker(doc, elev_type.Id, marker_position, VIEW_SCALE)
+            # create marker
+            new_marker = DB.ElevationMarker.CreateElevationMarker(doc, elev_type.Id, marker_position, VIEW_SCALE)
+            markers.append(new_marker)
 
-                # create 1 elevation
-                try:
-                    elevation = new_marker.CreateElevation(doc, viewplan.Id, ELEVATION_ID)
-                    elevations_col.append(elevation)
-                except Exceptions.ArgumentException:
-                    forms.alert("Elevation Marker is invalid. Please review the Elevation Marker and retry",
-                                exitscript=True)
-
-                # rotate the marker to face the boundary
-                geo.orient_elevation_to_line(doc, new_marker, marker_position, border, ELEVATION_ID, viewplan)
-
-
-                doc.Regenerate()
-                # create a bbox parallel to the border
-                geo.set_crop_to_boundary(room, border, elevation, chosen_crop_offset, doc)
-                database.apply_vt(elevation, chosen_vt_elevation)
-                # record the boundary lengths (also elevation widths) for later
-                border_widths.append(get_view_width_scaled(elevation))
+            # create 1 elevation
+            try:
+                elevation = new_marker.CreateElevation(doc, viewplan.Id, ELEVATION_ID)
+                elevations_col.append(elevation)
+            except Exceptions.ArgumentException:
+                forms.alert("Elevation Marker is invalid. Please review the Elevation Marker and retry",
+                            exitscript=True)
+
+            marker_borders.append((new_marker, marker_position, border))
+
+        # rotate the markers to face their boundaries
+        geo.orient_elevation_markers(doc, marker_borders, ELEVATION_ID)
+        for el in elevations_col:
+            el.CropBoxActive = False
+        # one regeneration for the crops of all elevations of the room
+        doc.Regenerate()
+        for (new_marker, marker_position, border), elevation in izip(marker_borders, elevations_col):
+            # crop to the border in width, the room in height
+            geo.set_crop_to_boundary(room, border, elevation, chosen_crop_offset, doc, regenerate=False)
+            database.apply_vt(elevation, chosen_vt_elevation)
 
         # Rename elevations - Room name Elevation N
         elevation_count = database.get_alphabetic_labels(len(elevations_col))
-        for el, i in izip(elevations_col, elevation_count):
+        elevation_names = name_allocator.view_names([room_name_nr + " Elevation " + i for i in elevation_count])
+        for el, el_name in izip(elevations_col, elevation_names):
             el.Scale = VIEW_SCALE
-            el_suffix = " Elevation " + i
-            el.Name = database.unique_view_name(room_name_nr, el_suffix)
+            database.rename_view(el, el_name, doc)
             database.set_anno_crop(el)
 
-        sheet = database.create_sheet(chosen_sheet_nr, room_name_nr, chosen_tb.Id, doc)
-
-    elevation_widths = elevation_offsets(border_widths, ELEVATION_SPACING)
+        sheet = database.create_sheet(chosen_sheet_nr, room_name_nr, chosen_tb.Id, doc, name_allocator)
 
-    # get positions on sheet
-    loc = rdspluslocator.Locator(sheet, titleblock_offset, tb_orientation, elevation_widths)
+    # get positions on sheet, the grid is shared by all sheets with the same titleblock
+    loc = rdspluslocator.Locator(sheet, titleblock_offset, tb_orientation, chosen_tb.Id.IntegerValue)
     plan_position = loc.plan
     RCP_position = loc.rcp
-    elev_positions = loc.elevations
-    elevations = []  # collect all elevations we create
 
     with revit.Transaction("Add Views to Sheet", doc):
         # apply view template
         database.apply_vt(viewplan, chosen_vt_plan)
         database.apply_vt(viewRCP, chosen_vt_rcp_plan)
 
-        # place view on sheet
-        place_plan = DB.Viewport.Create(doc, sheet.Id, viewplan.Id, plan_position)
-        place_RCP = DB.Viewport.Create(doc, sheet.Id, viewRCP.Id, RCP_position)
-
-        for el, pos, i in izip(elevations_col, elev_positions, elevation_count):
-            # place elevations
-            place_elevation = DB.Viewport.Create(doc, sheet.Id, el.Id, pos)
+        # place view on sheet, each viewport is created centred on its position
+        place_plan = loc.place(doc, sheet, viewplan, plan_position, chosen_vp_type)
+        place_RCP = loc.place(doc, sheet, viewRCP, RCP_position, chosen_vp_type)
 
+        # place elevations, packed in rows across the top of the sheet
+        elevations = loc.place_elevations(doc, sheet, elevations_col, chosen_vp_type, ELEVATION_SPACING)
+        for place_elevation, i in izip(elevations, elevation_count):
             # set viewport detail number
             place_elevation.get_Parameter(
                 DB.BuiltInParameter.VIEWPORT_DETAIL_NUMBER
             ).Set(i)
-            elevations.append(place_elevation)
-            doc.Regenerate()
 
-        # new: change viewport types
-        for vp in elevations + [place_plan] + [place_RCP]:
-            vp.ChangeTypeId(chosen_vp_type.Id)
+        print("Sheet : {0} \t Room {1} ".format(output.linkify(sheet.Id), room_name_nr))
+    # the sheet first: deleting it deletes the viewports
+    return [element.Id for element in [sheet, viewplan, viewRCP] + markers + elevations_col]
 
-        doc.Regenerate()
 
-        # realign the viewports to their desired positions
-        loc.realign_pos(doc, [place_plan], [plan_position])
-        loc.realign_pos(doc, [place_RCP], [RCP_position])
-        # loc.realign_pos(doc, elevations, elev_positions)
+# rooms done by an interrupted run are skipped, what it left half made is deleted
+journal = batchjournal.BatchJournal(doc, "Room Data Sheets Plus")
+rooms = journal.resume(selection)
 
-        print("Sheet : {0} \t Room {1} ".format(output.linkify(sheet.Id), room_name_nr))
+# each chunk of rooms is committed as its own group, each room in a group of its own within it
+# a room that fails rolls back only itself, it is recorded in the journal and reported
+for chunk in batchjournal.chunks(rooms):
+    journal.start(chunk)
+    with revit.TransactionGroup("Room Data Sheets Plus", doc):
+        for room in chunk:
+            checkpoint = name_allocator.checkpoint()
+            try:
+                with revit.TransactionGroup("Room Data Sheet", doc):
+                    element_ids = create_room_sheet(room)
+            except Exception as error:
+                name_allocator.restore(checkpoint)
+                database.invalidate_document_index()
+                journal.fail(room, room_sheet_name(room), error)
+                continue
+            # recorded before the group is committed, so a rerun can clean up if the commit is interrupted
+            journal.record(room, element_ids)
+        journal.save()
+    journal.finish(chunk)
+
+journal.close()
+for name, error in journal.failed():
+    print("FAILED : Room {} \t {}".format(name, error))
+print(repeated_rooms.crop_report())
+geo.drop_room_snapshots()
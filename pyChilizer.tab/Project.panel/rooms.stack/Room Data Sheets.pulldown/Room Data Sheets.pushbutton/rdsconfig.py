@@ -0,0 +1,5 @@
+from pychilizer import profiler
+
+
+if __name__ == "__main__":
+    profiler.config_profile()
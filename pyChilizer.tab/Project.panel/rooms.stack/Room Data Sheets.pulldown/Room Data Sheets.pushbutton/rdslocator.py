@@ -1,5 +1,23 @@
 from pyrevit import DB
 from itertools import izip
+from pychilizer import sheetlayout
+
+
+def view_sheet_size(view, rotated=False):
+    # (width, height) of the view's crop on the sheet
+    crop = view.CropBox
+    width = (crop.Max.X - crop.Min.X) / view.Scale
+    height = (crop.Max.Y - crop.Min.Y) / view.Scale
+    if rotated:
+        return height, width
+    return width, height
+
+
+def viewport_box(viewport):
+    outline = viewport.GetBoxOutline()
+    return sheetlayout.Box(outline.MinimumPoint.X, outline.MinimumPoint.Y,
+                           outline.MaximumPoint.X, outline.MaximumPoint.Y)
+
 
 class Locator:    
     plan = DB.XYZ() # class variable - plan location
@@ -8,14 +26,14 @@ class Locator:
     elevations = [] # class variable - elevation location
 
     '''Constructor'''
-    def __init__(self, sheet, offset, titleblock, layout):
+    def __init__(self, sheet, offset, titleblock, layout, titleblock_key=None):
         if layout == 'Tiles':
             col = 4
             row = 2
         elif layout == 'Cross':
             col = 4
             row = 3
-        self.pos = self.get_sheet_pos(sheet, offset, col, row, titleblock)        
+        self.pos = self.get_sheet_pos(sheet, offset, col, row, titleblock, titleblock_key)
         self.set_pos(self.pos, layout)
 
     '''Set positions based on the type of layout
@@ -33,32 +51,31 @@ class Locator:
             self.threeD = pos[11]
 
     '''get positions based on the layout
-    pass num columns and rows'''
-    def get_sheet_pos(self, sheet, offset, col, row, titleblock):
-        x_min = sheet.Outline.Min.U
-        y_min = sheet.Outline.Min.V
-        x_max = sheet.Outline.Max.U
-        y_max = sheet.Outline.Max.V
-        width = x_max - x_min 
-        height = y_max - y_min
-        if str(titleblock) == 'Vertical':
-            width -= offset
-        else:
-            height += offset
-        col_width = width / float(col)
-        row_height = height / float(row)
-
-        # adjust for the relative 0,0,0 of the sheet (for some weird reason the sheet is not placed in the 0,0,0)
-        delta = DB.XYZ(x_min, y_min, 0) 
-
-        # all points on screen. the middle of column x row
-        positions = []  
-
-        for i in range(int(col)):
-            for j in range(int(row)):
-                positions.append(DB.XYZ((col_width * 0.5) + i * col_width, (row_height * 0.5) + j * row_height, 0) + delta)
+    pass num columns and rows
+    the grid is worked out once per titleblock type (titleblock_key)'''
+    def get_sheet_pos(self, sheet, offset, col, row, titleblock, titleblock_key=None):
+        outline = sheetlayout.Box(sheet.Outline.Min.U, sheet.Outline.Min.V, sheet.Outline.Max.U, sheet.Outline.Max.V)
+        grid = sheetlayout.GRIDS.grid(titleblock_key, outline, offset, titleblock, col, row)
+        return [DB.XYZ(u, v, 0) for u, v in grid]
 
-        return positions
+    '''create a viewport whose box is centred on the position, so it needs no realign
+    the first viewport of each viewport type and kind of view is measured and moved,
+    the ones after it are placed from its margins'''
+    def place(self, doc, sheet, view, position, viewport_type=None, rotation=None):
+        rotated = rotation in (DB.ViewportRotation.Clockwise, DB.ViewportRotation.Counterclockwise)
+        view_size = view_sheet_size(view, rotated)
+        key = (viewport_type.Id.IntegerValue if viewport_type else None, str(view.ViewType), rotated)
+        u, v = sheetlayout.MARGINS.placement_point(key, (position.X, position.Y), view_size)
+        viewport = DB.Viewport.Create(doc, sheet.Id, view.Id, DB.XYZ(u, v, 0))
+        if rotation:
+            viewport.Rotation = rotation
+        if viewport_type:
+            viewport.ChangeTypeId(viewport_type.Id)
+        if key not in sheetlayout.MARGINS:
+            doc.Regenerate()
+            sheetlayout.MARGINS.learn(key, (u, v), view_size, viewport_box(viewport))
+            self.realign_pos(doc, [viewport], [position])
+        return viewport
 
     '''due to some unknown mystic forces, 
     the location of the view creation is not correct
@@ -3,7 +3,7 @@ from rpw.ui.forms import FlexForm, Label, TextBox, Button, ComboBox, CheckBox, S
 import rdslocator, rdsui
 from itertools import izip
 import sys
-from pychilizer import units, select, geo, database
+from pychilizer import units, select, geo, database, profiler, batchjournal
 from Autodesk.Revit import Exceptions
 
 
@@ -13,6 +13,8 @@ from Autodesk.Revit import Exceptions
 ui = rdsui.UI(script)
 ui.is_metric = units.is_metric
 doc = __revit__.ActiveUIDocument.Document
+# room geometry is read once per run, not kept from an earlier run of the engine
+geo.drop_room_snapshots()
 
 output = script.get_output()
 logger = script.get_logger()  # helps to debug script, not used
@@ -133,178 +135,393 @@ ui.set_config("viewplan", form.values["vt_plans"])
 ui.set_config("viewceiling", form.values["vt_rcp_plans"])
 ui.set_config("viewsection", form.values["vt_elevs"])
 
-for room in selection:
-    if room.Area > 0:
-        with revit.Transaction("Create Plan", doc):
-            level = room.Level
-            rm_loc = room.Location.Point
-            angle = geo.room_rotation_angle(room)  # helper method get room rotation by longest boundary
-
-            # Create Floor Plan
-            viewplan = DB.ViewPlan.Create(doc, fl_plan_type.Id, level.Id)
-            viewplan.Scale = view_scale
-
-            # Create Reflected Ceiling Plan
-            viewRCP = DB.ViewPlan.Create(doc, ceiling_plan_type.Id, level.Id)
-            viewRCP.Scale = view_scale
-
-            if layout_ori == "Cross":  # for cross layout, add the 3D axo
-                threeD = geo.create_room_axo_rotate(room, angle, view_scale, doc)
-
-        # find crop box element (method with transactions, must be outside transaction)
-        crop_box_plan = geo.find_crop_box(viewplan)
-        crop_box_rcp = geo.find_crop_box(viewRCP)
-
-        with revit.Transaction("Crop and Create Elevations", doc):
-            # rotate the view plan
-            axis = geo.get_bb_axis_in_view(room, viewplan)  # get the axis for rotation
-            rotated_plan = DB.ElementTransformUtils.RotateElement(
-                doc, crop_box_plan.Id, axis, angle
-            )
-            # rotate RCP
-            rotated_rcp = DB.ElementTransformUtils.RotateElement(
-                doc, crop_box_rcp.Id, axis, angle
-            )
-
-            viewplan.CropBoxActive = True
-            viewRCP.CropBoxActive = True
-            doc.Regenerate()
-
-            room_boundaries = geo.get_room_bound(room)
-
-            if room_boundaries:
-                crsm_plan = viewplan.GetCropRegionShapeManager()
-                crsm_rcp = viewRCP.GetCropRegionShapeManager()
-                # try offsetting boundaries (to include walls in plan view)
-                try:
-                    offset_loop = room_boundaries.CreateViaOffset(
-                        room_boundaries, chosen_crop_offset, DB.XYZ(0, 0, 1)
-                    )
-
-                    crsm_plan.SetCropShape(offset_loop)
-                    crsm_rcp.SetCropShape(offset_loop)
-                # for some shapes the offset is not obvious and will fail, then use BBox method:
-                except:
-                    # using a helper method, get the outlines of the room's bounding box,
-                    rotated_crop_loop = geo.room_bb_outlines(room, angle)
-                    # offset the curve loop with given offset
-                    offset_loop = DB.CurveLoop.CreateViaOffset(rotated_crop_loop, chosen_crop_offset, DB.XYZ.BasisZ)
-                    # set the loop as Crop Shape of the view using CropRegionShapeManager
-
-                    crsm_plan.SetCropShape(offset_loop)
-                    crsm_rcp.SetCropShape(offset_loop)
-
-            # Construct View Names
-            room_name_nr = (
-                    room.Number
-                    + " - "
-                    + room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString()
-            )
-
-            # rename views
-            viewplan.Name = database.unique_view_name(room_name_nr, suffix=" Plan")
-            viewRCP.Name = database.unique_view_name(room_name_nr, suffix=" Reflected Ceiling Plan")
-            # if created, rename the axo too
-            if layout_ori == "Cross":
-                threeD.Name = database.unique_view_name(room_name_nr, suffix=" Axo View")
-            # activate annotation crop
-            database.set_anno_crop(viewplan)
-            database.set_anno_crop(viewRCP)
-
-            # Create Elevations
-            elevations_col = []
-            elevation_count = ["A", "B", "C", "D"]
-            if elev_as_sections:
-                elevation_count = database.shift_list(elevation_count, 1)
-                room_bb_loop = geo.room_bb_outlines(room, angle)
-                offset_in = DB.CurveLoop.CreateViaOffset(room_bb_loop, -chosen_crop_offset, DB.XYZ.BasisZ)
-                for border in offset_in:
-                    # create a bbox parallel to the border
-                    sb = database.create_parallel_bbox(border, room)
-                    new_section = DB.ViewSection.CreateSection(doc, elev_type.Id, sb)
-                    elevations_col.append(new_section)
-            else:
-                # create marker
-                new_marker = DB.ElevationMarker.CreateElevationMarker(doc, elev_type.Id, rm_loc, view_scale)
-                # create 4 elevations
-                try:
-                    for i in range(4):
-                        elevation = new_marker.CreateElevation(doc, viewplan.Id, i)
-                        elevations_col.append(elevation)
-                except Exceptions.ArgumentException:
-                    forms.alert("Elevation Marker is invalid. Please review the Elevation Marker and retry",
-                                exitscript=True)
-                # rotate marker with room rotation angle
-                doc.Regenerate()
-                marker_axis = DB.Line.CreateBound(rm_loc, rm_loc + DB.XYZ.BasisZ)
-                new_marker.Location.Rotate(marker_axis, angle)
-                doc.Regenerate()
-            # Rename elevations
-
-            for el, i in izip(elevations_col, elevation_count):
-                el.Scale = view_scale
-                el_suffix = " Elevation " + i
-                el.Name = database.unique_view_name(room_name_nr, el_suffix)
-                database.set_anno_crop(el)
-
-            sheet = database.create_sheet(chosen_sheet_nr, room_name_nr, chosen_tb.Id, doc)
-
-        # get positions on sheet
-        loc = rdslocator.Locator(sheet, titleblock_offset, tb_ori, layout_ori)
-        plan_position = loc.plan
-        RCP_position = loc.rcp
-        elev_positions = loc.elevations
-        # if using sections, shift the positions with 1 index
-        if elev_as_sections:
-            elev_positions = database.shift_list(elev_positions, 1)
-        threeD_position = loc.threeD
-
-        elevations = []  # collect all elevations we create
-
-        with revit.Transaction("Add Views to Sheet", doc):
-            # apply view template
-            database.apply_vt(viewplan, chosen_vt_plan)
-            database.apply_vt(viewRCP, chosen_vt_rcp_plan)
-
-            # place view on sheet
-            place_plan = DB.Viewport.Create(doc, sheet.Id, viewplan.Id, plan_position)
-            place_RCP = DB.Viewport.Create(doc, sheet.Id, viewRCP.Id, RCP_position)
-
-            if layout_ori == "Cross":
-                place_threeD = DB.Viewport.Create(doc, sheet.Id, threeD.Id, threeD_position)
-
-            for el, pos, i in izip(elevations_col, elev_positions, elevation_count):
-                # place elevations
-                place_elevation = DB.Viewport.Create(doc, sheet.Id, el.Id, pos)
-
-                # if user selected, rotate elevations
-                if elev_rotate and i == "A" and layout_ori == "Cross":
-                    place_elevation.Rotation = DB.ViewportRotation.Counterclockwise
-                if elev_rotate and i == "C" and layout_ori == "Cross":
-                    place_elevation.Rotation = DB.ViewportRotation.Clockwise
-
-                # set viewport detail number
-                place_elevation.get_Parameter(
-                    DB.BuiltInParameter.VIEWPORT_DETAIL_NUMBER
-                ).Set(i)
-                elevations.append(place_elevation)
-                doc.Regenerate()
-                crop_views = geo.set_crop_to_bb(room, el, chosen_crop_offset, doc)
-                if not crop_views:
-                    pass
-                database.apply_vt(el, chosen_vt_elevation)
-
-            # new: change viewport types
-            for vp in elevations + [place_plan] + [place_RCP]:
-                vp.ChangeTypeId(chosen_vp_type.Id)
-
-            doc.Regenerate()
-
-            # realign the viewports to their desired positions
-            loc.realign_pos(doc, [place_plan], [plan_position])
-            loc.realign_pos(doc, [place_RCP], [RCP_position])
-            loc.realign_pos(doc, elevations, elev_positions)
-            if layout_ori == "Cross":
-                loc.realign_pos(doc, [place_threeD], [threeD_position])
-
-            print("Sheet : {0} \t Room {1} ".format(output.linkify(sheet.Id), room_name_nr))
+# snapshot view names and sheet numbers once, so naming never queries the document
+name_allocator = database.NameAllocator.from_document(doc)
+
+# phase timings, plus transaction, regenerate and API call timings when profiling is switched on from the
+# shift-click config
+prof = profiler.start("Room Data Sheets")
+prof.wrap(geo, "create_room_axo_rotate")
+prof.wrap(geo, "set_crop_to_bb")
+prof.wrap(database, "create_sheet")
+prof.wrap(rdslocator.Locator, "place", "Viewport placement")
+create_elevation_marker = prof.timed("ElevationMarker.CreateElevationMarker", DB.ElevationMarker.CreateElevationMarker)
+
+# crop loops and rotation angles of rooms that repeat (same shape, moved or turned) are worked out once
+repeated_rooms = geo.RepeatedRooms()
+
+
+def room_sheet_name(room):
+    return room.Number + " - " + room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString()
+
+
+class RoomSheet(object):
+    """The views, sheet and viewports made for one room, carried from phase to phase"""
+
+    def __init__(self, room, fingerprint):
+        self.room = room
+        self.fingerprint = fingerprint
+        # level and location, from the geometry the geo helpers read once per run
+        self.geometry = geo.get_room_snapshot(room)
+        # room rotation by longest boundary, worked out once per room shape
+        self.angle = repeated_rooms.rotation_angle(room)
+        self.name = room_sheet_name(room)
+        self.viewplan = None
+        self.viewRCP = None
+        self.threeD = None
+        self.marker = None
+        self.elevations = []
+        self.elevation_count = ["A", "B", "C", "D"]
+        self.sheet = None
+        self.locator = None
+        self.viewports = {}  # {role : viewport}
+        # how far the plan crops and the marker still have to turn, less for views kept from an earlier run
+        self.plan_turn = self.angle
+        self.marker_turn = self.angle
+        self.created = []  # elements made by this run
+        self.stale = []  # views of an earlier run to replace
+        self.updated = False
+
+    def load(self, register, entry):
+        # take over the output of an earlier run, to update it in place
+        self.updated = True
+        views = register.elements(entry, "views")
+        elevations = [views[i] for i in self.elevation_count if i in views]
+        if entry.get("settings") != settings:
+            # made with other settings, the sheet and all its views are made again
+            self.stale = [register.element(entry["sheet"]), register.element(entry["marker"])] + list(views.values())
+            return
+        self.sheet = register.element(entry["sheet"])
+        self.viewports = register.elements(entry, "viewports")
+        self.threeD = views.get("threeD")
+        if entry["level"] != self.geometry.level.Id.IntegerValue:
+            # plans and elevations cannot move to another level, they are made again
+            self.stale = [register.element(entry["marker"]), views["plan"], views["rcp"]] + elevations
+            return
+        self.viewplan = views["plan"]
+        self.viewRCP = views["rcp"]
+        self.plan_turn = self.angle - entry["angle"]
+        self.marker = register.element(entry["marker"])
+        if self.marker:
+            self.elevations = elevations
+            self.marker_turn = self.angle - entry["angle"]
+        else:
+            # sections are cut parallel to the room's borders, they are made again
+            self.stale = elevations
+
+    def views_by_role(self):
+        views = {"plan": self.viewplan, "rcp": self.viewRCP, "threeD": self.threeD}
+        views.update(izip(self.elevation_count, self.elevations))
+        return views
+
+    def element_ids(self):
+        # what this run made for the room, the sheet first: deleting it deletes the viewports
+        return [element.Id for element in self.created if element]
+
+
+def element_key(element):
+    return element.Id.IntegerValue if element else None
+
+
+def rename(view, name):
+    # a view kept from an earlier run gives up its name first, so it can keep it
+    name_allocator.release_view_name(view.Name)
+    database.rename_view(view, name_allocator.view_name(name), doc)
+
+
+def create_views(rs):
+    # creates the views the room does not have yet
+    level = rs.geometry.level
+    rm_loc = rs.geometry.location
+
+    if not rs.viewplan:
+        # Create Floor Plan
+        rs.viewplan = DB.ViewPlan.Create(doc, fl_plan_type.Id, level.Id)
+        rs.viewplan.Scale = view_scale
+
+        # Create Reflected Ceiling Plan
+        rs.viewRCP = DB.ViewPlan.Create(doc, ceiling_plan_type.Id, level.Id)
+        rs.viewRCP.Scale = view_scale
+
+        # rename views
+        database.rename_view(rs.viewplan, name_allocator.view_name(rs.name, " Plan"), doc)
+        database.rename_view(rs.viewRCP, name_allocator.view_name(rs.name, " Reflected Ceiling Plan"), doc)
+        # activate annotation crop
+        database.set_anno_crop(rs.viewplan)
+        database.set_anno_crop(rs.viewRCP)
+        rs.created.extend([rs.viewplan, rs.viewRCP])
+
+    if layout_ori == "Cross" and not rs.threeD:  # for cross layout, add the 3D axo
+        rs.threeD = geo.create_room_axo_rotate(rs.room, rs.angle, view_scale, doc)
+        database.rename_view(rs.threeD, name_allocator.view_name(rs.name, " Axo View"), doc)
+        rs.created.append(rs.threeD)
+
+    if rs.elevations:
+        return
+
+    # Create Elevations
+    if elev_as_sections:
+        rs.elevation_count = database.shift_list(rs.elevation_count, 1)
+        room_bb_loop = geo.room_bb_outlines(rs.room, rs.angle)
+        offset_in = DB.CurveLoop.CreateViaOffset(room_bb_loop, -chosen_crop_offset, DB.XYZ.BasisZ)
+        for border in offset_in:
+            # create a bbox parallel to the border
+            sb = database.create_parallel_bbox(border, rs.room)
+            new_section = DB.ViewSection.CreateSection(doc, elev_type.Id, sb)
+            rs.elevations.append(new_section)
+    else:
+        # create marker
+        rs.marker = create_elevation_marker(doc, elev_type.Id, rm_loc, view_scale)
+        rs.marker_turn = rs.angle
+        rs.created.append(rs.marker)
+        # create 4 elevations
+        try:
+            for i in range(4):
+                elevation = rs.marker.CreateElevation(doc, rs.viewplan.Id, i)
+                rs.elevations.append(elevation)
+        except Exceptions.ArgumentException:
+            forms.alert("Elevation Marker is invalid. Please review the Elevation Marker and retry",
+                        exitscript=True)
+    rs.created.extend(rs.elevations)
+
+    # Rename elevations
+    elevation_names = name_allocator.view_names(
+        [rs.name + " Elevation " + i for i in rs.elevation_count[:len(rs.elevations)]])
+    for el, el_name in izip(rs.elevations, elevation_names):
+        el.Scale = view_scale
+        database.rename_view(el, el_name, doc)
+        database.set_anno_crop(el)
+
+
+def update_views(rs, entry):
+    # bring the views of an earlier run in line with the room, then create the ones that were replaced
+    for element in rs.stale:
+        # a marker takes its elevations with it
+        if element and element.IsValidObject:
+            if isinstance(element, DB.ViewSheet):
+                name_allocator.release_sheet_number(element.SheetNumber)
+            elif isinstance(element, DB.View):
+                name_allocator.release_view_name(element.Name)
+            doc.Delete(element.Id)
+    # the viewports of deleted views went with them
+    rs.viewports = dict((role, vp) for role, vp in rs.viewports.items() if vp and vp.IsValidObject)
+
+    if rs.viewplan:
+        rename(rs.viewplan, rs.name + " Plan")
+        rename(rs.viewRCP, rs.name + " Reflected Ceiling Plan")
+        # back to the rectangular crop box, to turn it and crop it again
+        rs.viewplan.GetCropRegionShapeManager().RemoveCropRegionShape()
+        rs.viewRCP.GetCropRegionShapeManager().RemoveCropRegionShape()
+    if rs.threeD:
+        geo.fit_axo_to_room(rs.threeD, rs.room, rs.angle, doc)
+        rename(rs.threeD, rs.name + " Axo View")
+    if rs.marker:
+        # the marker turns with the room in rotate_views
+        old_location = DB.XYZ(*entry["location"])
+        rs.marker.Location.Move(rs.geometry.location - old_location)
+        for el, i in izip(rs.elevations, rs.elevation_count):
+            rename(el, rs.name + " Elevation " + i)
+
+    create_views(rs)
+
+
+def rotate_views(rs, crop_boxes):
+    # rotate the view plan and RCP
+    axis = geo.get_bb_axis_in_view(rs.room, rs.viewplan)  # get the axis for rotation
+    for view in (rs.viewplan, rs.viewRCP):
+        # views without a crop box found keep theirs unrotated
+        geo.rotate_crop_box(view, crop_boxes, axis, rs.plan_turn, doc)
+        view.CropBoxActive = True
+    # rotate marker with room rotation angle
+    if rs.marker:
+        rm_loc = rs.geometry.location
+        marker_axis = DB.Line.CreateBound(rm_loc, rm_loc + DB.XYZ.BasisZ)
+        rs.marker.Location.Rotate(marker_axis, rs.marker_turn)
+    # deactivate the elevation crops, so the room appears in them when they are cropped to it
+    for el in rs.elevations:
+        el.CropBoxActive = False
+
+
+def crop_views(rs):
+    # offset boundaries (to include walls in plan view), or the room's bounding box for shapes the offset fails on
+    # worked out once per room shape and moved onto the other rooms of that shape
+    offset_loop = repeated_rooms.crop_loop(rs.room, chosen_crop_offset, rs.angle)
+
+    if offset_loop:
+        rs.viewplan.GetCropRegionShapeManager().SetCropShape(offset_loop)
+        rs.viewRCP.GetCropRegionShapeManager().SetCropShape(offset_loop)
+
+    for el in rs.elevations:
+        geo.set_crop_to_bb(rs.room, el, chosen_crop_offset, doc, regenerate=False)
+
+
+def place_views(rs):
+    if rs.sheet:
+        rs.sheet.Name = rs.name
+    else:
+        rs.sheet = database.create_sheet(chosen_sheet_nr, rs.name, chosen_tb.Id, doc, name_allocator)
+        rs.created.insert(0, rs.sheet)
+
+    # get positions on sheet, the grid is shared by all sheets with the same titleblock
+    rs.locator = rdslocator.Locator(rs.sheet, titleblock_offset, tb_ori, layout_ori, chosen_tb.Id.IntegerValue)
+    elev_positions = rs.locator.elevations
+    # if using sections, shift the positions with 1 index
+    if elev_as_sections:
+        elev_positions = database.shift_list(elev_positions, 1)
+
+    # apply view templates before placing, they can change the size of the views
+    database.apply_vt(rs.viewplan, chosen_vt_plan)
+    database.apply_vt(rs.viewRCP, chosen_vt_rcp_plan)
+    for el in rs.elevations:
+        database.apply_vt(el, chosen_vt_elevation)
+
+    # {role : (view, position, viewport type, rotation)}
+    layout = {
+        "plan": (rs.viewplan, rs.locator.plan, chosen_vp_type, None),
+        "rcp": (rs.viewRCP, rs.locator.rcp, chosen_vp_type, None),
+    }
+    for el, pos, i in izip(rs.elevations, elev_positions, rs.elevation_count):
+        # if user selected, rotate elevations
+        rotation = None
+        if elev_rotate and i == "A" and layout_ori == "Cross":
+            rotation = DB.ViewportRotation.Counterclockwise
+        if elev_rotate and i == "C" and layout_ori == "Cross":
+            rotation = DB.ViewportRotation.Clockwise
+        layout[i] = (el, pos, chosen_vp_type, rotation)
+    if layout_ori == "Cross":
+        layout["threeD"] = (rs.threeD, rs.locator.threeD, None, None)
+
+    if rs.viewports:
+        # the views kept from an earlier run were cropped again, measure their viewports from the regenerated model
+        doc.Regenerate()
+    for role, (view, position, viewport_type, rotation) in layout.items():
+        viewport = rs.viewports.get(role)
+        if viewport:
+            # kept from an earlier run, its view may have changed size
+            rs.locator.realign_pos(doc, [viewport], [position])
+            continue
+        # place view on sheet, each viewport is created centred on its position
+        viewport = rs.locator.place(doc, rs.sheet, view, position, viewport_type, rotation)
+        if role in rs.elevation_count:
+            # set viewport detail number
+            viewport.get_Parameter(
+                DB.BuiltInParameter.VIEWPORT_DETAIL_NUMBER
+            ).Set(role)
+        rs.viewports[role] = viewport
+        rs.created.append(viewport)
+
+
+def make_room_sheets(chunk):
+    # the phases for a chunk of [(room, fingerprint, register entry or None)], in one transaction group
+    # a failure rolls back the whole chunk, with the names taken for it
+    checkpoint = name_allocator.checkpoint()
+    room_sheets = []
+    try:
+        with revit.TransactionGroup("Room Data Sheets", doc):
+            # phase 1: create all views, or update the views of earlier runs
+            with prof.phase("Create views"), revit.Transaction("Create Views", doc):
+                for room, fingerprint, entry in chunk:
+                    rs = RoomSheet(room, fingerprint)
+                    if entry:
+                        rs.load(register, entry)
+                        update_views(rs, entry)
+                    else:
+                        create_views(rs)
+                    room_sheets.append(rs)
+
+            # phase 2: one regeneration, to find all crop box elements (method with transactions, outside transaction)
+            with prof.phase("Find crop boxes"):
+                crop_boxes = geo.find_crop_boxes(
+                    [view for rs in room_sheets for view in (rs.viewplan, rs.viewRCP)], doc)
+
+            # phase 3: crop all views
+            with prof.phase("Crop views"), revit.Transaction("Crop Views", doc):
+                for rs in room_sheets:
+                    rotate_views(rs, crop_boxes)
+                prof.regenerate(doc)
+                for rs in room_sheets:
+                    crop_views(rs)
+
+            # phase 4: create the sheets and place the views
+            with prof.phase("Place views on sheets"), revit.Transaction("Add Views to Sheets", doc):
+                for rs in room_sheets:
+                    place_views(rs)
+
+            # record the output before it is committed, so a rerun can clean it up if the commit is interrupted
+            for rs in room_sheets:
+                journal.record(rs.room, rs.element_ids())
+            journal.save()
+    except Exception:
+        name_allocator.restore(checkpoint)
+        database.invalidate_document_index()
+        raise
+    return room_sheets
+
+
+# rooms done by an interrupted run are skipped, what it left half made is deleted
+journal = batchjournal.BatchJournal(doc, "Room Data Sheets")
+rooms = journal.resume([room for room in selection if room.Area > 0])
+
+# what earlier runs made for each room. Rooms that did not change since, with the same settings, are skipped,
+# the others updated in place. Output made with other settings is replaced
+register = batchjournal.OutputRegister(doc, "Room Data Sheets")
+# every input of the form, so a rerun with any of them changed does not keep the old output
+settings = [chosen_sheet_nr, element_key(chosen_tb), chosen_crop_offset, titleblock_offset, layout_ori, tb_ori,
+            elev_rotate, elev_as_sections, view_scale, element_key(chosen_vt_plan), element_key(chosen_vt_rcp_plan),
+            element_key(chosen_vt_elevation), element_key(chosen_vp_type)]
+to_do = []  # [(room, fingerprint, register entry or None)]
+unchanged = 0
+with prof.phase("Compare rooms"):
+    for room in rooms:
+        fingerprint = geo.room_fingerprint(room)
+        entry = register.entry(room)
+        if entry and not register.is_intact(entry):
+            # some of the output was deleted by hand, make it all again
+            entry = None
+        if entry and entry["fingerprint"] == fingerprint and entry.get("settings") == settings:
+            unchanged += 1
+            continue
+        to_do.append((room, fingerprint, entry))
+
+made_sheets = []  # [(sheet id, room name, made or updated)]
+
+# each chunk of rooms is committed as its own group. A failure rolls back the chunk, which is then made again
+# room by room: the rooms that fail are recorded in the journal and reported, the others are committed
+for chunk in batchjournal.chunks(to_do):
+    chunk_rooms = [room for room, fingerprint, entry in chunk]
+    journal.start(chunk_rooms)
+    try:
+        room_sheets = make_room_sheets(chunk)
+    except Exception:
+        # the chunk was rolled back: its rooms are made one at a time, so a room that fails leaves out only itself
+        room_sheets = []
+        for room, fingerprint, entry in chunk:
+            try:
+                room_sheets.extend(make_room_sheets([(room, fingerprint, entry)]))
+            except Exception as error:
+                journal.fail(room, room_sheet_name(room), error)
+        journal.save()
+
+    # registered before the chunk is marked done, so a finished room is never left out of the register
+    for rs in room_sheets:
+        register.put(rs.room, rs.fingerprint, settings, rs.sheet, rs.views_by_role(), rs.viewports,
+                     level=rs.geometry.level.Id.IntegerValue,
+                     angle=rs.angle,
+                     location=list(geo.xyz_tuple(rs.geometry.location)),
+                     marker=rs.marker.Id.IntegerValue if rs.marker else None)
+    register.save()
+    journal.finish(chunk_rooms)
+    made_sheets.extend((rs.sheet.Id, rs.name, "Updated" if rs.updated else "New") for rs in room_sheets)
+
+journal.close()
+
+for sheet_id, name, status in made_sheets:
+    print("Sheet : {0} \t Room {1} \t {2}".format(output.linkify(sheet_id), name, status))
+
+print("\n{} room data sheets made or updated, {} rooms unchanged".format(len(made_sheets), unchanged))
+for name, error in journal.failed():
+    print("FAILED : Room {} \t {}".format(name, error))
+print(repeated_rooms.summary())
+print(repeated_rooms.crop_report())
+prof.report(print_phases=True)
+geo.drop_room_snapshots()
@@ -12,8 +12,9 @@ MINIMAL_LENGTH = 1.5
 ELEVATION_SPACING = 0.3
 ELEVATION_ID = 0
 doc = __revit__.ActiveUIDocument.Document
+# room geometry is read once per run, not kept from an earlier run of the engine
+geo.drop_room_snapshots()
 active_view = revit.active_view
-active_view_scale = active_view.Scale
 
 selection = select.select_with_cat_filter(DB.BuiltInCategory.OST_Rooms, "Pick Rooms for Room Data Sheets")
 
@@ -28,7 +29,8 @@ viewsection_dict["<None>"] = None
 elevation_type = database.get_view_family_types(DB.ViewFamily.Elevation, doc)[0]
 section_type = database.get_view_family_types(DB.ViewFamily.Section, doc)[0]
 
-# tolerance = 0.032
+# boundaries closer than this to one axis make one elevation
+UNIQUE_BORDERS_TOLERANCE = 10 / 304.8
 VIEW_SCALE = 50
 # get units for Crop Offset variable
 if units.is_metric(doc):
@@ -63,69 +65,76 @@ else:
     sys.exit()
 
 
+# snapshot view names once, so naming never queries the document
+name_allocator = database.NameAllocator.from_document(doc)
+as_sections = form.values["sec_or_elev"] == "Sections"
+
+# work out all boundaries and names first: [(room, room name, [(boundary, marker point)], [view name])]
+rooms_to_do = []
+# rooms that repeat (same shape, moved or turned) share their boundaries and marker positions
+repeated_rooms = geo.RepeatedRooms()
+for room in selection:
+    # Format View Name
+    room_name_nr = (
+            room.Number
+            + " - "
+            + room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString()
+    )
+
+    # boundaries long enough for an elevation, one per axis, with their marker positions - middle of the boundary,
+    # offset inwards. Worked out once per room shape and moved onto the other rooms of that shape
+    boundaries = repeated_rooms.elevation_boundaries(room, MINIMAL_LENGTH, chosen_marker_offset,
+                                                     UNIQUE_BORDERS_TOLERANCE)
+    if boundaries is None:
+        print("Skipped room {}, its boundaries are not closed".format(room_name_nr))
+        continue
+    elevation_labels = database.get_alphabetic_labels(len(boundaries))
+    # reserve the names of all elevations of the room in one go
+    elevation_names = name_allocator.view_names(
+        [room_name_nr + " - Elevation " + label for label in elevation_labels])
+    rooms_to_do.append((room, room_name_nr, boundaries, elevation_names))
+
 with revit.Transaction("Create Room Sections", doc):
-    for room in selection:
-        # Format View Name
-        room_name_nr = (
-                room.Number
-                + " - "
-                + room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString()
-        )
-
-        boundaries = geo.discard_short(geo.get_room_bound(room), MINIMAL_LENGTH)
-        boundaries = [curve for curve in boundaries if isinstance(curve, DB.Line)]
-        # get unique boundaries by sorting lines
-        # bound_curves = geo.get_unique_borders(boundaries, tolerance)
-        elevation_labels = database.get_alphabetic_labels(len(boundaries))
-        print("Created Elevations for room {}".format(room_name_nr))
-
-        counter = 0
-        for boundary in boundaries:
-            # section name
-            elevation_name = room_name_nr + " - Elevation " + elevation_labels[counter]
-            counter += 1
-            while database.get_view(elevation_name, doc):
-                elevation_name = elevation_name + " Copy 1"
-
-            # create a bbox parallel to the border
-            sb = database.create_parallel_bbox(boundary, room)
-
-            if form.values["sec_or_elev"] == "Sections":
+    created = []  # [(room, room name, boundary, view)]
+    markers = []  # [(marker, marker point, boundary)]
+    for room, room_name_nr, boundaries, elevation_names in rooms_to_do:
+        for (boundary, marker_position), elevation_name in zip(boundaries, elevation_names):
+            if as_sections:
+                # create a bbox parallel to the border
+                sb = database.create_parallel_bbox(boundary, room)
                 # for room elevations as sections
                 new_room_elevation = DB.ViewSection.CreateSection(doc, section_type.Id, sb)
             else:
                 # for room elevations as elevations
-                # temporarily switch to smaller scale - better results rotating elevations to face the boundary
-                active_view.Scale = 10
-
-                # elevation marker position - middle of the boundary
-                boundary_center = boundary.Evaluate(0.5, True)
-
-                # offset inwards and check if it's the right side (check if inside room)
-                marker_position = geo.offset_curve_inwards_into_room(boundary,
-                                                                     room,
-                                                                     chosen_marker_offset)\
-                    .Evaluate(0.5, True)
-
                 # create marker
                 new_marker = DB.ElevationMarker.CreateElevationMarker(doc, elevation_type.Id, marker_position, VIEW_SCALE)
 
                 # create 1 elevation
                 try:
                     new_room_elevation = new_marker.CreateElevation(doc, active_view.Id, ELEVATION_ID)
-
                 except Exceptions.ArgumentException:
                     forms.alert("Elevation Marker is invalid. Please review the Elevation Marker and retry",
                                 exitscript=True)
+                markers.append((new_marker, marker_position, boundary))
 
-                # rotate the marker to face the boundary
-                geo.orient_elevation_to_line(doc, new_marker, marker_position, boundary, ELEVATION_ID, active_view)
-
-            new_room_elevation.Name = elevation_name
+            database.rename_view(new_room_elevation, elevation_name, doc)
             database.apply_vt(new_room_elevation, chosen_vt_elevation)
-            doc.Regenerate()
-            geo.set_crop_to_boundary(room, boundary, new_room_elevation, chosen_crop_offset, doc)
-
-            print("\n{}".format(output.linkify(new_room_elevation.Id)))
-
-    active_view.Scale = active_view_scale
\ No newline at end of file
+            # deactivate the crop, so the room appears in the view when it is cropped to it
+            new_room_elevation.CropBoxActive = False
+            created.append((room, room_name_nr, boundary, new_room_elevation))
+
+    # rotate the markers to face their boundaries
+    geo.orient_elevation_markers(doc, markers, ELEVATION_ID)
+
+    # one regeneration for all crops
+    doc.Regenerate()
+    printed_room = None
+    for room, room_name_nr, boundary, new_room_elevation in created:
+        if room_name_nr != printed_room:
+            print("Created Elevations for room {}".format(room_name_nr))
+            printed_room = room_name_nr
+        geo.set_crop_to_boundary(room, boundary, new_room_elevation, chosen_crop_offset, doc, regenerate=False)
+        print("\n{}".format(output.linkify(new_room_elevation.Id)))
+
+print(repeated_rooms.summary())
+geo.drop_room_snapshots()
@@ -9,6 +9,8 @@ logger = script.get_logger()
 
 selection = select.select_with_cat_filter(DB.BuiltInCategory.OST_Rooms, "Pick Rooms for Room Data Sheets")
 doc = __revit__.ActiveUIDocument.Document
+# room geometry is read once per run, not kept from an earlier run of the engine
+geo.drop_room_snapshots()
 
 # collect all view templates sections
 viewsections = DB.FilteredElementCollector(revit.doc).OfClass(DB.ViewSection) # collect sections
@@ -48,6 +50,9 @@ if ok:
 else:
     sys.exit()
 
+# snapshot view names once, so naming never queries the document
+name_allocator = database.NameAllocator.from_document(doc)
+
 for room in selection:
     with revit.Transaction("Create Elevations", doc):
         room_location = room.Location.Point
@@ -69,16 +74,14 @@ for room in selection:
             doc, elevation_type.Id, room_location, view_scale
         )
         elevation_count = ["A", "B", "C", "D"]
+        elevation_names = name_allocator.view_names(
+            [room_name_nr + " - Elevation " + label for label in elevation_count])
         doc.Regenerate()
         for i in range(4):
             elevation = new_marker.CreateElevation(doc, viewplan.Id, i)
             elevation.Scale = view_scale
             # Rename elevations
-            elevation_name = room_name_nr + " - Elevation " + elevation_count[i]
-            while database.get_view(elevation_name, doc):
-                elevation_name = elevation_name + " Copy 1"
-
-            elevation.Name = elevation_name
+            database.rename_view(elevation, elevation_names[i], doc)
             elevations_col.append(elevation)
             database.set_anno_crop(elevation)
 
@@ -95,4 +98,6 @@ for room in selection:
             room_bb = room.get_BoundingBox(el)
             geo.set_crop_to_bb(room, el, crop_offset=chosen_crop_offset)
             database.apply_vt(el, chosen_vt_elevation)
-            print ("\n{}".format(output.linkify(el.Id)))
\ No newline at end of file
+            print ("\n{}".format(output.linkify(el.Id)))
+
+geo.drop_room_snapshots()
@@ -3,11 +3,14 @@ __doc__ = "Creates room plans"
 
 
 from pyrevit import revit, DB, script, forms, HOST_APP
-from rpw.ui.forms import FlexForm, Label, TextBox, Button,ComboBox, Separator
+from rpw.ui.forms import FlexForm, Label, TextBox, Button,ComboBox, Separator, CheckBox
 from pychilizer import units, select, geo, database
+import math
 
 
 doc = __revit__.ActiveUIDocument.Document
+# room geometry is read once per run, not kept from an earlier run of the engine
+geo.drop_room_snapshots()
 output = script.get_output()
 logger = script.get_logger()
 bound_opt = DB.SpatialElementBoundaryOptions()
@@ -27,6 +30,8 @@ viewplan_dict["<None>"] = None
 col_view_types = (DB.FilteredElementCollector(doc).OfClass(DB.ViewFamilyType).WhereElementIsElementType())
 floor_plan_type = [vt for vt in col_view_types if database.get_name(vt) == "Floor Plan"][0]
 view_scale = 50
+# rooms whose rotations differ by less than this share a parent plan in the dependent views mode
+ANGLE_BUCKET = math.radians(0.1)
 
 # get units for Crop Offset variable
 if units.is_metric(doc):
@@ -41,6 +46,7 @@ components = [
     TextBox("crop_offset", Text=str(default_crop_offset)),
     Label("View Template for Plans"),
     ComboBox(name="vt_plans", options=sorted(viewplan_dict), default="<None>"),
+    CheckBox("as_dependent", "As dependent views (one parent plan per level and rotation)", default=False),
     Separator(),
     Button("Select"),
 ]
@@ -50,64 +56,119 @@ form.show()
 # match the variables with user input
 chosen_vt_plan = viewplan_dict[form.values["vt_plans"]]
 chosen_crop_offset = units.correct_input_units(form.values["crop_offset"], doc)
-
-
-for room in selection:
-    with revit.Transaction("Create Plan", doc):
+as_dependent = form.values["as_dependent"]
+
+
+# snapshot view names once, so naming never queries the document
+name_allocator = database.NameAllocator.from_document(doc)
+
+# crop loops and rotation angles of rooms that repeat (same shape, moved or turned) are worked out once
+repeated_rooms = geo.RepeatedRooms()
+
+
+def room_plan_name(room):
+    # Format View Name
+    return (
+            room.Number
+            + " - "
+            + room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString()
+    )
+
+
+def create_room_plans():
+    # create all plans first, so the crop boxes can be found in one go
+    room_plans = []
+    with revit.Transaction("Create Plans", doc):
+        for room in selection:
+            # Create Floor Plan
+            viewplan = DB.ViewPlan.Create(doc, floor_plan_type.Id, room.Level.Id)
+            viewplan.Scale = view_scale
+            room_plans.append((room, viewplan))
+
+    # find crop box elements (method with transactions, must be outside transaction)
+    crop_boxes = geo.find_crop_boxes([viewplan for room, viewplan in room_plans], doc)
+
+    for room, viewplan in room_plans:
+        with revit.Transaction("Rotate Plan", doc):
+            # rotate the view plan along the room's longest boundary
+            axis = geo.get_bb_axis_in_view(room, viewplan)
+            angle = repeated_rooms.rotation_angle(room)
+            # views without a crop box found keep theirs unrotated
+            geo.rotate_crop_box(viewplan, crop_boxes, axis, angle, doc)
+            viewplan.CropBoxActive = True
+            doc.Regenerate()
+
+            # offset boundaries (to include walls in plan view), or the room's bounding box for shapes the offset
+            # fails on. Worked out once per room shape and moved onto the other rooms of that shape
+            offset_boundaries = repeated_rooms.crop_loop(room, chosen_crop_offset, angle)
+            if offset_boundaries:
+                viewplan.GetCropRegionShapeManager().SetCropShape(offset_boundaries)
+
+            # Rename Floor Plan
+            room_name_nr = room_plan_name(room)
+            database.rename_view(viewplan, name_allocator.view_name(room_name_nr, " Plan"), doc)
+            database.set_anno_crop(viewplan)
+            database.apply_vt(viewplan, chosen_vt_plan)
+
+            print("Created Plan {0} \t for Room {1} ".format(output.linkify(viewplan.Id), room_name_nr))
+
+
+def create_dependent_room_plans():
+    # one parent plan per level and rotation, each room a dependent view of it with only its crop shape set
+    # the parent carries the view template, view range and rotation for all its dependents
+    buckets = {}  # {(level id, rounded angle) : (level, angle, [room])}
+    for room in selection:
         level = room.Level
-        room_location = room.Location.Point
-        # Create Floor Plan
-        viewplan = DB.ViewPlan.Create(doc, floor_plan_type.Id, level.Id)
-        viewplan.Scale = view_scale
-
-    # find crop box element (method with transactions, must be outside transaction)
-    crop_box_el = geo.find_crop_box(viewplan)
-
-    with revit.Transaction("Rotate Plan", doc):
-        # rotate the view plan along the room's longest boundary
-        axis = geo.get_bb_axis_in_view(room, viewplan)
-        angle = geo.room_rotation_angle(room)
-        rotated = DB.ElementTransformUtils.RotateElement(
-            doc, crop_box_el.Id, axis, angle
-        )
-        viewplan.CropBoxActive = True
+        angle = repeated_rooms.rotation_angle(room)
+        key = (level.Id.IntegerValue, int(round(angle / ANGLE_BUCKET)))
+        if key not in buckets:
+            buckets[key] = (level, angle, [])
+        buckets[key][2].append(room)
+
+    parents = []  # [(parent plan, angle, [room])]
+    with revit.Transaction("Create Parent Plans", doc):
+        for level, angle, rooms in buckets.values():
+            parent = DB.ViewPlan.Create(doc, floor_plan_type.Id, level.Id)
+            parent.Scale = view_scale
+            parent_name = level.Name + " - Room Plans"
+            if round(math.degrees(angle), 1):
+                parent_name += " {:.1f}".format(math.degrees(angle))
+            database.rename_view(parent, name_allocator.view_name(parent_name), doc)
+            database.apply_vt(parent, chosen_vt_plan)
+            parents.append((parent, angle, rooms))
+
+    # find crop box elements of all parents (method with transactions, must be outside transaction)
+    crop_boxes = geo.find_crop_boxes([parent for parent, angle, rooms in parents], doc)
+
+    with revit.Transaction("Create Room Plans", doc):
+        # rotate the parents, their dependents start with the same crop
+        for parent, angle, rooms in parents:
+            axis = geo.get_bb_axis_in_view(rooms[0], parent)
+            geo.rotate_crop_box(parent, crop_boxes, axis, angle, doc)
+            parent.CropBoxActive = True
         doc.Regenerate()
 
-        room_boundaries = geo.get_room_bound(room)
-        if room_boundaries:
-            # try offsetting boundaries (to include walls in plan view)
-            try:
-                offset_boundaries = room_boundaries.CreateViaOffset(
-                    room_boundaries, chosen_crop_offset, DB.XYZ(0, 0, 1)
-                )
-                crop_shape = viewplan.GetCropRegionShapeManager()
-                crop_shape.SetCropShape(offset_boundaries)
-                doc.Regenerate()
-            # for some shapes the offset will fail, then use BBox method
-            except:
-                doc.Regenerate()
-                # using a helper method, get the outlines of the room's bounding box,
-                # then rotate them with an already known angle (inverted)
-                rotation = DB.Transform.CreateRotationAtPoint(DB.XYZ.BasisZ, angle, room_location)
-                rotated_crop_loop = geo.get_aligned_crop(room.ClosedShell, rotation.Inverse)
-
-                # offset the curve loop with given offset
-                # set the loop as Crop Shape of the view using CropRegionShapeManager
-                crsm = viewplan.GetCropRegionShapeManager()
-                curve_loop_offset = DB.CurveLoop.CreateViaOffset(rotated_crop_loop, chosen_crop_offset, DB.XYZ.BasisZ)
-                crsm.SetCropShape(curve_loop_offset)
-
-        # Rename Floor Plan
-        room_name_nr = (
-                room.Number
-                + " - "
-                + room.get_Parameter(DB.BuiltInParameter.ROOM_NAME).AsString()
-        )
-        viewplan_name = room_name_nr + " Plan"
-        while database.get_view(viewplan_name, doc):
-            viewplan_name = viewplan_name + " Copy 1"
-        viewplan.Name = viewplan_name
-        database.set_anno_crop(viewplan)
-        database.apply_vt(viewplan, chosen_vt_plan)
-
-        print("Created Plan {0} \t for Room {1} ".format(output.linkify(viewplan.Id), room_name_nr))
+        for parent, angle, rooms in parents:
+            for room in rooms:
+                dependent = doc.GetElement(parent.Duplicate(DB.ViewDuplicateOption.AsDependent))
+                dependent.CropBoxActive = True
+                # offset boundaries (to include walls in plan view), or the room's bounding box for shapes the
+                # offset fails on. Worked out once per room shape and moved onto the other rooms of that shape
+                offset_boundaries = repeated_rooms.crop_loop(room, chosen_crop_offset, angle)
+                if offset_boundaries:
+                    dependent.GetCropRegionShapeManager().SetCropShape(offset_boundaries)
+                room_name_nr = room_plan_name(room)
+                database.rename_view(dependent, name_allocator.view_name(room_name_nr, " Plan"), doc)
+                database.set_anno_crop(dependent)
+
+                print("Created Plan {0} \t for Room {1} ".format(output.linkify(dependent.Id), room_name_nr))
+
+
+if as_dependent:
+    create_dependent_room_plans()
+else:
+    create_room_plans()
+
+print(repeated_rooms.summary())
+print(repeated_rooms.crop_report())
+geo.drop_room_snapshots()